@@ -0,0 +1,64 @@
+"""
+App startup time, as paid by every worker start and integration test.
+
+"create_app" times the app factory on a new in-memory database (a test's
+setUp) and on an existing, up to date database file (a worker restart,
+which skips the DDL). "first spec" times the first request to the API
+spec of an app: built from the YAML docstrings, reused from an earlier
+app of the process, or loaded from SWAGGER_SPEC_CACHE.
+
+Usage:
+    python3 -m benchmarks.app_startup [--apps N]
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from db.database import close_connections, memory_db_uri
+from src import apispec, create_app
+
+def time_create_app(apps: int, db_path: str = None) -> None:
+    label = "existing file" if db_path else "new in-memory"
+    total = 0.0
+    for _ in range(apps):
+        path = db_path or memory_db_uri(f"bench-{uuid.uuid4().hex}")
+        began = time.perf_counter()
+        create_app({"TESTING": True, "DATABASE": path})
+        total += time.perf_counter() - began
+        if db_path is None:
+            close_connections(path)
+    print(f"create_app {label:<14} {total / apps * 1000:>7.2f}ms")
+
+def time_first_spec(label: str, config: dict, clear: bool) -> None:
+    db_path = memory_db_uri(f"bench-{uuid.uuid4().hex}")
+    app = create_app({"TESTING": True, "DATABASE": db_path, **config})
+    if clear:
+        apispec._specs.clear()
+    began = time.perf_counter()
+    response = app.test_client().get("/apispec_1.json")
+    elapsed = time.perf_counter() - began
+    close_connections(db_path)
+    assert response.status_code == 200
+    print(f"first spec {label:<14} {elapsed * 1000:>7.2f}ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apps", type=int, default=50)
+    args = parser.parse_args()
+    db_dir = tempfile.mkdtemp()
+    db_path = os.path.join(db_dir, "startup.db")
+    spec_path = os.path.join(db_dir, "apispec.json")
+    try:
+        time_create_app(args.apps)
+        create_app({"TESTING": True, "DATABASE": db_path})
+        time_create_app(args.apps, db_path)
+        time_first_spec("parsed", {}, clear=True)
+        time_first_spec("process cache", {}, clear=False)
+        time_first_spec("write file", {"SWAGGER_SPEC_CACHE": spec_path}, True)
+        time_first_spec("file cache", {"SWAGGER_SPEC_CACHE": spec_path}, True)
+    finally:
+        close_connections(db_path)
+        for name in os.listdir(db_dir):
+            os.unlink(os.path.join(db_dir, name))
+        os.rmdir(db_dir)
@@ -0,0 +1,106 @@
+"""
+Request latency while the database is being backed up.
+
+"none" serves requests with no backup running. "stepped" runs
+db.backup.backup with its default page steps and sleeps; "one-shot"
+copies the whole database in a single step (pages=-1, no sleeps), like
+a file copy. Clients mix product reads and user inserts through the
+services and the p50/p99/max latency of each request is reported.
+
+Usage:
+    python3 -m benchmarks.backup_latency [--products N] [--clients N]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from db.backup import DEFAULT_PAGES_PER_STEP, DEFAULT_SLEEP_SECONDS, backup
+from db.database import close_connections, init_db, run_write
+from src.services import product_service, user_service
+
+PADDING = "x" * 900
+
+def populate(db_path: str, products: int) -> None:
+    def _insert(conn):
+        conn.executemany(
+            "INSERT INTO products (name, description, price, stock)"
+            " VALUES (?, ?, ?, ?)",
+            (
+                (f"Product {i}", PADDING, 9.99, None)
+                for i in range(products)
+            )
+        )
+    run_write(_insert, db_path)
+
+def percentile(samples, fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def run(mode: str, products: int, clients: int) -> None:
+    db_fd, db_path = tempfile.mkstemp()
+    backup_path = f"{db_path}.backup"
+    try:
+        init_db(db_path)
+        populate(db_path, products)
+        latencies = []
+        done = threading.Event()
+
+        def client(index):
+            i = 0
+            while not done.is_set():
+                began = time.perf_counter()
+                if i % 10 == 0:
+                    user_service.register_user(
+                        f"user_{index}_{i}", "password", "regular",
+                        db_path=db_path
+                    )
+                else:
+                    product_service.get_product_by_id(
+                        1 + (index * 7919 + i) % products, db_path=db_path
+                    )
+                latencies.append(time.perf_counter() - began)
+                i += 1
+
+        threads = [
+            threading.Thread(target=client, args=(i,))
+            for i in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        began = time.perf_counter()
+        if mode == "none":
+            time.sleep(2.0)
+        elif mode == "stepped":
+            backup(backup_path, db_path)
+        else:
+            backup(backup_path, db_path, pages=-1, sleep=0)
+        elapsed = time.perf_counter() - began
+        done.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        print(
+            f"{mode:>8} duration={elapsed:>6.2f}s requests={len(latencies):<7} "
+            f"p50={percentile(latencies, 0.50) * 1000:>6.2f}ms "
+            f"p99={percentile(latencies, 0.99) * 1000:>6.2f}ms "
+            f"max={latencies[-1] * 1000:>7.2f}ms"
+        )
+    finally:
+        close_connections(db_path)
+        os.close(db_fd)
+        for path in (db_path, backup_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+    print(
+        f"stepped: {DEFAULT_PAGES_PER_STEP} pages per step, "
+        f"{DEFAULT_SLEEP_SECONDS * 1000:.0f}ms sleeps"
+    )
+    for mode in ("none", "stepped", "one-shot"):
+        run(mode, args.products, args.clients)
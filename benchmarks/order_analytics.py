@@ -0,0 +1,168 @@
+"""
+Order analytics: the columnar analytics service against a naive loop.
+
+"naive" reads orders.products and json.loads every order in Python,
+looking prices up in a dict. "array" is the analytics service with
+array.array columns, and "numpy" the same with NumPy columns (only when
+NumPy is installed). Every report is timed on its own, including the
+read of the order lines.
+
+Usage:
+    python3 -m benchmarks.order_analytics [--orders N]
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from db.database import (
+    close_connections,
+    get_read_connection,
+    init_db,
+    run_write
+)
+from src.models import User
+from src.services import analytics_service
+
+PRODUCTS = 1000
+DAYS = 365
+ADMIN = User(id=1, username="admin", password="", role="admin")
+
+def populate(db_path: str, orders: int) -> None:
+    rng = random.Random(42)
+    prices = [round(rng.uniform(1, 500), 2) for _ in range(PRODUCTS)]
+
+    def _products(conn):
+        conn.executemany(
+            "INSERT INTO products (name, description, price) VALUES (?, ?, ?)",
+            ((f"Product {i}", "Description", price)
+             for i, price in enumerate(prices))
+        )
+    run_write(_products, db_path)
+
+    batch = 50000
+    for start in range(1, orders + 1, batch):
+        rows, lines = [], []
+        for order_id in range(start, min(start + batch, orders + 1)):
+            day = 1 + rng.randrange(DAYS)
+            created_at = time.strftime(
+                "%Y-%m-%dT12:00:00", time.gmtime(1735689600 + day * 86400)
+            )
+            items = {
+                1 + rng.randrange(PRODUCTS): 1 + rng.randrange(3)
+                for _ in range(1 + rng.randrange(4))
+            }
+            rows.append((order_id, 1, created_at, json.dumps([
+                {"product_id": pid, "product_quantity": qty}
+                for pid, qty in items.items()
+            ])))
+            lines.extend(
+                (order_id, 1, pid, qty, prices[pid - 1], created_at,
+                 int(created_at[:10].replace("-", "")))
+                for pid, qty in items.items()
+            )
+
+        def _insert(conn, rows=rows, lines=lines):
+            conn.executemany(
+                "INSERT INTO orders (id, user_id, created_at, products) "
+                "VALUES (?, ?, ?, ?)", rows
+            )
+            conn.executemany(
+                "INSERT INTO order_items (order_id, user_id, product_id, "
+                "quantity, unit_price, created_at, day) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", lines
+            )
+        run_write(_insert, db_path)
+    # Checkpoints the WAL, so the reads don't measure a WAL of hundreds of
+    # MB.
+    close_connections(db_path)
+
+def naive_lines(db_path: str):
+    conn = get_read_connection(db_path)
+    try:
+        prices = dict(
+            conn.execute("SELECT id, price FROM products").fetchall()
+        )
+        for row in conn.execute("SELECT id, created_at, products FROM orders"):
+            for item in json.loads(row["products"]):
+                yield (
+                    row["id"], row["created_at"][:10], item["product_id"],
+                    item["product_quantity"], prices[item["product_id"]]
+                )
+    finally:
+        conn.close()
+
+def naive_daily_revenue(db_path: str) -> list:
+    days = defaultdict(lambda: [set(), 0, 0.0])
+    for order_id, day, _, quantity, price in naive_lines(db_path):
+        totals = days[day]
+        totals[0].add(order_id)
+        totals[1] += quantity
+        totals[2] += quantity * price
+    return [
+        (day, len(orders), units, revenue)
+        for day, (orders, units, revenue) in sorted(days.items())
+    ]
+
+def naive_top_products(db_path: str) -> list:
+    revenue = defaultdict(float)
+    for _, _, product_id, quantity, price in naive_lines(db_path):
+        revenue[product_id] += quantity * price
+    return heapq.nlargest(10, revenue.items(), key=lambda item: item[1])
+
+def naive_basket_sizes(db_path: str) -> list:
+    sizes = defaultdict(int)
+    for order_id, _, _, quantity, _ in naive_lines(db_path):
+        sizes[order_id] += quantity
+    return sorted(Counter(sizes.values()).items())
+
+REPORTS = {
+    "naive": (naive_daily_revenue, naive_top_products, naive_basket_sizes),
+    "service": (
+        lambda db_path: analytics_service.get_daily_revenue(
+            ADMIN, db_path=db_path
+        ),
+        lambda db_path: analytics_service.get_top_products(
+            ADMIN, db_path=db_path
+        ),
+        lambda db_path: analytics_service.get_basket_sizes(
+            ADMIN, db_path=db_path
+        ),
+    ),
+}
+
+def run(mode: str, db_path: str) -> None:
+    analytics_service.USE_NUMPY = mode == "numpy"
+    reports = REPORTS["naive" if mode == "naive" else "service"]
+    timings = []
+    for name, report in zip(
+        ("daily_revenue", "top_products", "basket_sizes"), reports
+    ):
+        began = time.perf_counter()
+        report(db_path)
+        timings.append(f"{name}={time.perf_counter() - began:>6.2f}s")
+    print(f"{mode:>6} " + " ".join(timings))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=1000000)
+    args = parser.parse_args()
+    modes = ["naive", "array"]
+    analytics_service.USE_NUMPY = True
+    if analytics_service._numpy() is not None:
+        modes.append("numpy")
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        init_db(db_path)
+        began = time.perf_counter()
+        populate(db_path, args.orders)
+        print(f"{args.orders} orders in {time.perf_counter() - began:.1f}s")
+        for mode in modes:
+            run(mode, db_path)
+    finally:
+        close_connections(db_path)
+        os.close(db_fd)
+        os.unlink(db_path)
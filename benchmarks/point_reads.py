@@ -0,0 +1,76 @@
+"""
+Point reads through the services: get_product_by_id and get_user_by_id.
+
+"per-call" opens a new read connection for every call, so every query
+is parsed and planned again. "pooled" reuses pooled read connections
+without a statement cache (cached_statements=0), and "cached" reuses
+them with the default statement cache, so hot queries stay prepared.
+
+Usage:
+    python3 -m benchmarks.point_reads [--calls N]
+"""
+import argparse
+import os
+import tempfile
+import time
+from db import database
+from db.database import (
+    close_connections,
+    configure_connections,
+    init_db,
+    run_write
+)
+from src.services import product_service, user_service
+
+MODES = {
+    # mode: (cached_statements, read_pool_size)
+    "per-call": (database.CACHED_STATEMENTS, 0),
+    "pooled": (0, database.READ_POOL_SIZE),
+    "cached": (database.CACHED_STATEMENTS, database.READ_POOL_SIZE),
+}
+
+ROWS = 1000
+
+def populate(db_path: str) -> None:
+    def _insert(conn):
+        conn.executemany(
+            "INSERT INTO products (name, description, price) VALUES (?, ?, ?)",
+            ((f"Product {i}", "Description", 9.99) for i in range(ROWS))
+        )
+        conn.executemany(
+            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+            ((f"user_{i}", "hash", "regular") for i in range(ROWS))
+        )
+    run_write(_insert, db_path)
+
+def run(mode: str, calls: int) -> None:
+    cached_statements, read_pool_size = MODES[mode]
+    configure_connections(cached_statements, read_pool_size)
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        init_db(db_path)
+        populate(db_path)
+        for name, read in (
+            ("get_product_by_id", product_service.get_product_by_id),
+            ("get_user_by_id", user_service.get_user_by_id),
+        ):
+            began = time.perf_counter()
+            for i in range(calls):
+                read(1 + i % ROWS, db_path=db_path)
+            elapsed = time.perf_counter() - began
+            print(
+                f"{mode:>8} {name:<17} calls={calls} "
+                f"total={elapsed:>6.2f}s "
+                f"per_call={elapsed / calls * 1e6:>6.1f}us"
+            )
+    finally:
+        close_connections(db_path)
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+    for mode in MODES:
+        run(mode, args.calls)
@@ -0,0 +1,85 @@
+"""
+Related products: building the co-occurrence index and serving from it.
+
+Times a full rebuild of the index with the pure Python pair counter
+("array") and with NumPy ("numpy", only when NumPy is installed), then
+an incremental update after a few more orders, and the latency of
+GET /products/<id>/related reads from the index.
+
+Usage:
+    python3 -m benchmarks.related_products [--orders N] [--new-orders N]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from benchmarks.order_analytics import PRODUCTS, populate
+from db import related_products
+from db.database import close_connections, init_db, run_write
+from src.services import product_service
+
+def add_orders(db_path: str, orders: int) -> None:
+    rng = random.Random(7)
+
+    def _insert(conn):
+        for _ in range(orders):
+            order_id = conn.execute(
+                "INSERT INTO orders (user_id, created_at, products)"
+                " VALUES (1, '2026-01-01T12:00:00', '[]')"
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO order_items (order_id, user_id, product_id,"
+                " quantity) VALUES (?, 1, ?, 1)",
+                ((order_id, product_id) for product_id in {
+                    1 + rng.randrange(PRODUCTS)
+                    for _ in range(1 + rng.randrange(4))
+                })
+            )
+    run_write(_insert, db_path)
+
+def reads(db_path: str, count: int = 10000) -> str:
+    rng = random.Random(3)
+    timings = []
+    for _ in range(count):
+        began = time.perf_counter()
+        product_service.get_related_products(
+            1 + rng.randrange(PRODUCTS), db_path=db_path
+        )
+        timings.append(time.perf_counter() - began)
+    timings.sort()
+    return (
+        f"p50={statistics.median(timings) * 1e6:.0f}us"
+        f" p99={timings[int(len(timings) * 0.99)] * 1e6:.0f}us"
+    )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--new-orders", type=int, default=1000)
+    args = parser.parse_args()
+    modes = ["array"]
+    if related_products._numpy() is not None:
+        modes.append("numpy")
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        init_db(db_path)
+        populate(db_path, args.orders)
+        for mode in modes:
+            related_products.USE_NUMPY = mode == "numpy"
+            began = time.perf_counter()
+            stats = related_products.rebuild(db_path)
+            print(
+                f"{mode:>6} rebuild {time.perf_counter() - began:6.2f}s"
+                f" {stats}"
+            )
+        add_orders(db_path, args.new_orders)
+        began = time.perf_counter()
+        stats = related_products.update(db_path)
+        print(f"update {time.perf_counter() - began:6.3f}s {stats}")
+        print(f"related reads {reads(db_path)}")
+    finally:
+        close_connections(db_path)
+        os.close(db_fd)
+        os.unlink(db_path)
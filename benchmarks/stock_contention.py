@@ -0,0 +1,105 @@
+"""
+Many buyers checking out the same popular SKU at once.
+
+Every buyer has one unit of the product in their cart and all of them
+call place_order concurrently. The benchmark reports checkout throughput
+and verifies that stock was never oversold.
+
+Usage:
+    python3 -m benchmarks.stock_contention [--buyers N] [--stock S]
+        [--backend sqlite|memory]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from db.database import init_db
+from db.memory_backend import MemoryBackend
+from db.repository import register_backend, unregister_backend
+from src.services import cart_service, product_service, user_service
+
+def run(buyers: int, stock: int, threads: int, backend: str) -> None:
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        if backend == "memory":
+            register_backend(MemoryBackend(), db_path)
+        else:
+            init_db(db_path)
+        admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=db_path
+        )
+        product = product_service.add_product(
+            admin, "Popular", "Hot SKU", 10.0, stock=stock, db_path=db_path
+        )
+        carts = []
+        for i in range(buyers):
+            user = user_service.register_user(
+                f"buyer_{i}", "pass", "regular", db_path=db_path
+            )
+            cart = cart_service.add_to_cart(
+                user, [(product.id, 1)], db_path=db_path
+            )
+            carts.append((cart, user))
+
+        results = {"orders": 0, "sold_out": 0, "errors": 0}
+        lock = threading.Lock()
+        start = threading.Barrier(threads + 1)
+
+        def buyer(chunk):
+            start.wait()
+            for cart, user in chunk:
+                try:
+                    cart_service.place_order(cart, user, db_path=db_path)
+                    outcome = "orders"
+                except cart_service.InsufficientStockError:
+                    outcome = "sold_out"
+                except Exception:
+                    outcome = "errors"
+                with lock:
+                    results[outcome] += 1
+
+        workers = [
+            threading.Thread(target=buyer, args=(carts[i::threads],))
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        began = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - began
+
+        remaining = product_service.get_product_by_id(
+            product.id, db_path=db_path
+        ).stock
+        print(
+            f"backend={backend} buyers={buyers} threads={threads} "
+            f"stock={stock}"
+        )
+        print(
+            f"orders={results['orders']} sold_out={results['sold_out']} "
+            f"errors={results['errors']} remaining_stock={remaining}"
+        )
+        print(
+            f"elapsed={elapsed:.3f}s "
+            f"throughput={buyers / elapsed:.0f} checkouts/s"
+        )
+        assert results["orders"] == min(buyers, stock), "stock oversold"
+        assert remaining == stock - results["orders"], "stock mismatch"
+    finally:
+        unregister_backend(db_path)
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument(
+        "--backend", choices=["sqlite", "memory"], default="sqlite"
+    )
+    args = parser.parse_args()
+    run(args.buyers, args.stock, args.threads, args.backend)
@@ -0,0 +1,92 @@
+"""
+Write throughput of the writer queue versus one connection per write.
+
+"direct" mimics the previous behavior: every write opens its own
+connection, takes the SQLite write lock and commits on its own.
+"writer" submits the same writes to the database's writer thread, which
+serializes and group-commits them.
+
+Usage:
+    python3 -m benchmarks.write_throughput [--writes-per-writer N]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from db.database import (
+    close_connections,
+    get_db_connection,
+    init_db,
+    run_write,
+    writer_stats
+)
+
+INSERT_SQL = "INSERT INTO users (username, password, role) VALUES (?, ?, ?)"
+
+def direct_write(db_path: str, username: str) -> None:
+    conn = get_db_connection(db_path)
+    try:
+        conn.execute(INSERT_SQL, (username, "hash", "regular"))
+        conn.commit()
+    finally:
+        conn.close()
+
+def queued_write(db_path: str, username: str) -> None:
+    run_write(
+        lambda conn: conn.execute(INSERT_SQL, (username, "hash", "regular")),
+        db_path
+    )
+
+def run(mode: str, writers: int, writes_per_writer: int) -> None:
+    write = direct_write if mode == "direct" else queued_write
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        init_db(db_path)
+        errors = []
+        start = threading.Barrier(writers + 1)
+
+        def writer(index):
+            start.wait()
+            for i in range(writes_per_writer):
+                try:
+                    write(db_path, f"user_{index}_{i}")
+                except sqlite3.OperationalError as e:
+                    errors.append(e)
+
+        threads = [
+            threading.Thread(target=writer, args=(i,))
+            for i in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        total = writers * writes_per_writer
+        stats = writer_stats(db_path)
+        batch = (
+            f" avg_batch={stats['jobs'] / stats['batches']:.1f}"
+            if stats["batches"] else ""
+        )
+        print(
+            f"{mode:>6} writers={writers:<4} "
+            f"throughput={(total - len(errors)) / elapsed:>8.0f} writes/s "
+            f"errors={len(errors)}{batch}"
+        )
+    finally:
+        close_connections(db_path)
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writes-per-writer", type=int, default=50)
+    args = parser.parse_args()
+    for writers in (8, 32, 128):
+        for mode in ("direct", "writer"):
+            run(mode, writers, args.writes_per_writer)
@@ -0,0 +1,87 @@
+"""
+Returning the space freed by deletes to the file system.
+
+SQLite keeps the pages of deleted rows on a free list and reuses them,
+so a database file never shrinks by itself. Databases created by init_db
+use auto_vacuum=INCREMENTAL, which lets incremental_vacuum() move free
+pages to the end of the file and truncate it, a few pages per write
+transaction, while the app runs. With WAL the file shrinks at the next
+checkpoint.
+
+auto_vacuum can only be switched on for an existing database by
+rebuilding it with VACUUM. That rewrites the whole file and needs it to
+itself, so run `convert` with the app stopped.
+
+Usage:
+    python3 -m db.compaction {vacuum,convert} [--db PATH] [--pages N]
+"""
+import argparse
+import sqlite3
+from typing import Optional
+from db.database import default_db_path, get_db_connection, run_write
+
+# PRAGMA auto_vacuum value of INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+# Pages released per write transaction (4 MB with the default page size)
+VACUUM_BATCH_PAGES = 1000
+DEFAULT_MAX_PAGES = 25000
+
+def _vacuum_batch(conn: sqlite3.Connection, pages: int) -> int:
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # sqlite3 steps a statement that returns no rows only once, and every
+    # step of incremental_vacuum releases one page.
+    for _ in range(min(free, pages)):
+        conn.execute("PRAGMA incremental_vacuum")
+    return free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def incremental_vacuum(
+        db_path: Optional[str] = None, max_pages: int = DEFAULT_MAX_PAGES
+    ) -> int:
+    """
+    Releases up to max_pages free pages of a database in short write
+    transactions on its writer.
+
+    :return: Pages released; 0 when the database isn't in
+        auto_vacuum=INCREMENTAL mode.
+    """
+    released = 0
+    while released < max_pages:
+        batch = run_write(
+            lambda conn: _vacuum_batch(
+                conn, min(VACUUM_BATCH_PAGES, max_pages - released)
+            ),
+            db_path
+        )
+        if batch == 0:
+            break
+        released += batch
+
+    return released
+
+def convert(db_path: Optional[str] = None) -> None:
+    """
+    Switches an existing database to auto_vacuum=INCREMENTAL by
+    rebuilding it. Needs the database to itself.
+    """
+    conn = get_db_connection(db_path or default_db_path())
+    try:
+        conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Shrink a database file by the space of deleted rows."
+    )
+    parser.add_argument("command", choices=["vacuum", "convert"])
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--pages", type=int, default=DEFAULT_MAX_PAGES)
+    args = parser.parse_args()
+    if args.command == "convert":
+        convert(args.db)
+    else:
+        print(f"{incremental_vacuum(args.db, args.pages)} pages released")
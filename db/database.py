@@ -1,18 +1,560 @@
+import atexit
+import logging
+import os
 import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+from db.writer import Writer
 
 DB_PATH = Path(__file__).parent / "simple-ecomm.db"
 
-def get_db_connection(db_path: str = str(DB_PATH)) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+# Database used when a caller passes no path, e.g. the app's DATABASE.
+_current_db: ContextVar[Optional[str]] = ContextVar("current_db", default=None)
+
+# How long a connection waits on a lock held by another process.
+BUSY_TIMEOUT_SECONDS = 5.0
+# Prepared statements kept per connection (sqlite3's cached_statements),
+# keyed by SQL text; see db.queries.
+CACHED_STATEMENTS = 128
+# Idle read-only connections kept per database; 0 opens one per read.
+READ_POOL_SIZE = 8
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+_writers: Dict[str, Writer] = {}
+_replicas: Dict[str, "Replica"] = {}
+# Read-only catalog attached to shard connections, keyed by shard path.
+_attached_catalogs: Dict[str, str] = {}
+# One open connection per in-memory database; SQLite frees the database
+# when its last connection closes.
+_memory_keepers: Dict[str, sqlite3.Connection] = {}
+# Idle read connections by path, and the generation new ones belong to;
+# connections of an older generation are closed instead of pooled.
+_read_pools: Dict[str, List["_PooledConnection"]] = {}
+_pool_generations: Dict[str, int] = {}
+# Read connections shared by all reads of the current context, by path;
+# see shared_reads.
+_shared_reads: ContextVar[Optional[Dict[str, "_PooledConnection"]]] = (
+    ContextVar("shared_reads", default=None)
+)
+_registry_lock = threading.Lock()
+
+def default_db_path() -> str:
+    """Returns the database used when no path is given."""
+    return _current_db.get() or str(DB_PATH)
+
+def use_database(db_path: Optional[str]) -> object:
+    """
+    Makes db_path the default database of the current context.
+
+    :return: A token for reset_database.
+    """
+    return _current_db.set(db_path)
+
+def reset_database(token: object) -> None:
+    _current_db.reset(token)
+
+def memory_db_uri(name: str) -> str:
+    """
+    Returns the URI of a named in-memory database shared by all
+    connections of the process.
+    """
+    return f"file:{name}?mode=memory&cache=shared"
+
+def is_memory_db(db_path: str) -> bool:
+    return db_path.startswith("file:") and (
+        db_path.startswith("file::memory:") or "mode=memory" in db_path
+    )
+
+def configure_connections(
+        cached_statements: Optional[int] = None,
+        read_pool_size: Optional[int] = None
+    ) -> None:
+    """
+    Sets the statement cache size and read pool size of the connections
+    opened from now on.
+    """
+    global CACHED_STATEMENTS, READ_POOL_SIZE
+    if cached_statements is not None:
+        CACHED_STATEMENTS = cached_statements
+    if read_pool_size is not None:
+        READ_POOL_SIZE = read_pool_size
+
+def _connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        db_path,
+        uri=db_path.startswith("file:"),
+        cached_statements=CACHED_STATEMENTS,
+        **kwargs
+    )
     conn.row_factory = sqlite3.Row
 
     return conn
 
-def init_db(db_path: str = str(DB_PATH)) -> None:
+class _PooledConnection(sqlite3.Connection):
+    """
+    Read-only connection that goes back to its pool when closed, keeping
+    its prepared statements for the next read.
+    """
+    pool_path = ""
+    generation = 0
+    idle = False
+    # Held by shared_reads, which returns it when it ends.
+    shared = False
+
+    def close(self) -> None:
+        if self.idle or self.shared:
+            return
+        if self.in_transaction:
+            self.rollback()
+        with _registry_lock:
+            pool = _read_pools.setdefault(self.pool_path, [])
+            if (
+                self.generation == _pool_generations.get(self.pool_path, 0)
+                and len(pool) < READ_POOL_SIZE
+            ):
+                self.idle = True
+                pool.append(self)
+                return
+        super().close()
+
+def _drop_read_pool(path: str) -> None:
+    # Connections in use are closed when they are returned.
+    with _registry_lock:
+        _pool_generations[path] = _pool_generations.get(path, 0) + 1
+        pool = _read_pools.pop(path, [])
+    for conn in pool:
+        sqlite3.Connection.close(conn)
+
+def get_db_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Opens a read-write connection.
+
+    :param db_path: Path of a database file, or the URI of a shared-cache
+        in-memory database (see memory_db_uri), which is kept alive until
+        close_connections.
+    """
+    db_path = db_path or default_db_path()
+    if is_memory_db(db_path) and db_path not in _memory_keepers:
+        with _registry_lock:
+            if db_path not in _memory_keepers:
+                _memory_keepers[db_path] = _connect(
+                    db_path, check_same_thread=False
+                )
+
+    return _connect(db_path)
+
+def snapshot(target_path: str, db_path: Optional[str] = None) -> None:
+    """
+    Copies a database to a file with the SQLite backup API.
+
+    The copy is written to a temporary file and renamed over target_path,
+    so the target is always a complete database.
+
+    :param target_path: Path of the copy.
+    :param db_path: Database to copy, e.g. an in-memory database.
+    """
+    tmp_path = f"{target_path}.tmp"
+    source = get_db_connection(db_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)
+        # The copy is a plain file, readable with mode=ro.
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, target_path)
+
+def restore_snapshot(source_path: str, db_path: Optional[str] = None) -> None:
+    """
+    Replaces the content of a database with a snapshot file.
+
+    Call it before the database is used, e.g. to seed an in-memory
+    database when a node starts.
+    """
+    source = sqlite3.connect(source_path)
+    target = get_db_connection(db_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+def persist_memory_db(snapshot_path: str, db_path: Optional[str] = None) -> None:
+    """
+    Restores an in-memory database from snapshot_path, if the file
+    exists, and snapshots it back there when the process exits.
+    """
+    db_path = db_path or default_db_path()
+    if os.path.exists(snapshot_path):
+        restore_snapshot(snapshot_path, db_path)
+    atexit.register(snapshot, snapshot_path, db_path)
+
+class Replica:
+    """
+    Read-only copy of a database refreshed with the SQLite backup API.
+
+    Every refresh copies the primary into a temporary file and atomically
+    renames it over the replica, so readers always open a complete copy.
+    Reads from the replica may lag the primary by ``refresh_seconds``.
+    """
+    def __init__(
+            self,
+            db_path: str,
+            replica_path: str,
+            refresh_seconds: float = 1.0
+        ) -> None:
+        self.db_path = db_path
+        self.replica_path = replica_path
+        self.refresh_seconds = refresh_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> None:
+        snapshot(self.replica_path, self.db_path)
+        # Pooled connections still read the replaced file.
+        _drop_read_pool(self.replica_path)
+
+    def start(self) -> None:
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="db-replica", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                logger.exception("Replica refresh failed")
+
+
+def _ro_uri(path: str) -> str:
+    if is_memory_db(path):
+        return path
+    return f"{Path(path).resolve().as_uri()}?mode=ro"
+
+def _attach_catalog(conn: sqlite3.Connection, db_path: str) -> None:
+    catalog_path = _attached_catalogs.get(db_path)
+    if catalog_path is not None:
+        # Shards have no products table, so unqualified queries on
+        # products resolve to the attached catalog.
+        conn.execute(
+            "ATTACH DATABASE ? AS catalog", (_ro_uri(catalog_path),)
+        )
+
+def attach_catalog(db_path: str, catalog_path: Optional[str]) -> None:
+    """
+    Attaches a catalog read-only to every new connection of a database.
+
+    :param db_path: Path of the database, typically a shard.
+    :param catalog_path: Path of the catalog database, or None to stop
+        attaching it.
+    """
+    if catalog_path is None:
+        _attached_catalogs.pop(db_path, None)
+    else:
+        _attached_catalogs[db_path] = catalog_path
+
+def _get_writer(db_path: str) -> Writer:
+    writer = _writers.get(db_path)
+    if writer is None:
+        with _registry_lock:
+            writer = _writers.get(db_path)
+            if writer is None:
+                conn = _connect(
+                    db_path,
+                    timeout=BUSY_TIMEOUT_SECONDS,
+                    check_same_thread=False
+                )
+                _attach_catalog(conn, db_path)
+                writer = Writer(db_path, conn)
+                _writers[db_path] = writer
+
+    return writer
+
+def begin_read(conn: sqlite3.Connection) -> None:
+    """
+    Starts a read transaction, so the following reads see one snapshot.
+    A connection of shared_reads already holds one, which is kept.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+
+@contextmanager
+def shared_reads() -> Iterator[None]:
+    """
+    Serves the reads of the current context from one read connection per
+    database, each holding one read transaction until the block ends.
+
+    The reads skip the pool and see one snapshot of each database, taken
+    at its first read (in-memory databases read uncommitted data, so
+    there they only share the connection). Writes committed meanwhile,
+    including the context's own, aren't seen, so use it around reads
+    only.
+    """
+    connections: Dict[str, _PooledConnection] = {}
+    token = _shared_reads.set(connections)
+    try:
+        yield
+    finally:
+        _shared_reads.reset(token)
+        for conn in connections.values():
+            conn.shared = False
+            conn.close()
+
+def get_read_connection(
+        db_path: Optional[str] = None, replica_ok: bool = False
+    ) -> sqlite3.Connection:
+    """
+    Opens a read-only connection.
+
+    :param db_path: Path of the primary database.
+    :param replica_ok: Read from the configured replica, if any. Only for
+        reads that tolerate data lagging behind recent writes.
+
+    :return: A connection opened with mode=ro; the caller closes it,
+        which returns it to the database's pool of read connections.
+        Within shared_reads, the connection shared by the context.
+    """
+    db_path = db_path or default_db_path()
+    replica = _replicas.get(db_path) if replica_ok else None
+    path = replica.replica_path if replica is not None else db_path
+    shared = _shared_reads.get()
+    if shared is None:
+        return _take_read_connection(path, replica is None, db_path)
+    conn = shared.get(path)
+    if conn is None:
+        conn = _take_read_connection(path, replica is None, db_path)
+        conn.execute("BEGIN")
+        conn.shared = True
+        shared[path] = conn
+
+    return conn
+
+def _take_read_connection(
+        path: str, attach: bool, db_path: str
+    ) -> "_PooledConnection":
+    with _registry_lock:
+        pool = _read_pools.get(path)
+        if pool:
+            conn = pool.pop()
+            conn.idle = False
+            return conn
+        generation = _pool_generations.get(path, 0)
+    conn = _connect(
+        _ro_uri(path),
+        timeout=BUSY_TIMEOUT_SECONDS,
+        factory=_PooledConnection,
+        # Pooled connections are handed from thread to thread, but only
+        # ever used by one at a time.
+        check_same_thread=False
+    )
+    conn.pool_path = path
+    conn.generation = generation
+    if is_memory_db(path):
+        conn.execute("PRAGMA query_only = ON")
+        # Shared-cache databases lock whole tables and fail instead of
+        # waiting, so a reader holding a table lock would make the writer
+        # fail. Readers skip table locks instead, at the price of seeing
+        # the writes of a group commit still in progress.
+        conn.execute("PRAGMA read_uncommitted = ON")
+    if attach:
+        _attach_catalog(conn, db_path)
+
+    return conn
+
+def submit_write(
+        fn: Callable[[sqlite3.Connection], T],
+        db_path: Optional[str] = None
+    ) -> "Future[T]":
+    """
+    Queues fn on the database's writer thread.
+
+    fn receives the writer connection and runs inside a write
+    transaction, possibly group-committed with other queued writes. See
+    db.writer.Writer for the semantics.
+
+    :param fn: Callable receiving the writer connection.
+    :param db_path: Path of the database.
+
+    :return: A Future resolved with fn's result once it is committed.
+    """
+    return _get_writer(db_path or default_db_path()).submit(fn)
+
+def run_write(
+        fn: Callable[[sqlite3.Connection], T],
+        db_path: Optional[str] = None
+    ) -> T:
+    """
+    Runs fn in a write transaction on the writer thread and waits for it.
+
+    The changes made by fn are committed if it returns and rolled back
+    if it raises; the exception is re-raised in the caller.
+
+    :return: Whatever fn returns.
+    """
+    return submit_write(fn, db_path).result()
+
+def writer_stats(db_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Returns the number of committed write jobs and group commits.
+    """
+    writer = _writers.get(db_path or default_db_path())
+    if writer is None:
+        return {"jobs": 0, "batches": 0}
+    return {"jobs": writer.jobs, "batches": writer.batches}
+
+def configure_replica(
+        replica_path: str,
+        refresh_seconds: float = 1.0,
+        db_path: Optional[str] = None
+    ) -> Replica:
+    """
+    Starts keeping a replica of the database for lag-tolerant reads.
+
+    :return: The running Replica.
+    """
+    db_path = db_path or default_db_path()
+    stop_replica(db_path)
+    replica = Replica(db_path, replica_path, refresh_seconds)
+    replica.start()
+    _replicas[db_path] = replica
+
+    return replica
+
+def stop_replica(db_path: Optional[str] = None) -> None:
+    replica = _replicas.pop(db_path or default_db_path(), None)
+    if replica is not None:
+        replica.stop()
+        _drop_read_pool(replica.replica_path)
+
+def close_connections(db_path: Optional[str] = None) -> None:
+    """
+    Closes the writer connection, pooled read connections and replica
+    of a database.
+
+    Call this before deleting a database file, so SQLite can checkpoint
+    and remove its WAL files. In-memory databases are dropped.
+    """
+    db_path = db_path or default_db_path()
+    stop_replica(db_path)
+    _drop_read_pool(db_path)
+    with _registry_lock:
+        writer = _writers.pop(db_path, None)
+        keeper = _memory_keepers.pop(db_path, None)
+    if writer is not None:
+        writer.close()
+    if keeper is not None:
+        # Frees the in-memory database.
+        keeper.close()
+    elif os.path.exists(db_path):
+        # Read-only connections can't remove the WAL files, so let a
+        # read-write connection be the last one to close.
+        conn = get_db_connection(db_path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+# Shard i allocates cart and order ids from i * SHARD_ID_SPAN, so ids
+# stay unique when rows are moved between shards.
+SHARD_ID_SPAN = 10 ** 12
+
+def _create_user_scoped_tables(cursor: sqlite3.Cursor) -> None:
+    # Create CARTS table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS carts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        items TEXT NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+    # Create ORDERS table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        products TEXT NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_orders_created_at
+    ON orders (created_at)
+    """)
+
+def init_shard_db(db_path: str, shard_index: int) -> None:
+    """
+    Creates the user-scoped tables (carts and orders) of a shard and
+    migrates them to the latest schema.
+
+    Shards have no products table; the global catalog is attached to
+    their connections read-only instead.
+
+    :param db_path: Path of the shard database.
+    :param shard_index: Position of the shard, used to offset its ids.
+    """
+    conn = get_db_connection(db_path)
+    cursor = conn.cursor()
+
+    # Lets db.compaction shrink the file; only takes effect before the
+    # first table is created.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    _create_user_scoped_tables(cursor)
+    for table in ("carts", "orders"):
+        row = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+        ).fetchone()
+        first_id = shard_index * SHARD_ID_SPAN
+        if row is None:
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                (table, first_id)
+            )
+        elif row["seq"] < first_id:
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = ? WHERE name = ?",
+                (first_id, table)
+            )
+
+    conn.commit()
+    conn.close()
+    # Imported here because the migrations run on this module's writer.
+    from db.migrations import migrate
+    migrate(db_path, shard=True)
+
+def init_db(db_path: Optional[str] = None) -> None:
+    # Imported here because the migrations run on this module's writer.
+    from db.migrations import LATEST_VERSION, migrate
     conn = get_db_connection(db_path)
+    # A database at the latest version already has every table.
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= LATEST_VERSION:
+        conn.close()
+        return
     cursor = conn.cursor()
 
+    # Lets db.compaction shrink the file; only takes effect before the
+    # first table is created.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers keep reading while the writer commits
+    cursor.execute("PRAGMA journal_mode=WAL")
     # Create USERS table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -28,28 +570,47 @@ def init_db(db_path: str = str(DB_PATH)) -> None:
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL,
         description TEXT,
-        price REAL NOT NULL
+        price REAL NOT NULL,
+        stock INTEGER
     )
     """)
-    # Create CARTS table
+    # Databases created before stock tracking lack the STOCK column.
+    # A NULL stock means the product's inventory is not tracked.
+    columns = [
+        row["name"] for row in cursor.execute("PRAGMA table_info(products)")
+    ]
+    if "stock" not in columns:
+        cursor.execute("ALTER TABLE products ADD COLUMN stock INTEGER")
+    _create_user_scoped_tables(cursor)
+    # Create CATALOG_VERSION table, bumped on every product change
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS carts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        items TEXT NOT NULL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
     )
     """)
-    # Create ORDERS table
+    cursor.execute(
+        "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)"
+    )
+    # Create IDEMPOTENCY_KEYS table, holding recent responses for retries
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        created_at TEXT NOT NULL,
-        user_id INTEGER NOT NULL,
-        products TEXT NOT NULL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        status_code INTEGER,
+        response_body BLOB,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (key, scope)
     )
     """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at
+    ON idempotency_keys (expires_at)
+    """)
 
     conn.commit()
     conn.close()
+    # The tables above are schema version 0; later changes are migrations.
+    migrate(db_path)
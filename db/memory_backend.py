@@ -0,0 +1,560 @@
+"""
+In-memory implementation of the storage interface in db.repository.
+
+Everything lives in dictionaries guarded by one lock, so every
+repository method is atomic and isolated like a SQLite transaction.
+Nothing is persisted; use it for tests and benchmarks that measure the
+services rather than the database.
+"""
+import json
+import threading
+from collections import Counter
+from dataclasses import replace
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from db.repository import (
+    ORDER_LINE_COLUMNS,
+    CartRepository,
+    DuplicateError,
+    IdempotencyRepository,
+    InsufficientStock,
+    NotFoundError,
+    OrderRepository,
+    ProductRepository,
+    StorageBackend,
+    UserRepository,
+    utc_timestamp
+)
+from src.models import (
+    Cart,
+    CatalogChange,
+    IdempotencyRecord,
+    Order,
+    Product,
+    User
+)
+
+class _Tables:
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.users: Dict[int, User] = {}
+        self.usernames: Dict[str, int] = {}
+        self.products: Dict[int, Product] = {}
+        self.catalog_version = 0
+        self.catalog_changes: List[CatalogChange] = []
+        # Carts by user id; a user has at most one cart.
+        self.carts: Dict[int, Cart] = {}
+        # Cart id -> (created_at, updated_at)
+        self.cart_times: Dict[int, Tuple[str, str]] = {}
+        self.orders: Dict[int, Order] = {}
+        # Order id -> product id -> unit price paid.
+        self.order_prices: Dict[int, Dict[int, float]] = {}
+        self.idempotency_keys: Dict[Tuple[str, str], IdempotencyRecord] = {}
+        self._ids: Dict[str, int] = {}
+
+    def next_id(self, table: str) -> int:
+        # Ids are never reused, like SQLite's AUTOINCREMENT.
+        self._ids[table] = self._ids.get(table, 0) + 1
+        return self._ids[table]
+
+def _in_range(created_at: str, since: Optional[str], until: Optional[str]) -> bool:
+    return (
+        (since is None or created_at >= since)
+        and (until is None or created_at < until)
+    )
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, tables: _Tables) -> None:
+        self._t = tables
+
+    def add(self, username: str, password: str, role: str) -> User:
+        with self._t.lock:
+            if username in self._t.usernames:
+                raise DuplicateError("Username already exists")
+            user = User(
+                id=self._t.next_id("users"),
+                username=username,
+                password=password,
+                role=role
+            )
+            self._t.users[user.id] = user
+            self._t.usernames[username] = user.id
+            return replace(user)
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        with self._t.lock:
+            user = self._t.users.get(user_id)
+            return replace(user) if user else None
+
+    def get_by_username(self, username: str) -> Optional[User]:
+        with self._t.lock:
+            user_id = self._t.usernames.get(username)
+            if user_id is None:
+                return None
+            return replace(self._t.users[user_id])
+
+class MemoryProductRepository(ProductRepository):
+    def __init__(self, tables: _Tables) -> None:
+        self._t = tables
+
+    def _record_change(
+            self,
+            change: str,
+            product_id: int,
+            product: Optional[Product] = None
+        ) -> None:
+        self._t.catalog_version += 1
+        self._t.catalog_changes.append(CatalogChange(
+            seq=len(self._t.catalog_changes) + 1,
+            product_id=product_id,
+            change=change,
+            name=product.name if product else None,
+            description=product.description if product else None,
+            price=product.price if product else None,
+            changed_at=utc_timestamp()
+        ))
+
+    def add(
+            self,
+            name: str,
+            description: str,
+            price: float,
+            stock: Optional[int]
+        ) -> Product:
+        with self._t.lock:
+            product = Product(
+                id=self._t.next_id("products"),
+                name=name,
+                description=description,
+                price=price,
+                stock=stock
+            )
+            self._t.products[product.id] = product
+            self._record_change("add", product.id, product)
+            return replace(product)
+
+    def update(
+            self,
+            product_id: int,
+            name: Optional[str] = None,
+            description: Optional[str] = None,
+            price: Optional[float] = None,
+            stock: Optional[int] = None
+        ) -> Product:
+        with self._t.lock:
+            product = self._t.products.get(product_id)
+            if product is None:
+                raise NotFoundError("Product not found")
+            changes = {
+                "name": name,
+                "description": description,
+                "price": price,
+                "stock": stock
+            }
+            product = replace(
+                product,
+                **{k: v for k, v in changes.items() if v is not None}
+            )
+            self._t.products[product_id] = product
+            self._record_change("edit", product_id, product)
+            return replace(product)
+
+    def delete(self, product_id: int) -> None:
+        with self._t.lock:
+            if self._t.products.pop(product_id, None) is None:
+                raise NotFoundError("Product not found")
+            self._record_change("delete", product_id)
+
+    def get(self, product_id: int) -> Optional[Product]:
+        with self._t.lock:
+            product = self._t.products.get(product_id)
+            return replace(product) if product else None
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        with self._t.lock:
+            return {
+                pid: replace(self._t.products[pid])
+                for pid in product_ids if pid in self._t.products
+            }
+
+    def list_all(self) -> List[Product]:
+        with self._t.lock:
+            return [replace(p) for p in self._t.products.values()]
+
+    def find_missing(self, product_ids: Iterable[int]) -> List[int]:
+        with self._t.lock:
+            return [
+                pid for pid in product_ids if pid not in self._t.products
+            ]
+
+    def catalog_version(self) -> int:
+        return self._t.catalog_version
+
+    def catalog_snapshot(self) -> Tuple[int, List[Product]]:
+        with self._t.lock:
+            return self._t.catalog_version, self.list_all()
+
+    def changes(self, since: int, limit: int) -> List[CatalogChange]:
+        with self._t.lock:
+            # Sequence numbers are list positions + 1.
+            return [
+                replace(change)
+                for change in self._t.catalog_changes[since:since + limit]
+            ]
+
+    def related(
+            self, product_id: int, limit: int
+        ) -> List[Tuple[Product, int]]:
+        # Counted from the orders on every call; no index to lag behind.
+        with self._t.lock:
+            counts: Counter = Counter()
+            for order in self._t.orders.values():
+                basket = {
+                    item["product_id"] for item in json.loads(order.products)
+                }
+                if product_id in basket:
+                    counts.update(basket - {product_id})
+            ranked = sorted(
+                (
+                    (-orders, related_id)
+                    for related_id, orders in counts.items()
+                    if related_id in self._t.products
+                )
+            )[:limit]
+            return [
+                (replace(self._t.products[related_id]), -orders)
+                for orders, related_id in ranked
+            ]
+
+class MemoryCartRepository(CartRepository):
+    def __init__(self, tables: _Tables) -> None:
+        self._t = tables
+
+    def _copy(self, cart: Cart) -> Cart:
+        return Cart(id=cart.id, user_id=cart.user_id, items=dict(cart.items))
+
+    def _create(self, user_id: int) -> Cart:
+        cart = Cart(id=self._t.next_id("carts"), user_id=user_id)
+        self._t.carts[user_id] = cart
+        now = utc_timestamp()
+        self._t.cart_times[cart.id] = (now, now)
+        return cart
+
+    def _touch(self, cart: Cart) -> None:
+        created_at, _ = self._t.cart_times[cart.id]
+        self._t.cart_times[cart.id] = (created_at, utc_timestamp())
+
+    def add_items(
+            self, user_id: int, products: Sequence[Tuple[int, int]]
+        ) -> Cart:
+        with self._t.lock:
+            for product_id, _ in products:
+                if product_id not in self._t.products:
+                    raise NotFoundError(
+                        f"Product with id {product_id} not found"
+                    )
+            cart = self._t.carts.get(user_id) or self._create(user_id)
+            for product_id, product_quantity in products:
+                key = str(product_id)
+                cart.items[key] = cart.items.get(key, 0) + product_quantity
+            self._touch(cart)
+            return self._copy(cart)
+
+    def set_items(
+            self,
+            user_id: int,
+            quantities: Sequence[Tuple[int, int]],
+            replace: bool = False
+        ) -> Cart:
+        with self._t.lock:
+            for product_id, quantity in quantities:
+                if quantity and product_id not in self._t.products:
+                    raise NotFoundError(
+                        f"Product with id {product_id} not found"
+                    )
+            cart = self._t.carts.get(user_id) or self._create(user_id)
+            if replace:
+                cart.items = {}
+            for product_id, quantity in quantities:
+                key = str(product_id)
+                if quantity == 0:
+                    cart.items.pop(key, None)
+                else:
+                    cart.items[key] = quantity
+            self._touch(cart)
+            return self._copy(cart)
+
+    def get_or_create(self, user_id: int) -> Cart:
+        with self._t.lock:
+            cart = self._t.carts.get(user_id) or self._create(user_id)
+            return self._copy(cart)
+
+    def get(self, user_id: int, cart_id: int) -> Optional[Cart]:
+        with self._t.lock:
+            cart = self._t.carts.get(user_id)
+            if cart is None or cart.id != cart_id:
+                return None
+            return self._copy(cart)
+
+    def get_priced(
+            self,
+            user_id: int,
+            cart_id: int,
+            items: Optional[Dict[str, int]] = None
+        ) -> Tuple[List[dict], float]:
+        with self._t.lock:
+            if items is None:
+                cart = self._t.carts.get(user_id)
+                items = cart.items if cart and cart.id == cart_id else {}
+            lines = []
+            total = 0.0
+            for pid, qty in items.items():
+                product = self._t.products.get(int(pid))
+                line_total = None
+                if product is not None:
+                    line_total = round(product.price * qty, 2)
+                    total += product.price * qty
+                lines.append({
+                    "product_id": int(pid),
+                    "product_quantity": qty,
+                    "name": product.name if product else None,
+                    "unit_price": product.price if product else None,
+                    "line_total": line_total
+                })
+
+        return lines, round(total, 2)
+
+    def save_items(self, carts: Iterable[Cart]) -> None:
+        with self._t.lock:
+            for cart in carts:
+                stored = self._t.carts.get(cart.user_id)
+                if stored is not None and stored.id == cart.id:
+                    stored.items = dict(cart.items)
+                    self._touch(stored)
+
+    def delete(self, user_id: int, cart_id: int) -> None:
+        with self._t.lock:
+            cart = self._t.carts.get(user_id)
+            if cart is not None and cart.id == cart_id:
+                del self._t.carts[user_id]
+                del self._t.cart_times[cart_id]
+
+    def delete_expired(
+            self, idle_before: str, empty_before: str, limit: int
+        ) -> int:
+        with self._t.lock:
+            expired = [
+                cart for cart in self._t.carts.values()
+                if self._t.cart_times[cart.id][1] < (
+                    idle_before if cart.items
+                    else max(idle_before, empty_before)
+                )
+            ][:limit]
+            for cart in expired:
+                self.delete(cart.user_id, cart.id)
+            return len(expired)
+
+class MemoryOrderRepository(OrderRepository):
+    def __init__(self, tables: _Tables) -> None:
+        self._t = tables
+
+    def place(self, user_id: int, cart_id: int, created_at: str) -> Order:
+        with self._t.lock:
+            cart = self._t.carts.get(user_id)
+            if cart is None or cart.id != cart_id or not cart.items:
+                raise NotFoundError("Cart is empty")
+            cart_items = [
+                {"product_id": int(pid), "product_quantity": qty}
+                for pid, qty in cart.items.items()
+            ]
+            failures = []
+            for item in cart_items:
+                if item["product_quantity"] <= 0:
+                    raise ValueError(
+                        f"Invalid quantity for product {item['product_id']}"
+                    )
+                product = self._t.products.get(item["product_id"])
+                if product is not None and product.stock is None:
+                    continue
+                available = product.stock if product else None
+                if available is None or available < item["product_quantity"]:
+                    failures.append({
+                        "product_id": item["product_id"],
+                        "requested": item["product_quantity"],
+                        "available": available
+                    })
+            if failures:
+                raise InsufficientStock(failures)
+            for item in cart_items:
+                product = self._t.products.get(item["product_id"])
+                if product is not None and product.stock is not None:
+                    product.stock -= item["product_quantity"]
+            order = Order(
+                id=self._t.next_id("orders"),
+                created_at=created_at,
+                user_id=user_id,
+                products=json.dumps(cart_items)
+            )
+            self._t.orders[order.id] = order
+            self._t.order_prices[order.id] = {
+                item["product_id"]: self._t.products[item["product_id"]].price
+                for item in cart_items
+                if item["product_id"] in self._t.products
+            }
+            del self._t.carts[user_id]
+            del self._t.cart_times[cart_id]
+            return replace(order)
+
+    def list(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None
+        ) -> List[Order]:
+        with self._t.lock:
+            orders = [
+                replace(order) for order in self._t.orders.values()
+                if _in_range(order.created_at, since, until)
+            ]
+        orders.sort(key=lambda order: (order.created_at, order.id))
+
+        return orders
+
+    def report(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None
+        ) -> List[dict]:
+        orders = self.list(since, until)
+
+        return [{
+            "order_count": len(orders),
+            "customer_count": len({order.user_id for order in orders}),
+            "units_sold": sum(
+                item["product_quantity"]
+                for order in orders
+                for item in json.loads(order.products)
+            )
+        }]
+
+    def line_batches(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None,
+            columns: Sequence[str] = ORDER_LINE_COLUMNS,
+            batch_size: int = 10000
+        ) -> Iterator[List[tuple]]:
+        with self._t.lock:
+            lines = []
+            for order in self._t.orders.values():
+                if not _in_range(order.created_at, since, until):
+                    continue
+                day = int(order.created_at[:10].replace("-", ""))
+                prices = self._t.order_prices.get(order.id, {})
+                for item in json.loads(order.products):
+                    product_id = item["product_id"]
+                    product = self._t.products.get(product_id)
+                    price = prices.get(
+                        product_id, product.price if product else 0.0
+                    )
+                    line = {
+                        "order_id": order.id,
+                        "day": day,
+                        "product_id": product_id,
+                        "quantity": item["product_quantity"],
+                        "unit_price": price
+                    }
+                    lines.append(tuple(line[column] for column in columns))
+        for start in range(0, len(lines), batch_size):
+            yield lines[start:start + batch_size]
+
+    # Nothing is materialized; the summaries are computed from the orders.
+    def product_sales(self) -> Dict[int, Tuple[int, float]]:
+        sales: Dict[int, Tuple[int, float]] = {}
+        for batch in self.line_batches(
+            columns=("product_id", "quantity", "unit_price")
+        ):
+            for product_id, quantity, price in batch:
+                units, revenue = sales.get(product_id, (0, 0.0))
+                sales[product_id] = (
+                    units + quantity, revenue + quantity * price
+                )
+
+        return sales
+
+    def daily_sales(self) -> Dict[int, Tuple[int, float]]:
+        orders: Dict[int, set] = {}
+        revenues: Dict[int, float] = {}
+        for batch in self.line_batches(
+            columns=("order_id", "day", "quantity", "unit_price")
+        ):
+            for order_id, day, quantity, price in batch:
+                orders.setdefault(day, set()).add(order_id)
+                revenues[day] = revenues.get(day, 0.0) + quantity * price
+
+        return {day: (len(orders[day]), revenues[day]) for day in orders}
+
+class MemoryIdempotencyRepository(IdempotencyRepository):
+    def __init__(self, tables: _Tables) -> None:
+        self._t = tables
+
+    def begin(
+            self,
+            key: str,
+            scope: str,
+            fingerprint: str,
+            now: float,
+            ttl_seconds: float
+        ) -> Optional[IdempotencyRecord]:
+        with self._t.lock:
+            record = self._t.idempotency_keys.get((key, scope))
+            if record is not None and record.expires_at > now:
+                return replace(record)
+            self._t.idempotency_keys[(key, scope)] = IdempotencyRecord(
+                key=key,
+                scope=scope,
+                fingerprint=fingerprint,
+                status_code=None,
+                response_body=None,
+                created_at=now,
+                expires_at=now + ttl_seconds
+            )
+            return None
+
+    def complete(
+            self,
+            key: str,
+            scope: str,
+            status_code: int,
+            response_body: bytes
+        ) -> bool:
+        with self._t.lock:
+            record = self._t.idempotency_keys.get((key, scope))
+            if record is None:
+                return False
+            record.status_code = status_code
+            record.response_body = response_body
+            return True
+
+    def release(self, key: str, scope: str) -> None:
+        with self._t.lock:
+            record = self._t.idempotency_keys.get((key, scope))
+            if record is not None and record.status_code is None:
+                del self._t.idempotency_keys[(key, scope)]
+
+    def purge(self, now: float) -> int:
+        with self._t.lock:
+            expired = [
+                k for k, record in self._t.idempotency_keys.items()
+                if record.expires_at <= now
+            ]
+            for k in expired:
+                del self._t.idempotency_keys[k]
+            return len(expired)
+
+class MemoryBackend(StorageBackend):
+    def __init__(self) -> None:
+        tables = _Tables()
+        self.users = MemoryUserRepository(tables)
+        self.products = MemoryProductRepository(tables)
+        self.carts = MemoryCartRepository(tables)
+        self.orders = MemoryOrderRepository(tables)
+        self.idempotency = MemoryIdempotencyRepository(tables)
@@ -0,0 +1,350 @@
+"""
+Versioned schema migrations.
+
+A database's schema version is its ``PRAGMA user_version``: init_db
+creates the base schema (version 0) and then applies every newer
+migration in order, so running the app (or this module) brings any
+database up to date. Shards get the migrations of the user-scoped tables
+only.
+
+Migrations run on the database's writer thread, interleaved with the
+live write traffic. A migration has two parts:
+- schema: quick DDL, committed in one transaction.
+- backfill: copies existing rows into the new shape in batches of
+  batch_size rows, one transaction each, so writers are never locked
+  out for long. It is resumable: a batch that was already copied is
+  copied again harmlessly.
+The version is bumped once the backfill is done, or in the schema's own
+transaction when there is no backfill. A crash before the bump makes the
+next start run the migration again, so schema steps must be safe to
+rerun: IF NOT EXISTS, and columns added only if missing. The code writing the
+new shape must be deployed when the migration runs (which is why the
+app runs them on startup), otherwise rows written by old code after the
+backfill are never copied.
+
+Usage:
+    python3 -m db.migrations [--db PATH] [--shard] [--batch-size N] [--status]
+"""
+import argparse
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+from db import related_products, sales_summary
+from db.database import (
+    DB_PATH,
+    default_db_path,
+    get_read_connection,
+    run_write
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# A backfill copies the rows after a key and returns the last key it
+# copied, or None when there is nothing left.
+Backfill = Callable[[sqlite3.Connection, int, int], Optional[int]]
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    schema: Callable[[sqlite3.Connection], None]
+    backfill: Optional[Backfill] = None
+    # Applies to shards too (changes only carts and orders)
+    user_scoped: bool = False
+
+def _index_carts_user_id(conn: sqlite3.Connection) -> None:
+    # Every cart lookup is by user id.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_carts_user_id ON carts (user_id)"
+    )
+
+def _create_order_items(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS order_items (
+        order_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (order_id, product_id),
+        FOREIGN KEY(order_id) REFERENCES orders(id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_order_items_product_id
+    ON order_items (product_id)
+    """)
+
+def _backfill_order_items(
+        conn: sqlite3.Connection, after_id: int, batch_size: int
+    ) -> Optional[int]:
+    # orders.products holds '[{"product_id": 101, "product_quantity": 3}]'
+    batch = "SELECT * FROM orders WHERE id > ? ORDER BY id LIMIT ?"
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO order_items
+            (order_id, user_id, product_id, quantity)
+        SELECT
+            o.id,
+            o.user_id,
+            json_extract(j.value, '$.product_id'),
+            json_extract(j.value, '$.product_quantity')
+        FROM ({batch}) o, json_each(o.products) j
+        """,
+        (after_id, batch_size)
+    )
+    return conn.execute(
+        f"SELECT MAX(id) FROM ({batch})", (after_id, batch_size)
+    ).fetchone()[0]
+
+def _add_columns(
+        conn: sqlite3.Connection, table: str, columns: List[Tuple[str, str]]
+    ) -> None:
+    # ADD COLUMN has no IF NOT EXISTS; skipping the columns a table already
+    # has makes the step safe to run again after a crash.
+    existing = {
+        row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+    }
+    for name, column_type in columns:
+        if name not in existing:
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"
+            )
+
+def _add_order_item_facts(conn: sqlite3.Connection) -> None:
+    # Analytics scan order_items alone: joining every line to its order
+    # costs several times the scan.
+    _add_columns(conn, "order_items", [
+        ("unit_price", "REAL"),
+        ("created_at", "TEXT"),
+        # created_at's date as YYYYMMDD
+        ("day", "INTEGER")
+    ])
+
+def _backfill_order_item_facts(
+        conn: sqlite3.Connection, after_id: int, batch_size: int
+    ) -> Optional[int]:
+    # The price paid wasn't recorded before; the current price is the best
+    # estimate left (NULL for deleted products).
+    batch = (
+        "SELECT id, created_at FROM orders WHERE id > ? ORDER BY id LIMIT ?"
+    )
+    conn.execute(
+        f"""
+        UPDATE order_items SET
+            created_at = o.created_at,
+            day = CAST(strftime('%Y%m%d', o.created_at) AS INTEGER),
+            unit_price = COALESCE(
+                unit_price,
+                (SELECT price FROM products WHERE id = order_items.product_id)
+            )
+        FROM ({batch}) o
+        WHERE order_items.order_id = o.id
+        """,
+        (after_id, batch_size)
+    )
+    return conn.execute(
+        f"SELECT MAX(id) FROM ({batch})", (after_id, batch_size)
+    ).fetchone()[0]
+
+def _create_sales_summaries(conn: sqlite3.Connection) -> None:
+    # Summarizing in SQL takes about a second per million order lines, so
+    # the existing orders are counted in the same transaction instead of
+    # in batches, which would race with checkouts counting themselves.
+    sales_summary.create_tables(conn)
+    sales_summary.recompute(conn)
+
+def _create_related_products(conn: sqlite3.Connection) -> None:
+    # Empty until db.related_products counts the order history.
+    related_products.create_tables(conn)
+
+def _create_catalog_changes(conn: sqlite3.Connection) -> None:
+    # AUTOINCREMENT, so a sequence number is never handed out twice even
+    # if the newest changes are deleted.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS catalog_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL,
+        change TEXT NOT NULL,
+        name TEXT,
+        description TEXT,
+        price REAL,
+        changed_at TEXT NOT NULL
+            DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    )
+    """)
+    # Consumers starting from sequence 0 get the existing catalog first.
+    # Seeded only into an empty log, so a rerun doesn't add it twice.
+    conn.execute("""
+    INSERT INTO catalog_changes (product_id, change, name, description, price)
+    SELECT id, 'add', name, description, price FROM products
+    WHERE NOT EXISTS (SELECT 1 FROM catalog_changes)
+    ORDER BY id
+    """)
+
+def _add_cart_times(conn: sqlite3.Connection) -> None:
+    # UTC timestamps, see db.repository.utc_timestamp
+    _add_columns(conn, "carts", [
+        ("created_at", "TEXT"),
+        ("updated_at", "TEXT")
+    ])
+    # The expiry sweep walks carts by age.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_carts_updated_at"
+        " ON carts (updated_at)"
+    )
+
+def _backfill_cart_times(
+        conn: sqlite3.Connection, after_id: int, batch_size: int
+    ) -> Optional[int]:
+    # When a cart was last used isn't known, so existing carts get a full
+    # TTL from now.
+    batch = "SELECT id FROM carts WHERE id > ? ORDER BY id LIMIT ?"
+    conn.execute(
+        f"""
+        UPDATE carts SET
+            created_at = COALESCE(
+                created_at, strftime('%Y-%m-%dT%H:%M:%f', 'now')
+            ),
+            updated_at = COALESCE(
+                updated_at, strftime('%Y-%m-%dT%H:%M:%f', 'now')
+            )
+        WHERE id IN ({batch})
+        """,
+        (after_id, batch_size)
+    )
+    return conn.execute(
+        f"SELECT MAX(id) FROM ({batch})", (after_id, batch_size)
+    ).fetchone()[0]
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1, "Index carts by user id", _index_carts_user_id,
+        user_scoped=True
+    ),
+    Migration(
+        2, "Normalize order items into rows", _create_order_items,
+        _backfill_order_items, user_scoped=True
+    ),
+    Migration(
+        3, "Record the price and date of order items", _add_order_item_facts,
+        _backfill_order_item_facts, user_scoped=True
+    ),
+    Migration(
+        4, "Summarize sales per product and day", _create_sales_summaries,
+        user_scoped=True
+    ),
+    Migration(
+        5, "Index products bought together", _create_related_products
+    ),
+    Migration(
+        6, "Log catalog changes", _create_catalog_changes
+    ),
+    Migration(
+        7, "Record when carts are created and updated", _add_cart_times,
+        _backfill_cart_times, user_scoped=True
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def schema_version(db_path: Optional[str] = None) -> int:
+    conn = get_read_connection(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+def pending_migrations(
+        db_path: Optional[str] = None, shard: bool = False
+    ) -> List[Migration]:
+    version = schema_version(db_path)
+
+    return [
+        migration for migration in MIGRATIONS
+        if migration.version > version and (migration.user_scoped or not shard)
+    ]
+
+def _set_version(conn: sqlite3.Connection, version: int) -> None:
+    # PRAGMA doesn't take parameters; the version is an int.
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+def _apply_schema(conn: sqlite3.Connection, migration: Migration) -> None:
+    migration.schema(conn)
+    _set_version(conn, migration.version)
+
+def migrate(
+        db_path: Optional[str] = None,
+        shard: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        pause: float = 0.0
+    ) -> List[int]:
+    """
+    Applies the pending migrations of a database in version order.
+
+    :param shard: The database is a shard; only user-scoped migrations
+        apply.
+    :param batch_size: Rows copied per backfill transaction.
+    :param pause: Seconds to wait between backfill batches.
+
+    :return: Versions applied.
+    """
+    db_path = db_path or default_db_path()
+    applied = []
+    for migration in pending_migrations(db_path, shard):
+        logger.info(
+            "Migrating %s to version %d: %s",
+            db_path, migration.version, migration.description
+        )
+        if migration.backfill is None:
+            # Nothing to copy, so the version is bumped with the schema.
+            run_write(
+                lambda conn, migration=migration: _apply_schema(
+                    conn, migration
+                ),
+                db_path
+            )
+        else:
+            run_write(migration.schema, db_path)
+            after = 0
+            while after is not None:
+                after = run_write(
+                    lambda conn, after=after: migration.backfill(
+                        conn, after, batch_size
+                    ),
+                    db_path
+                )
+                if after is not None and pause > 0:
+                    time.sleep(pause)
+            run_write(
+                lambda conn, version=migration.version: _set_version(
+                    conn, version
+                ),
+                db_path
+            )
+        applied.append(migration.version)
+
+    return applied
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Apply pending schema migrations."
+    )
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--shard", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--pause-ms", type=float, default=0.0)
+    parser.add_argument("--status", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.status:
+        print(f"version {schema_version(args.db)}")
+        for migration in pending_migrations(args.db, args.shard):
+            print(f"pending {migration.version}: {migration.description}")
+    else:
+        print(migrate(
+            args.db, args.shard, args.batch_size, args.pause_ms / 1000
+        ))
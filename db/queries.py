@@ -0,0 +1,168 @@
+"""
+Named SQL statements of the hot paths.
+
+sqlite3 keeps the last CACHED_STATEMENTS statements a connection
+prepared (see db.database), keyed by their exact SQL text. Pooled read
+connections and the writer connection live long, so a query written
+once here is compiled once per connection and then only re-bound;
+assembling the same query in several places, or with f-strings, would
+compile it again for every spelling.
+"""
+
+# Users
+USER_INSERT = "INSERT INTO users (username, password, role) VALUES (?, ?, ?)"
+USER_BY_ID = "SELECT * FROM users WHERE id = ?"
+USER_BY_USERNAME = "SELECT * FROM users WHERE username = ?"
+
+# Products
+PRODUCT_INSERT = """
+    INSERT INTO products (name, description, price, stock)
+    VALUES (?, ?, ?, ?)
+"""
+PRODUCT_UPDATE = """
+    UPDATE products
+    SET name = ?, description = ?, price = ?, stock = ?
+    WHERE id = ?
+"""
+PRODUCT_DELETE = "DELETE FROM products WHERE id = ?"
+PRODUCT_BY_ID = "SELECT * FROM products WHERE id = ?"
+PRODUCT_EXISTS = "SELECT 1 FROM products WHERE id = ?"
+PRODUCTS_ALL = "SELECT * FROM products"
+# Takes the ids as one JSON array, so any number of ids share a statement.
+PRODUCT_IDS_IN = """
+    SELECT id FROM products
+    WHERE id IN (SELECT value FROM json_each(?))
+"""
+PRODUCTS_BY_IDS = """
+    SELECT * FROM products
+    WHERE id IN (SELECT value FROM json_each(?))
+"""
+PRODUCT_STOCK = "SELECT stock FROM products WHERE id = ?"
+# A non-positive quantity would add stock instead of reserving it.
+STOCK_RESERVE = """
+    UPDATE products SET stock = stock - ?
+    WHERE id = ? AND stock IS NOT NULL AND stock >= ? AND ? > 0
+"""
+STOCK_RELEASE = """
+    UPDATE products SET stock = stock + ?
+    WHERE id = ? AND stock IS NOT NULL
+"""
+RELATED_PRODUCTS = """
+SELECT p.*, r.orders AS related_orders
+FROM related_products r JOIN products p ON p.id = r.related_id
+WHERE r.product_id = ?
+ORDER BY r.rank
+LIMIT ?
+"""
+CATALOG_VERSION = "SELECT version FROM catalog_version WHERE id = 1"
+CATALOG_VERSION_BUMP = (
+    "UPDATE catalog_version SET version = version + 1 WHERE id = 1"
+)
+CATALOG_CHANGE_INSERT = """
+    INSERT INTO catalog_changes (product_id, change, name, description, price)
+    VALUES (?, ?, ?, ?, ?)
+"""
+CATALOG_CHANGES_SINCE = """
+    SELECT * FROM catalog_changes WHERE seq > ? ORDER BY seq LIMIT ?
+"""
+
+# Carts
+CART_BY_USER = "SELECT id, items FROM carts WHERE user_id = ?"
+CART_ITEMS = "SELECT items FROM carts WHERE user_id = ? AND id = ?"
+# UTC, the format of db.repository.utc_timestamp
+_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+CART_INSERT = f"""
+    INSERT INTO carts (user_id, items, created_at, updated_at)
+    VALUES (?, ?, {_NOW}, {_NOW})
+"""
+CART_UPDATE_ITEMS = f"""
+    UPDATE carts SET items = ?, updated_at = {_NOW}
+    WHERE id = ? AND user_id = ?
+"""
+CART_DELETE = "DELETE FROM carts WHERE user_id = ? AND id = ?"
+# Walks idx_carts_updated_at up to the later of the two cut-offs.
+CARTS_DELETE_EXPIRED = """
+    DELETE FROM carts WHERE id IN (
+        SELECT id FROM carts
+        WHERE updated_at < MAX(:idle_before, :empty_before)
+            AND (updated_at < :idle_before OR items = '{}')
+        LIMIT :limit
+    )
+"""
+
+# Orders
+ORDER_INSERT = (
+    "INSERT INTO orders (user_id, created_at, products) VALUES (?, ?, ?)"
+)
+ORDER_ITEM_INSERT = """
+    INSERT INTO order_items
+        (order_id, user_id, product_id, quantity, unit_price, created_at, day)
+    VALUES (
+        :order_id, :user_id, :product_id, :quantity,
+        (SELECT price FROM products WHERE id = :product_id),
+        :created_at, CAST(strftime('%Y%m%d', :created_at) AS INTEGER)
+    )
+"""
+_ORDER_LINE_COLUMNS = {
+    "order_id": "order_id",
+    "day": "day",
+    "product_id": "product_id",
+    "quantity": "quantity",
+    "unit_price": "COALESCE(unit_price, 0.0)",
+}
+
+def order_lines(columns) -> str:
+    """
+    Columns (of db.repository.ORDER_LINE_COLUMNS) of the lines of the
+    orders created in [:since, :until). The text only depends on the
+    columns, so every reader of the same columns shares the statement.
+    """
+    return f"""
+    SELECT {", ".join(_ORDER_LINE_COLUMNS[column] for column in columns)}
+    FROM order_items
+    WHERE (:since IS NULL OR created_at >= :since)
+        AND (:until IS NULL OR created_at < :until)
+    """
+# Count the lines of order :order_id in the sales summaries; run in the
+# transaction inserting them (see db.sales_summary).
+PRODUCT_SALES_ADD = """
+    INSERT INTO product_sales (product_id, quantity, revenue)
+    SELECT product_id, quantity, quantity * COALESCE(unit_price, 0.0)
+    FROM order_items WHERE order_id = :order_id
+    ON CONFLICT (product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue
+"""
+DAILY_SALES_ADD = """
+    INSERT INTO daily_sales (day, orders, revenue)
+    SELECT day, 1, SUM(quantity * COALESCE(unit_price, 0.0))
+    FROM order_items WHERE order_id = :order_id
+    GROUP BY day
+    ON CONFLICT (day) DO UPDATE SET
+        orders = orders + 1,
+        revenue = revenue + excluded.revenue
+"""
+PRODUCT_SALES_ALL = "SELECT product_id, quantity, revenue FROM product_sales"
+DAILY_SALES_ALL = "SELECT day, orders, revenue FROM daily_sales"
+
+# Idempotency keys
+IDEMPOTENCY_KEY_GET = (
+    "SELECT * FROM idempotency_keys WHERE key = ? AND scope = ?"
+)
+IDEMPOTENCY_KEY_DELETE = (
+    "DELETE FROM idempotency_keys WHERE key = ? AND scope = ?"
+)
+IDEMPOTENCY_KEY_INSERT = """
+    INSERT INTO idempotency_keys
+        (key, scope, fingerprint, created_at, expires_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+IDEMPOTENCY_KEY_COMPLETE = """
+    UPDATE idempotency_keys SET status_code = ?, response_body = ?
+    WHERE key = ? AND scope = ?
+"""
+IDEMPOTENCY_KEY_RELEASE = """
+    DELETE FROM idempotency_keys
+    WHERE key = ? AND scope = ? AND status_code IS NULL
+"""
+IDEMPOTENCY_KEYS_PURGE = "DELETE FROM idempotency_keys WHERE expires_at <= ?"
@@ -0,0 +1,428 @@
+"""
+"Frequently bought together": a product co-occurrence index.
+
+product_pairs is the sparse co-occurrence matrix of the catalog: for
+every two products bought together, the number of orders containing
+both, stored once per direction. related_products keeps the top_k
+largest entries of every product's row, ranked, so the related products
+of a product are one primary key range read.
+
+update() catches up with the orders placed since its last run. It reads
+their lines into columns, counts their pairs (vectorized with NumPy when
+it is installed), adds the counts to product_pairs and re-ranks only the
+products they touched. Every batch of orders is one transaction on the
+main database, together with the progress made, so an interrupted
+update resumes where it stopped. Progress is kept per shard id range
+(see db.database.SHARD_ID_SPAN) rather than per shard, so orders moved
+by rebalancing aren't counted twice. Deleted products are left out of
+the rankings, and deleting one marks the products ranking it for the
+next update to re-rank. rebuild() starts over from the whole order
+history.
+
+The app runs update() every RELATED_PRODUCTS_REFRESH_SECONDS when it is
+set; otherwise run this module from cron.
+
+Usage:
+    python3 -m db.related_products {update,rebuild} [--db PATH] [--top-k K]
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from itertools import groupby, permutations
+from operator import itemgetter
+from typing import Dict, Optional, Sequence, Tuple
+from db.database import (
+    SHARD_ID_SPAN,
+    default_db_path,
+    get_read_connection,
+    run_write
+)
+from db.sharding import get_shard_map
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 10
+# Orders counted per transaction
+DEFAULT_BATCH_SIZE = 5000
+# Products re-ranked per transaction
+RERANK_BATCH_SIZE = 500
+
+# Set to False to count pairs without NumPy even when it is installed.
+USE_NUMPY = True
+
+Pairs = Dict[Tuple[int, int], int]
+
+def _numpy():
+    if not USE_NUMPY:
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS product_pairs (
+        product_id INTEGER NOT NULL,
+        related_id INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        PRIMARY KEY (product_id, related_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS related_products (
+        product_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        related_id INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        PRIMARY KEY (product_id, rank)
+    ) WITHOUT ROWID
+    """)
+    # Products whose pairs changed since they were last ranked
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS related_products_stale (
+        product_id INTEGER PRIMARY KEY
+    )
+    """)
+    # Last order counted per id range (order id // SHARD_ID_SPAN)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS related_products_progress (
+        id_range INTEGER PRIMARY KEY,
+        last_order_id INTEGER NOT NULL
+    )
+    """)
+
+def count_pairs(order_ids: array, product_ids: array) -> Pairs:
+    """
+    Counts the ordered pairs of products bought in the same order.
+
+    :param order_ids: Order id of every line; the lines of an order must
+        be adjacent.
+    :param product_ids: Product id of every line, distinct per order.
+
+    :return: Dictionary of (product id, related id) -> orders.
+    """
+    numpy = _numpy()
+    if numpy is None:
+        pairs: Counter = Counter()
+        for _, lines in groupby(zip(order_ids, product_ids), itemgetter(0)):
+            pairs.update(permutations([line[1] for line in lines], 2))
+        return dict(pairs)
+
+    orders = numpy.frombuffer(order_ids, dtype=numpy.int64)
+    products = numpy.frombuffer(product_ids, dtype=numpy.int64)
+    lefts, rights = [], []
+    # Line i and line i + distance pair up when they belong to the same
+    # order. An order of n lines has pairs up to distance n - 1, so the
+    # first distance without any ends the search.
+    for distance in range(1, len(orders)):
+        same = orders[:-distance] == orders[distance:]
+        if not same.any():
+            break
+        lefts.append(products[:-distance][same])
+        rights.append(products[distance:][same])
+    if not lefts:
+        return {}
+    # Every ordered pair as one int64 (product ids are far below 2**31),
+    # so a 1-d unique counts them.
+    left = numpy.concatenate(lefts + rights)
+    right = numpy.concatenate(rights + lefts)
+    keys, counts = numpy.unique(
+        (left << 32) | right, return_counts=True
+    )
+
+    return {
+        (key >> 32, key & 0xFFFFFFFF): count
+        for key, count in zip(keys.tolist(), counts.tolist())
+    }
+
+def _batch_end(
+        path: str, after: int, end: int, batch_size: int
+    ) -> Optional[int]:
+    conn = get_read_connection(path)
+    try:
+        return conn.execute(
+            """
+            SELECT MAX(id) FROM (
+                SELECT id FROM orders WHERE id > ? AND id < ?
+                ORDER BY id LIMIT ?
+            )
+            """,
+            (after, end, batch_size)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+def _read_lines(
+        path: str, after: int, last: int, order_ids: array, product_ids: array
+    ) -> None:
+    conn = get_read_connection(path)
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            """
+            SELECT order_id, product_id FROM order_items
+            WHERE order_id > ? AND order_id <= ?
+            ORDER BY order_id
+            """,
+            (after, last)
+        )
+        batch = cursor.fetchmany(10000)
+        while batch:
+            batch_order_ids, batch_product_ids = zip(*batch)
+            order_ids.extend(batch_order_ids)
+            product_ids.extend(batch_product_ids)
+            batch = cursor.fetchmany(10000)
+    finally:
+        conn.close()
+
+def _count(
+        conn: sqlite3.Connection,
+        id_range: int,
+        after: int,
+        last: int,
+        pairs: Pairs
+    ) -> bool:
+    row = conn.execute(
+        "SELECT last_order_id FROM related_products_progress"
+        " WHERE id_range = ?",
+        (id_range,)
+    ).fetchone()
+    if (row[0] if row else None) != (after if row else None):
+        # Another update counted these orders meanwhile.
+        return False
+    conn.executemany(
+        """
+        INSERT INTO product_pairs (product_id, related_id, orders)
+        VALUES (?, ?, ?)
+        ON CONFLICT (product_id, related_id) DO UPDATE SET
+            orders = orders + excluded.orders
+        """,
+        # In key order, so the upserts walk the index once.
+        ((product_id, related_id, count)
+         for (product_id, related_id), count in sorted(pairs.items()))
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO related_products_stale (product_id)"
+        " VALUES (?)",
+        ((product_id,) for product_id in {pair[0] for pair in pairs})
+    )
+    conn.execute(
+        """
+        INSERT INTO related_products_progress (id_range, last_order_id)
+        VALUES (?, ?)
+        ON CONFLICT (id_range) DO UPDATE SET
+            last_order_id = excluded.last_order_id
+        """,
+        (id_range, last)
+    )
+    return True
+
+def _rerank(conn: sqlite3.Connection, top_k: int) -> int:
+    stale = [row[0] for row in conn.execute(
+        "SELECT product_id FROM related_products_stale LIMIT ?",
+        (RERANK_BATCH_SIZE,)
+    )]
+    for product_id in stale:
+        conn.execute(
+            "DELETE FROM related_products WHERE product_id = ?",
+            (product_id,)
+        )
+        conn.execute(
+            """
+            INSERT INTO related_products
+                (product_id, rank, related_id, orders)
+            SELECT
+                product_id,
+                ROW_NUMBER() OVER (ORDER BY orders DESC, related_id),
+                related_id,
+                orders
+            FROM product_pairs
+            WHERE product_id = ? AND related_id IN (SELECT id FROM products)
+            ORDER BY orders DESC, related_id
+            LIMIT ?
+            """,
+            (product_id, top_k)
+        )
+    conn.executemany(
+        "DELETE FROM related_products_stale WHERE product_id = ?",
+        ((product_id,) for product_id in stale)
+    )
+    return len(stale)
+
+def forget_product(conn: sqlite3.Connection, product_id: int) -> None:
+    """
+    Marks the products ranking a deleted product as stale, so the next
+    update fills their top_k from the products that remain.
+    """
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO related_products_stale (product_id)
+        SELECT product_id FROM related_products WHERE related_id = ?
+        """,
+        (product_id,)
+    )
+
+def _progress(db_path: str) -> Dict[int, int]:
+    conn = get_read_connection(db_path)
+    try:
+        return dict(conn.execute(
+            "SELECT id_range, last_order_id FROM related_products_progress"
+        ).fetchall())
+    finally:
+        conn.close()
+
+def update(
+        db_path: Optional[str] = None,
+        top_k: int = TOP_K,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Dict[str, int]:
+    """
+    Counts the orders placed since the last update and re-ranks the
+    products they contain.
+
+    :param top_k: Related products kept per product.
+    :param batch_size: Orders counted per transaction.
+
+    :return: Dictionary with the orders and pairs counted and the
+        products re-ranked.
+    """
+    db_path = db_path or default_db_path()
+    shard_map = get_shard_map(db_path)
+    paths: Sequence[str] = shard_map.shard_paths if shard_map else [db_path]
+    progress = _progress(db_path)
+    stats = {"orders": 0, "pairs": 0, "reranked": 0}
+    for id_range in range(len(paths)):
+        after = progress.get(id_range, id_range * SHARD_ID_SPAN)
+        end = (id_range + 1) * SHARD_ID_SPAN
+        while True:
+            # Orders of a range normally live on its shard, but
+            # rebalancing can move some anywhere. A batch ends at the
+            # first end of all shards, so none is skipped.
+            ends = [
+                last for last in (
+                    _batch_end(path, after, end, batch_size)
+                    for path in paths
+                ) if last is not None
+            ]
+            if not ends:
+                break
+            last = min(ends)
+            order_ids, product_ids = array("q"), array("q")
+            for path in paths:
+                # An order's lines are on one shard, so they stay adjacent.
+                _read_lines(path, after, last, order_ids, product_ids)
+            pairs = count_pairs(order_ids, product_ids)
+            if not run_write(
+                lambda conn, after=after, last=last, pairs=pairs: _count(
+                    conn, id_range, after, last, pairs
+                ),
+                db_path
+            ):
+                logger.warning("Orders were counted by a concurrent update")
+                return stats
+            stats["orders"] += len(set(order_ids))
+            stats["pairs"] += sum(pairs.values())
+            after = last
+    reranked = 1
+    while reranked:
+        reranked = run_write(lambda conn: _rerank(conn, top_k), db_path)
+        stats["reranked"] += reranked
+
+    return stats
+
+def rebuild(
+        db_path: Optional[str] = None,
+        top_k: int = TOP_K,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Dict[str, int]:
+    """
+    Recomputes the index from the whole order history. Products have no
+    related products until it is done.
+    """
+    def _clear(conn: sqlite3.Connection) -> None:
+        for table in (
+            "product_pairs",
+            "related_products",
+            "related_products_stale",
+            "related_products_progress"
+        ):
+            conn.execute(f"DELETE FROM {table}")
+
+    run_write(_clear, db_path)
+    return update(db_path, top_k, batch_size)
+
+class Updater:
+    """Runs update() in the background every refresh_seconds."""
+    def __init__(
+            self,
+            db_path: str,
+            refresh_seconds: float,
+            top_k: int = TOP_K
+        ) -> None:
+        self.db_path = db_path
+        self.refresh_seconds = refresh_seconds
+        self.top_k = top_k
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="related-products", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                update(self.db_path, self.top_k)
+            except Exception:
+                # Logged and retried next time; a dead thread would leave
+                # the index stale without a trace.
+                logger.exception("Related products update failed")
+
+_updaters: Dict[str, Updater] = {}
+
+def start_updates(
+        refresh_seconds: float,
+        top_k: int = TOP_K,
+        db_path: Optional[str] = None
+    ) -> Updater:
+    """Starts updating the index of a database in the background."""
+    db_path = db_path or default_db_path()
+    stop_updates(db_path)
+    updater = Updater(db_path, refresh_seconds, top_k)
+    updater.start()
+    _updaters[db_path] = updater
+
+    return updater
+
+def stop_updates(db_path: Optional[str] = None) -> None:
+    updater = _updaters.pop(db_path or default_db_path(), None)
+    if updater is not None:
+        updater.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Update or rebuild the related products index."
+    )
+    parser.add_argument("command", choices=["update", "rebuild"])
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    command = update if args.command == "update" else rebuild
+    print(command(args.db, args.top_k, args.batch_size))
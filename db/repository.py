@@ -0,0 +1,444 @@
+"""
+Storage interface used by the services.
+
+The services never talk SQL. They get a StorageBackend for a database
+with get_backend(db_path) and call its repositories: users, products,
+carts, orders and idempotency keys. Every repository method is one
+atomic operation, so a backend is free to implement it with a single
+transaction, a lock or a server-side statement.
+
+Two backends ship with the project:
+- db.sqlite_backend.SQLiteBackend, the default, stores a database in a
+  SQLite file (and its shards).
+- db.memory_backend.MemoryBackend keeps everything in process memory,
+  for tests and benchmarks that don't care about durability.
+
+A server RDBMS driver only has to implement the abstract classes below;
+nothing in the interface depends on SQLite types, parameter styles or
+row objects.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+from db.database import default_db_path
+from src.models import (
+    Cart,
+    CatalogChange,
+    IdempotencyRecord,
+    Order,
+    Product,
+    User
+)
+
+class StorageError(Exception):
+    pass
+
+class DuplicateError(StorageError):
+    """A unique value, such as a username, is already taken."""
+
+class NotFoundError(StorageError):
+    pass
+
+class ConflictError(StorageError):
+    """The data changed concurrently; the operation can be retried."""
+
+class InsufficientStock(StorageError):
+    def __init__(self, failures: List[dict]) -> None:
+        """
+        :param failures: One dictionary per short item, with
+            'product_id', 'requested' and 'available' (None if the
+            product no longer exists).
+        """
+        self.failures = failures
+        super().__init__("Insufficient stock")
+
+class UserRepository(ABC):
+    @abstractmethod
+    def add(self, username: str, password: str, role: str) -> User:
+        """
+        Inserts a user; password is already hashed.
+
+        :raises DuplicateError: The username is taken.
+        """
+
+    @abstractmethod
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        pass
+
+    @abstractmethod
+    def get_by_username(self, username: str) -> Optional[User]:
+        pass
+
+class ProductRepository(ABC):
+    """
+    Products and their stock. Every change bumps the catalog version.
+    """
+    @abstractmethod
+    def add(
+            self,
+            name: str,
+            description: str,
+            price: float,
+            stock: Optional[int]
+        ) -> Product:
+        pass
+
+    @abstractmethod
+    def update(
+            self,
+            product_id: int,
+            name: Optional[str] = None,
+            description: Optional[str] = None,
+            price: Optional[float] = None,
+            stock: Optional[int] = None
+        ) -> Product:
+        """
+        Changes the given fields; None leaves a field unchanged.
+
+        :raises NotFoundError: The product doesn't exist.
+        """
+
+    @abstractmethod
+    def delete(self, product_id: int) -> None:
+        """:raises NotFoundError: The product doesn't exist."""
+
+    @abstractmethod
+    def get(self, product_id: int) -> Optional[Product]:
+        """Reads a product; may lag behind recent writes."""
+
+    @abstractmethod
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        """
+        Reads products by id in one query; may lag behind recent writes.
+
+        :return: Dictionary of the products found, by id.
+        """
+
+    @abstractmethod
+    def list_all(self) -> List[Product]:
+        """Reads all products; may lag behind recent writes."""
+
+    @abstractmethod
+    def find_missing(self, product_ids: Iterable[int]) -> List[int]:
+        """Returns the ids that don't exist, reading the latest data."""
+
+    @abstractmethod
+    def catalog_version(self) -> int:
+        pass
+
+    @abstractmethod
+    def catalog_snapshot(self) -> Tuple[int, List[Product]]:
+        """Reads the catalog version and all products consistently."""
+
+    @abstractmethod
+    def changes(self, since: int, limit: int) -> List[CatalogChange]:
+        """
+        Reads the catalog changes with a sequence number above since,
+        oldest first. Every add, update and delete logs one change in its
+        own transaction.
+        """
+
+    @abstractmethod
+    def related(
+            self, product_id: int, limit: int
+        ) -> List[Tuple[Product, int]]:
+        """
+        Reads the products most often bought together with a product, with
+        the number of orders containing both, most frequent first. Deleted
+        products are left out. May lag behind recent orders.
+        """
+
+class CartRepository(ABC):
+    """
+    Carts, at most one per user. Items map product ids, as strings, to
+    quantities.
+    """
+    @abstractmethod
+    def add_items(
+            self, user_id: int, products: Sequence[Tuple[int, int]]
+        ) -> Cart:
+        """
+        Adds quantities to the user's cart, creating it if needed.
+
+        :raises NotFoundError: A product doesn't exist; nothing changes.
+        """
+
+    @abstractmethod
+    def set_items(
+            self,
+            user_id: int,
+            quantities: Sequence[Tuple[int, int]],
+            replace: bool = False
+        ) -> Cart:
+        """
+        Sets the quantities of products in the user's cart, creating it if
+        needed. A quantity of 0 removes the line.
+
+        :param quantities: (product_id, quantity) tuples.
+        :param replace: Remove the lines not in quantities first.
+
+        :raises NotFoundError: A product given a quantity doesn't exist;
+            nothing changes.
+        """
+
+    @abstractmethod
+    def get_or_create(self, user_id: int) -> Cart:
+        pass
+
+    @abstractmethod
+    def get(self, user_id: int, cart_id: int) -> Optional[Cart]:
+        pass
+
+    @abstractmethod
+    def get_priced(
+            self,
+            user_id: int,
+            cart_id: int,
+            items: Optional[Dict[str, int]] = None
+        ) -> Tuple[List[dict], float]:
+        """
+        Prices a cart against the current catalog.
+
+        :param items: Price these items instead of the stored ones.
+
+        :return: Tuple of (lines, total). Lines have 'product_id',
+            'product_quantity', 'name', 'unit_price' and 'line_total';
+            prices are None for products that no longer exist.
+        """
+
+    @abstractmethod
+    def save_items(self, carts: Iterable[Cart]) -> None:
+        """
+        Overwrites the items of existing carts; deleted carts stay
+        deleted.
+        """
+
+    @abstractmethod
+    def delete(self, user_id: int, cart_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def delete_expired(
+            self, idle_before: str, empty_before: str, limit: int
+        ) -> int:
+        """
+        Deletes carts last changed before idle_before, and empty carts
+        last changed before empty_before, at most limit per transaction
+        (per shard).
+
+        :param idle_before: UTC timestamp, see utc_timestamp.
+        :param empty_before: UTC timestamp, see utc_timestamp.
+
+        :return: Number of carts deleted; call again until it is 0.
+        """
+
+# Columns of an order line. day is the order's creation date as an int,
+# YYYYMMDD. unit_price is the price paid (for lines placed before prices
+# were recorded, the price when they were migrated), or 0 when it isn't
+# known.
+ORDER_LINE_COLUMNS = (
+    "order_id", "day", "product_id", "quantity", "unit_price"
+)
+
+class OrderRepository(ABC):
+    @abstractmethod
+    def place(self, user_id: int, cart_id: int, created_at: str) -> Order:
+        """
+        Turns a cart into an order, reserving stock for tracked products
+        and deleting the cart.
+
+        :raises NotFoundError: The cart is missing or empty.
+        :raises InsufficientStock: Nothing is reserved or written.
+        """
+
+    @abstractmethod
+    def list(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None
+        ) -> List[Order]:
+        """Orders created in [since, until), oldest first."""
+
+    @abstractmethod
+    def report(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None
+        ) -> List[dict]:
+        """
+        Aggregates orders created in [since, until).
+
+        :return: One dictionary per partition (shard) of the data, with
+            'order_count', 'customer_count' and 'units_sold'. A user's
+            orders are never split across partitions.
+        """
+
+    @abstractmethod
+    def line_batches(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None,
+            columns: Sequence[str] = ORDER_LINE_COLUMNS,
+            batch_size: int = 10000
+        ) -> Iterator[List[tuple]]:
+        """
+        Streams the lines of orders created in [since, until), in batches
+        of at most batch_size, in no particular order.
+
+        :param columns: Columns of ORDER_LINE_COLUMNS to read; every line
+            is a tuple of them, in this order.
+        """
+
+    @abstractmethod
+    def product_sales(self) -> Dict[int, Tuple[int, float]]:
+        """
+        Sales of all time from the sales summary.
+
+        :return: Dictionary of product id -> (units, revenue).
+        """
+
+    @abstractmethod
+    def daily_sales(self) -> Dict[int, Tuple[int, float]]:
+        """
+        Sales per day from the sales summary.
+
+        :return: Dictionary of day (YYYYMMDD) -> (orders, revenue).
+        """
+
+class IdempotencyRepository(ABC):
+    @abstractmethod
+    def begin(
+            self,
+            key: str,
+            scope: str,
+            fingerprint: str,
+            now: float,
+            ttl_seconds: float
+        ) -> Optional[IdempotencyRecord]:
+        """
+        Reserves a key, replacing an expired record.
+
+        :return: None if reserved, otherwise the live record.
+        """
+
+    @abstractmethod
+    def complete(
+            self,
+            key: str,
+            scope: str,
+            status_code: int,
+            response_body: bytes
+        ) -> bool:
+        """:return: False if the key isn't reserved."""
+
+    @abstractmethod
+    def release(self, key: str, scope: str) -> None:
+        """Drops a reservation that has no response yet."""
+
+    @abstractmethod
+    def purge(self, now: float) -> int:
+        """Deletes expired keys and returns how many."""
+
+def utc_timestamp(epoch: Optional[float] = None) -> str:
+    """
+    Formats a time (now by default) like SQLite's
+    strftime('%Y-%m-%dT%H:%M:%f', 'now'), so timestamps written by SQL
+    and by Python compare as strings.
+    """
+    moment = datetime.fromtimestamp(
+        time.time() if epoch is None else epoch, timezone.utc
+    )
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+class StorageBackend(ABC):
+    users: UserRepository
+    products: ProductRepository
+    carts: CartRepository
+    orders: OrderRepository
+    idempotency: IdempotencyRepository
+
+    def backup(
+            self,
+            target_dir: str,
+            name: str,
+            compress: bool = False,
+            progress: Optional[Callable[[str, int, int], None]] = None
+        ) -> List[str]:
+        """
+        Copies the live data to files in target_dir without blocking
+        writers.
+
+        :param name: Prefix of the file names.
+        :param compress: Write gzip files.
+        :param progress: Called with (file, copied, total) as the copy
+            proceeds; the units are backend-specific.
+
+        :return: Paths of the files written.
+        :raises StorageError: The backend can't be backed up.
+        """
+        raise StorageError("Backups are not supported by this backend")
+
+    def compact(self, max_pages: int) -> int:
+        """
+        Returns free space left by deletes to the file system.
+
+        :param max_pages: Most pages released per database.
+
+        :return: Pages released; 0 when the backend has nothing to
+            release.
+        """
+        return 0
+
+    def close(self) -> None:
+        """Releases connections and threads held by the backend."""
+
+# Backends, keyed by the database path (or name) the services pass.
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+def _key(db_path: Optional[str]) -> str:
+    return db_path or default_db_path()
+
+def get_backend(db_path: Optional[str] = None) -> StorageBackend:
+    """
+    Returns the backend storing a database.
+
+    Databases without a registered backend are SQLite files at db_path.
+    """
+    key = _key(db_path)
+    backend = _backends.get(key)
+    if backend is None:
+        # Imported here because the SQLite backend builds on this module.
+        from db.sqlite_backend import SQLiteBackend
+        with _backends_lock:
+            backend = _backends.setdefault(key, SQLiteBackend(key))
+
+    return backend
+
+def register_backend(
+        backend: StorageBackend, db_path: Optional[str] = None
+    ) -> None:
+    """
+    Serves a database from the given backend.
+
+    :param db_path: Path or name the services use for the database.
+    """
+    with _backends_lock:
+        _backends[_key(db_path)] = backend
+
+def unregister_backend(db_path: Optional[str] = None) -> None:
+    with _backends_lock:
+        backend = _backends.pop(_key(db_path), None)
+    if backend is not None:
+        backend.close()
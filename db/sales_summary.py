@@ -0,0 +1,138 @@
+"""
+Sales summary tables, maintained at checkout.
+
+product_sales (units and revenue per product) and daily_sales (orders
+and revenue per day) are updated in the same transaction as every order
+they count (see db.queries.PRODUCT_SALES_ADD and DAILY_SALES_ADD), so
+dashboards read a few rows instead of aggregating the whole order
+history. They live next to the orders: on a sharded database every
+shard summarizes its own orders and readers add the shards up.
+
+rebuild() recomputes them from order_items in one transaction, and
+check() compares them with a recomputation from one snapshot. Run
+check() after restoring a backup or editing orders by hand, and rebuild
+when it reports differences.
+
+Usage:
+    python3 -m db.sales_summary {check,rebuild} [--db PATH]
+"""
+import argparse
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+from db import queries
+from db.database import begin_read, get_read_connection, run_write
+
+# Revenue sums add floats in a different order; differences below half
+# a cent are rounding.
+REVENUE_TOLERANCE = 0.005
+
+_EXPECTED = {
+    "product_sales": """
+        SELECT
+            product_id,
+            SUM(quantity),
+            SUM(quantity * COALESCE(unit_price, 0.0))
+        FROM order_items
+        GROUP BY product_id
+    """,
+    "daily_sales": """
+        SELECT
+            day,
+            COUNT(DISTINCT order_id),
+            SUM(quantity * COALESCE(unit_price, 0.0))
+        FROM order_items
+        GROUP BY day
+    """,
+}
+
+_ACTUAL = {
+    "product_sales": queries.PRODUCT_SALES_ALL,
+    "daily_sales": queries.DAILY_SALES_ALL,
+}
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS product_sales (
+        product_id INTEGER PRIMARY KEY,
+        quantity INTEGER NOT NULL,
+        revenue REAL NOT NULL
+    )
+    """)
+    # day is YYYYMMDD, like order_items.day
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_sales (
+        day INTEGER PRIMARY KEY,
+        orders INTEGER NOT NULL,
+        revenue REAL NOT NULL
+    )
+    """)
+
+def recompute(conn: sqlite3.Connection) -> None:
+    """Replaces the summaries with aggregates of order_items."""
+    for table, expected in _EXPECTED.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} {expected}")
+
+def rebuild(db_path: Optional[str] = None) -> None:
+    """
+    Recomputes the summaries of a database (one shard) on its writer, so
+    no order is placed halfway through.
+    """
+    run_write(recompute, db_path)
+
+def _rows(
+        conn: sqlite3.Connection, sql: str
+    ) -> Dict[int, Tuple[int, float]]:
+    return {row[0]: (row[1], row[2]) for row in conn.execute(sql)}
+
+def check(db_path: Optional[str] = None) -> List[dict]:
+    """
+    Compares the summaries of a database (one shard) with a
+    recomputation.
+
+    :return: One dictionary per differing row, with table, key, expected
+        and actual ((count, revenue), or None for a missing row). Empty
+        when the summaries are consistent.
+    """
+    conn = get_read_connection(db_path)
+    try:
+        # One read transaction, so orders placed meanwhile are either in
+        # both sides or in neither.
+        begin_read(conn)
+        differences = []
+        for table, expected_sql in _EXPECTED.items():
+            expected = _rows(conn, expected_sql)
+            actual = _rows(conn, _ACTUAL[table])
+            for key in sorted(expected.keys() | actual.keys()):
+                want, have = expected.get(key), actual.get(key)
+                if (
+                    want is None or have is None or want[0] != have[0]
+                    or abs(want[1] - have[1]) > REVENUE_TOLERANCE
+                ):
+                    differences.append({
+                        "table": table,
+                        "key": key,
+                        "expected": want,
+                        "actual": have
+                    })
+    finally:
+        conn.close()
+
+    return differences
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Check or rebuild the sales summary tables."
+    )
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        rebuild(args.db)
+    else:
+        differences = check(args.db)
+        for difference in differences:
+            print(difference)
+        print(f"{len(differences)} differences")
+        sys.exit(1 if differences else 0)
@@ -0,0 +1,323 @@
+"""
+Sharding of the user-scoped tables (carts and orders) by user id.
+
+Each shard is its own SQLite file with its own writer, so cart and order
+writes of different users no longer queue behind a single writer. Users
+are mapped to shards with jump consistent hashing, which moves as few
+users as possible when shards are added. Users, products and the other
+global tables stay in the main database, which is attached read-only to
+every shard connection as the ``catalog`` schema.
+
+Usage (rebalancing after changing the list of shards):
+    python3 -m db.sharding --shards s0.db s1.db s2.db --old-shards s0.db s1.db
+"""
+import argparse
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+from db import sales_summary
+from db.database import (
+    DB_PATH,
+    SHARD_ID_SPAN,
+    attach_catalog,
+    close_connections,
+    default_db_path,
+    get_read_connection,
+    init_shard_db,
+    run_write
+)
+
+T = TypeVar("T")
+
+# User-scoped tables and the key their rows are moved by
+USER_SCOPED_TABLES = {
+    "carts": "id",
+    "orders": "id",
+    "order_items": "order_id"
+}
+
+class ShardMap:
+    def __init__(self, catalog_path: str, shard_paths: Sequence[str]) -> None:
+        if not shard_paths:
+            raise ValueError("At least one shard is required")
+        self.catalog_path = catalog_path
+        self.shard_paths = list(shard_paths)
+
+    def shard_for(self, user_id: int) -> str:
+        """Returns the path of the shard owning a user's carts and orders."""
+        return self.shard_paths[jump_hash(user_id, len(self.shard_paths))]
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping and Veach), mapping a key to a bucket.
+    """
+    bucket, j = -1, 0
+    key &= 0xFFFFFFFFFFFFFFFF
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+
+    return bucket
+
+# Shard maps, keyed by the path of the main database.
+_shard_maps: Dict[str, ShardMap] = {}
+
+def configure_sharding(
+        shard_paths: Sequence[str],
+        db_path: Optional[str] = None
+    ) -> ShardMap:
+    """
+    Routes carts and orders of a database to shards by user id.
+
+    Creates the shard schemas if needed and attaches the main database
+    read-only to every shard connection.
+
+    :param shard_paths: Paths of the shard databases, in a stable order.
+    :param db_path: Path of the main database.
+
+    :return: The active ShardMap.
+    """
+    db_path = db_path or default_db_path()
+    shard_map = ShardMap(db_path, shard_paths)
+    for index, shard_path in enumerate(shard_map.shard_paths):
+        if shard_path != db_path:
+            attach_catalog(shard_path, db_path)
+            init_shard_db(shard_path, index)
+    _shard_maps[db_path] = shard_map
+
+    return shard_map
+
+def disable_sharding(db_path: Optional[str] = None) -> None:
+    """Stops routing to shards and closes the shard connections."""
+    shard_map = _shard_maps.pop(db_path or default_db_path(), None)
+    if shard_map is None:
+        return
+    for shard_path in shard_map.shard_paths:
+        if shard_path != shard_map.catalog_path:
+            close_connections(shard_path)
+            attach_catalog(shard_path, None)
+
+def get_shard_map(db_path: Optional[str] = None) -> Optional[ShardMap]:
+    if not _shard_maps:
+        return None
+    return _shard_maps.get(db_path or default_db_path())
+
+def shard_path_for(user_id: int, db_path: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the database holding a user's carts and orders.
+
+    :return: The user's shard, or db_path itself when not sharded.
+    """
+    shard_map = get_shard_map(db_path)
+    if shard_map is None:
+        return db_path
+
+    return shard_map.shard_for(user_id)
+
+def scatter(
+        fn: Callable[[sqlite3.Connection], T],
+        db_path: Optional[str] = None
+    ) -> List[T]:
+    """
+    Runs a read on every shard in parallel and gathers the results.
+
+    :param fn: Callable receiving a read-only connection of one shard.
+    :param db_path: Path of the main database.
+
+    :return: One result per shard, in shard order. Unsharded databases
+        give a single result.
+    """
+    shard_map = get_shard_map(db_path)
+    paths = shard_map.shard_paths if shard_map else [db_path]
+
+    def _read(path: Optional[str]) -> T:
+        conn = get_read_connection(path)
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+
+    if len(paths) == 1:
+        return [_read(paths[0])]
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        return list(executor.map(_read, paths))
+
+def rebalance(
+        shard_paths: Sequence[str],
+        old_shard_paths: Sequence[str] = (),
+        batch_size: int = 500,
+        db_path: Optional[str] = None
+    ) -> Dict[str, int]:
+    """
+    Moves carts and orders to the shard owning their user.
+
+    Rows are copied to their new shard before being deleted from the old
+    one, batch by batch, so the tool can be stopped and run again at any
+    time. Ids are kept, which is safe because every shard allocates ids
+    from its own range. A user has one cart: when one is already on the
+    new shard, started there after the shards changed, the newer of the
+    two carts is kept.
+
+    :param shard_paths: The new list of shards.
+    :param old_shard_paths: Shards that are being removed or were used
+        before; they are drained too.
+    :param batch_size: Users moved per transaction.
+    :param db_path: Path of the main database.
+
+    :return: Number of moved rows per table.
+    """
+    shard_map = configure_sharding(shard_paths, db_path)
+    sources = list(dict.fromkeys([*shard_paths, *old_shard_paths]))
+    moved = {table: 0 for table in USER_SCOPED_TABLES}
+    for source in sources:
+        if source not in shard_map.shard_paths:
+            attach_catalog(source, None)
+        conn = get_read_connection(source)
+        user_ids = [
+            row["user_id"] for row in conn.execute(
+                "SELECT user_id FROM carts UNION SELECT user_id FROM orders"
+            )
+        ]
+        conn.close()
+        misplaced: Dict[str, List[int]] = {}
+        for user_id in user_ids:
+            target = shard_map.shard_for(user_id)
+            if target != source:
+                misplaced.setdefault(target, []).append(user_id)
+        for target, users in misplaced.items():
+            for start in range(0, len(users), batch_size):
+                batch = users[start:start + batch_size]
+                for table, key in USER_SCOPED_TABLES.items():
+                    moved[table] += _move_rows(
+                        table, key, batch, source, target
+                    )
+    if any(moved.values()):
+        # Every shard summarizes the orders it holds.
+        for path in sources:
+            sales_summary.rebuild(path)
+        _reserve_moved_ids(shard_map, sources)
+
+    return moved
+
+def _reserve_moved_ids(shard_map: ShardMap, sources: Sequence[str]) -> None:
+    # Rows keep their ids when they move, so a shard must not hand out
+    # again the ids of its range that now live on other shards (rows of
+    # an unsharded database all come from shard 0's range).
+    for index, shard_path in enumerate(shard_map.shard_paths):
+        for table in ("carts", "orders"):
+            highest = [
+                last for last in (
+                    _max_id(source, table, index) for source in sources
+                ) if last is not None
+            ]
+            if highest:
+                run_write(
+                    lambda conn, table=table, seq=max(highest): _reserve_ids(
+                        conn, table, seq
+                    ),
+                    shard_path
+                )
+
+def _reserve_ids(conn: sqlite3.Connection, table: str, seq: int) -> None:
+    cursor = conn.execute(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+        (seq, table)
+    )
+    if cursor.rowcount == 0:
+        conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+            (table, seq)
+        )
+
+def _max_id(path: str, table: str, index: int) -> Optional[int]:
+    conn = get_read_connection(path)
+    try:
+        return conn.execute(
+            f"SELECT MAX(id) FROM {table} WHERE id >= ? AND id < ?",
+            (index * SHARD_ID_SPAN, (index + 1) * SHARD_ID_SPAN)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+def _move_rows(
+        table: str, key: str, user_ids: List[int], source: str, target: str
+    ) -> int:
+    placeholders = ", ".join("?" for _ in user_ids)
+    conn = get_read_connection(source)
+    rows = [
+        tuple(row) for row in conn.execute(
+            f"SELECT * FROM {table} WHERE user_id IN ({placeholders})",
+            user_ids
+        )
+    ]
+    columns = [column[0] for column in conn.execute(
+        f"SELECT * FROM {table} LIMIT 0"
+    ).description]
+    conn.close()
+    if not rows:
+        return 0
+
+    column_list = ", ".join(columns)
+    values = ", ".join("?" for _ in columns)
+
+    def _insert(conn: sqlite3.Connection) -> None:
+        kept = _newer_carts(conn, columns, rows) if table == "carts" else rows
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {table} ({column_list}) VALUES ({values})",
+            kept
+        )
+
+    run_write(_insert, target)
+    key_index = columns.index(key)
+    ids = list({row[key_index] for row in rows})
+    id_placeholders = ", ".join("?" for _ in ids)
+    run_write(
+        lambda conn: conn.execute(
+            f"DELETE FROM {table} WHERE {key} IN ({id_placeholders})", ids
+        ),
+        source
+    )
+
+    return len(rows)
+
+def _newer_carts(
+        conn: sqlite3.Connection, columns: List[str], rows: List[tuple]
+    ) -> List[tuple]:
+    # Keeps the incoming carts newer than the one their user already has
+    # on the target, and deletes that one; a cart copied by an earlier,
+    # interrupted run is the same cart and is left alone.
+    user_index = columns.index("user_id")
+    id_index = columns.index("id")
+    updated_index = columns.index("updated_at")
+    user_ids = [row[user_index] for row in rows]
+    placeholders = ", ".join("?" for _ in user_ids)
+    existing = {
+        user_id: (updated_at or "", cart_id)
+        for cart_id, user_id, updated_at in conn.execute(
+            f"SELECT id, user_id, updated_at FROM carts"
+            f" WHERE user_id IN ({placeholders})",
+            user_ids
+        )
+    }
+    kept = []
+    for row in rows:
+        current = existing.get(row[user_index])
+        if current is None:
+            kept.append(row)
+        elif (row[updated_index] or "", row[id_index]) > current:
+            conn.execute("DELETE FROM carts WHERE id = ?", (current[1],))
+            kept.append(row)
+
+    return kept
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Move carts and orders to the shard owning their user."
+    )
+    parser.add_argument("--shards", nargs="+", required=True)
+    parser.add_argument("--old-shards", nargs="*", default=[])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--db", default=str(DB_PATH))
+    args = parser.parse_args()
+    print(rebalance(args.shards, args.old_shards, args.batch_size, args.db))
@@ -0,0 +1,868 @@
+"""
+SQLite implementation of the storage interface in db.repository.
+
+Reads use read-only connections and writes run on the database's writer
+thread (see db.database). Carts and orders are routed to the user's
+shard when the database is sharded (see db.sharding).
+"""
+import json
+import os
+import sqlite3
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+from db import queries, related_products
+from db.backup import backup
+from db.compaction import incremental_vacuum
+from db.database import (
+    begin_read,
+    close_connections,
+    get_read_connection,
+    run_write
+)
+from db.repository import (
+    ORDER_LINE_COLUMNS,
+    CartRepository,
+    ConflictError,
+    DuplicateError,
+    IdempotencyRepository,
+    InsufficientStock,
+    NotFoundError,
+    OrderRepository,
+    ProductRepository,
+    StorageBackend,
+    UserRepository
+)
+from db.sharding import get_shard_map, scatter, shard_path_for
+from src.models import (
+    Cart,
+    CatalogChange,
+    IdempotencyRecord,
+    Order,
+    Product,
+    User
+)
+
+def _row_to_user(row: sqlite3.Row) -> User:
+    return User(
+        id=row["id"],
+        username=row["username"],
+        password=row["password"],
+        role=row["role"]
+    )
+
+def _row_to_product(row: sqlite3.Row) -> Product:
+    return Product(
+        id=row["id"],
+        name=row["name"],
+        description=row["description"],
+        price=row["price"],
+        stock=row["stock"]
+    )
+
+def _record_catalog_change(
+        conn: sqlite3.Connection,
+        change: str,
+        product_id: int,
+        product: Optional[Product] = None
+    ) -> None:
+    # Runs inside the caller's transaction so readers never see a new
+    # catalog under an old version, or a change that didn't happen.
+    conn.execute(queries.CATALOG_VERSION_BUMP)
+    conn.execute(
+        queries.CATALOG_CHANGE_INSERT,
+        (
+            product_id,
+            change,
+            product.name if product else None,
+            product.description if product else None,
+            product.price if product else None
+        )
+    )
+
+def _row_to_catalog_change(row: sqlite3.Row) -> CatalogChange:
+    return CatalogChange(
+        seq=row["seq"],
+        product_id=row["product_id"],
+        change=row["change"],
+        name=row["name"],
+        description=row["description"],
+        price=row["price"],
+        changed_at=row["changed_at"]
+    )
+
+def _read_cart_items(
+        conn: sqlite3.Connection, user_id: int, cart_id: int
+    ) -> Optional[Dict[str, int]]:
+    row = conn.execute(queries.CART_ITEMS, (user_id, cart_id)).fetchone()
+    if row is None:
+        return None
+    # The items column contains a JSON string, e.g., '{"101": 3, "102": 1}'
+    return json.loads(row["items"]) if row["items"] else {}
+
+def _items_to_list(items: Dict[str, int]) -> List[dict]:
+    return [
+        {"product_id": int(pid), "product_quantity": qty}
+        for pid, qty in items.items()
+    ]
+
+def _reserve_stock(
+        conn: sqlite3.Connection, cart_items: List[dict]
+    ) -> List[dict]:
+    """
+    Decrements stock for every cart item inside the caller's transaction.
+
+    :return: One dictionary per item that could not be reserved.
+    """
+    failures = []
+    for item in cart_items:
+        product_id = item["product_id"]
+        quantity = item["product_quantity"]
+        if quantity <= 0:
+            raise ValueError(f"Invalid quantity for product {product_id}")
+        cursor = conn.execute(
+            queries.STOCK_RESERVE, (quantity, product_id, quantity, quantity)
+        )
+        if cursor.rowcount == 1:
+            continue
+        # Nothing was reserved: tell untracked stock from a shortage.
+        row = conn.execute(queries.PRODUCT_STOCK, (product_id,)).fetchone()
+        if row and row["stock"] is None:
+            continue
+        failures.append({
+            "product_id": product_id,
+            "requested": quantity,
+            "available": row["stock"] if row else None
+        })
+
+    return failures
+
+def _reserve_stock_or_raise(
+        conn: sqlite3.Connection, cart_items: List[dict]
+    ) -> None:
+    failures = _reserve_stock(conn, cart_items)
+    if failures:
+        # Raising rolls back the reservations made so far.
+        raise InsufficientStock(failures)
+
+def _release_stock(conn: sqlite3.Connection, cart_items: List[dict]) -> None:
+    conn.executemany(
+        queries.STOCK_RELEASE,
+        [
+            (item["product_quantity"], item["product_id"])
+            for item in cart_items
+        ]
+    )
+
+def _insert_order(
+        conn: sqlite3.Connection,
+        user_id: int,
+        cart_id: int,
+        cart_items: List[dict],
+        created_at: str
+    ) -> Order:
+    products_json = json.dumps(cart_items)
+    cursor = conn.execute(
+        queries.ORDER_INSERT, (user_id, created_at, products_json)
+    )
+    conn.executemany(
+        queries.ORDER_ITEM_INSERT,
+        [
+            {
+                "order_id": cursor.lastrowid,
+                "user_id": user_id,
+                "product_id": item["product_id"],
+                "quantity": item["product_quantity"],
+                "created_at": created_at
+            } for item in cart_items
+        ]
+    )
+    conn.execute(queries.PRODUCT_SALES_ADD, {"order_id": cursor.lastrowid})
+    conn.execute(queries.DAILY_SALES_ADD, {"order_id": cursor.lastrowid})
+    # Clear the user's cart after placing the order.
+    conn.execute(queries.CART_DELETE, (user_id, cart_id))
+
+    return Order(
+        id=cursor.lastrowid,
+        user_id=user_id,
+        created_at=created_at,
+        products=products_json
+    )
+
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+    def add(self, username: str, password: str, role: str) -> User:
+        try:
+            user_id = run_write(
+                lambda conn: conn.execute(
+                    queries.USER_INSERT, (username, password, role)
+                ).lastrowid,
+                self.db_path
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateError("Username already exists")
+
+        return User(id=user_id, username=username, password=password, role=role)
+
+    def _get(self, sql: str, value: object) -> Optional[User]:
+        conn = get_read_connection(self.db_path)
+        row = conn.execute(sql, (value,)).fetchone()
+        conn.close()
+
+        return _row_to_user(row) if row else None
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        return self._get(queries.USER_BY_ID, user_id)
+
+    def get_by_username(self, username: str) -> Optional[User]:
+        return self._get(queries.USER_BY_USERNAME, username)
+
+class SQLiteProductRepository(ProductRepository):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+    def add(
+            self,
+            name: str,
+            description: str,
+            price: float,
+            stock: Optional[int]
+        ) -> Product:
+        def _insert(conn: sqlite3.Connection) -> Product:
+            cursor = conn.execute(
+                queries.PRODUCT_INSERT, (name, description, price, stock)
+            )
+            product = Product(
+                id=cursor.lastrowid,
+                name=name,
+                description=description,
+                price=price,
+                stock=stock
+            )
+            _record_catalog_change(conn, "add", product.id, product)
+            return product
+
+        return run_write(_insert, self.db_path)
+
+    def update(
+            self,
+            product_id: int,
+            name: Optional[str] = None,
+            description: Optional[str] = None,
+            price: Optional[float] = None,
+            stock: Optional[int] = None
+        ) -> Product:
+        def _update(conn: sqlite3.Connection) -> Product:
+            row = conn.execute(
+                queries.PRODUCT_BY_ID, (product_id,)
+            ).fetchone()
+            if not row:
+                raise NotFoundError("Product not found")
+            product = Product(
+                id=product_id,
+                name=name if name is not None else row["name"],
+                description=(
+                    description if description is not None
+                    else row["description"]
+                ),
+                price=price if price is not None else row["price"],
+                stock=stock if stock is not None else row["stock"]
+            )
+            conn.execute(
+                queries.PRODUCT_UPDATE,
+                (
+                    product.name,
+                    product.description,
+                    product.price,
+                    product.stock,
+                    product_id
+                )
+            )
+            _record_catalog_change(conn, "edit", product_id, product)
+            return product
+
+        return run_write(_update, self.db_path)
+
+    def delete(self, product_id: int) -> None:
+        def _delete(conn: sqlite3.Connection) -> None:
+            cursor = conn.execute(queries.PRODUCT_DELETE, (product_id,))
+            if cursor.rowcount == 0:
+                raise NotFoundError("Product not found")
+            related_products.forget_product(conn, product_id)
+            _record_catalog_change(conn, "delete", product_id)
+
+        run_write(_delete, self.db_path)
+
+    def get(self, product_id: int) -> Optional[Product]:
+        conn = get_read_connection(self.db_path, replica_ok=True)
+        row = conn.execute(queries.PRODUCT_BY_ID, (product_id,)).fetchone()
+        conn.close()
+
+        return _row_to_product(row) if row else None
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        conn = get_read_connection(self.db_path, replica_ok=True)
+        rows = conn.execute(
+            queries.PRODUCTS_BY_IDS, (json.dumps(list(product_ids)),)
+        ).fetchall()
+        conn.close()
+
+        return {row["id"]: _row_to_product(row) for row in rows}
+
+    def list_all(self) -> List[Product]:
+        conn = get_read_connection(self.db_path, replica_ok=True)
+        rows = conn.execute(queries.PRODUCTS_ALL).fetchall()
+        conn.close()
+
+        return [_row_to_product(row) for row in rows]
+
+    def find_missing(self, product_ids: Iterable[int]) -> List[int]:
+        product_ids = list(product_ids)
+        conn = get_read_connection(self.db_path)
+        found = {
+            row["id"] for row in conn.execute(
+                queries.PRODUCT_IDS_IN, (json.dumps(product_ids),)
+            )
+        }
+        conn.close()
+
+        return [pid for pid in product_ids if pid not in found]
+
+    def catalog_version(self) -> int:
+        conn = get_read_connection(self.db_path, replica_ok=True)
+        row = conn.execute(queries.CATALOG_VERSION).fetchone()
+        conn.close()
+
+        return row["version"] if row else 0
+
+    def catalog_snapshot(self) -> Tuple[int, List[Product]]:
+        conn = get_read_connection(self.db_path, replica_ok=True)
+        begin_read(conn)
+        row = conn.execute(queries.CATALOG_VERSION).fetchone()
+        rows = conn.execute(queries.PRODUCTS_ALL).fetchall()
+        # Closing ends the read transaction.
+        conn.close()
+
+        return (
+            row["version"] if row else 0,
+            [_row_to_product(row) for row in rows]
+        )
+
+    def changes(self, since: int, limit: int) -> List[CatalogChange]:
+        # Not from the replica: consumers woken by a change must see it.
+        conn = get_read_connection(self.db_path)
+        rows = conn.execute(
+            queries.CATALOG_CHANGES_SINCE, (since, limit)
+        ).fetchall()
+        conn.close()
+
+        return [_row_to_catalog_change(row) for row in rows]
+
+    def related(
+            self, product_id: int, limit: int
+        ) -> List[Tuple[Product, int]]:
+        conn = get_read_connection(self.db_path, replica_ok=True)
+        rows = conn.execute(
+            queries.RELATED_PRODUCTS, (product_id, limit)
+        ).fetchall()
+        conn.close()
+
+        return [(_row_to_product(row), row["related_orders"]) for row in rows]
+
+class SQLiteCartRepository(CartRepository):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+    def _shard(self, user_id: int) -> str:
+        return shard_path_for(user_id, self.db_path)
+
+    def add_items(
+            self, user_id: int, products: Sequence[Tuple[int, int]]
+        ) -> Cart:
+        def _update(conn: sqlite3.Connection) -> Cart:
+            # Check if the user already has a cart.
+            row = conn.execute(queries.CART_BY_USER, (user_id,)).fetchone()
+            if row:
+                cart_id = row["id"]
+                items = json.loads(row["items"]) if row["items"] else {}
+            else:
+                cart_id = conn.execute(
+                    queries.CART_INSERT,
+                    (user_id, json.dumps({}))
+                ).lastrowid
+                items = {}
+
+            for product_id, product_quantity in products:
+                # Shards see the catalog through the attached database.
+                exists = conn.execute(
+                    queries.PRODUCT_EXISTS, (product_id,)
+                ).fetchone()
+                if exists is None:
+                    raise NotFoundError(
+                        f"Product with id {product_id} not found"
+                    )
+                # String keys, as JSON objects can't have integer keys.
+                key = str(product_id)
+                items[key] = items.get(key, 0) + product_quantity
+
+            conn.execute(
+                queries.CART_UPDATE_ITEMS,
+                (json.dumps(items), cart_id, user_id)
+            )
+            return Cart(id=cart_id, user_id=user_id, items=items)
+
+        return run_write(_update, self._shard(user_id))
+
+    def set_items(
+            self,
+            user_id: int,
+            quantities: Sequence[Tuple[int, int]],
+            replace: bool = False
+        ) -> Cart:
+        def _set(conn: sqlite3.Connection) -> Cart:
+            row = conn.execute(queries.CART_BY_USER, (user_id,)).fetchone()
+            if row:
+                cart_id = row["id"]
+                items = json.loads(row["items"]) if row["items"] else {}
+            else:
+                cart_id = conn.execute(
+                    queries.CART_INSERT, (user_id, json.dumps({}))
+                ).lastrowid
+                items = {}
+            if replace:
+                items = {}
+
+            for product_id, quantity in quantities:
+                key = str(product_id)
+                if quantity == 0:
+                    items.pop(key, None)
+                    continue
+                exists = conn.execute(
+                    queries.PRODUCT_EXISTS, (product_id,)
+                ).fetchone()
+                if exists is None:
+                    raise NotFoundError(
+                        f"Product with id {product_id} not found"
+                    )
+                items[key] = quantity
+
+            conn.execute(
+                queries.CART_UPDATE_ITEMS,
+                (json.dumps(items), cart_id, user_id)
+            )
+            return Cart(id=cart_id, user_id=user_id, items=items)
+
+        return run_write(_set, self._shard(user_id))
+
+    def get_or_create(self, user_id: int) -> Cart:
+        shard = self._shard(user_id)
+        conn = get_read_connection(shard)
+        row = conn.execute(queries.CART_BY_USER, (user_id,)).fetchone()
+        conn.close()
+        if row:
+            items = json.loads(row["items"]) if row["items"] else {}
+            return Cart(id=row["id"], user_id=user_id, items=items)
+
+        def _insert(conn: sqlite3.Connection) -> Cart:
+            # Re-checked on the writer so two requests can't both insert.
+            row = conn.execute(queries.CART_BY_USER, (user_id,)).fetchone()
+            if row:
+                items = json.loads(row["items"]) if row["items"] else {}
+                return Cart(id=row["id"], user_id=user_id, items=items)
+            cart_id = conn.execute(
+                queries.CART_INSERT, (user_id, json.dumps({}))
+            ).lastrowid
+            return Cart(id=cart_id, user_id=user_id, items={})
+
+        return run_write(_insert, shard)
+
+    def get(self, user_id: int, cart_id: int) -> Optional[Cart]:
+        conn = get_read_connection(self._shard(user_id))
+        items = _read_cart_items(conn, user_id, cart_id)
+        conn.close()
+        if items is None:
+            return None
+
+        return Cart(id=cart_id, user_id=user_id, items=items)
+
+    def get_priced(
+            self,
+            user_id: int,
+            cart_id: int,
+            items: Optional[Dict[str, int]] = None
+        ) -> Tuple[List[dict], float]:
+        # One JOIN computes the lines and, with a window, the total.
+        select = """
+            SELECT
+                CAST(j.key AS INTEGER) AS product_id,
+                j.value AS product_quantity,
+                p.name AS name,
+                p.price AS unit_price,
+                ROUND(p.price * j.value, 2) AS line_total,
+                ROUND(SUM(p.price * j.value) OVER (), 2) AS total
+            FROM {source}
+            LEFT JOIN products p ON p.id = CAST(j.key AS INTEGER)
+            {where}
+            ORDER BY j.id
+        """
+        conn = get_read_connection(self._shard(user_id))
+        if items is not None:
+            rows = conn.execute(
+                select.format(source="json_each(?) j", where=""),
+                (json.dumps(items),)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                select.format(
+                    source="carts c, json_each(c.items) j",
+                    where="WHERE c.user_id = ? AND c.id = ?"
+                ),
+                (user_id, cart_id)
+            ).fetchall()
+        conn.close()
+
+        lines = [
+            {
+                "product_id": row["product_id"],
+                "product_quantity": row["product_quantity"],
+                "name": row["name"],
+                "unit_price": row["unit_price"],
+                "line_total": row["line_total"]
+            } for row in rows
+        ]
+        total = (rows[0]["total"] or 0.0) if rows else 0.0
+
+        return lines, total
+
+    def save_items(self, carts: Iterable[Cart]) -> None:
+        # Carts of a sharded database are written to each user's shard,
+        # in one transaction per shard.
+        by_shard: Dict[str, List[Cart]] = {}
+        for cart in carts:
+            by_shard.setdefault(self._shard(cart.user_id), []).append(cart)
+        for shard, shard_carts in by_shard.items():
+            run_write(
+                lambda conn, shard_carts=shard_carts: conn.executemany(
+                    queries.CART_UPDATE_ITEMS,
+                    [
+                        (json.dumps(cart.items), cart.id, cart.user_id)
+                        for cart in shard_carts
+                    ]
+                ),
+                shard
+            )
+
+    def delete(self, user_id: int, cart_id: int) -> None:
+        run_write(
+            lambda conn: conn.execute(
+                queries.CART_DELETE, (user_id, cart_id)
+            ),
+            self._shard(user_id)
+        )
+
+    def delete_expired(
+            self, idle_before: str, empty_before: str, limit: int
+        ) -> int:
+        params = {
+            "idle_before": idle_before,
+            "empty_before": empty_before,
+            "limit": limit
+        }
+        shard_map = get_shard_map(self.db_path)
+        deleted = 0
+        for path in shard_map.shard_paths if shard_map else [self.db_path]:
+            deleted += run_write(
+                lambda conn: conn.execute(
+                    queries.CARTS_DELETE_EXPIRED, params
+                ).rowcount,
+                path
+            )
+
+        return deleted
+
+# created_at is an ISO timestamp, so time ranges compare as strings.
+_TIME_RANGE = """
+    (:since IS NULL OR created_at >= :since)
+    AND (:until IS NULL OR created_at < :until)
+"""
+
+class SQLiteOrderRepository(OrderRepository):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+    def place(self, user_id: int, cart_id: int, created_at: str) -> Order:
+        shard = shard_path_for(user_id, self.db_path)
+        if shard != self.db_path:
+            return self._place_on_shard(user_id, cart_id, created_at, shard)
+
+        def _place(conn: sqlite3.Connection) -> Order:
+            items = _read_cart_items(conn, user_id, cart_id)
+            if not items:
+                raise NotFoundError("Cart is empty")
+            cart_items = _items_to_list(items)
+            # Stock is reserved in the same transaction as the order.
+            _reserve_stock_or_raise(conn, cart_items)
+            return _insert_order(conn, user_id, cart_id, cart_items, created_at)
+
+        return run_write(_place, self.db_path)
+
+    def _place_on_shard(
+            self, user_id: int, cart_id: int, created_at: str, shard: str
+        ) -> Order:
+        # The cart and order live on the user's shard while stock lives in
+        # the main database, and SQLite can't commit both atomically. Stock
+        # is reserved first and released again if the order can't be
+        # written, so a failure can only undersell, never oversell.
+        conn = get_read_connection(shard)
+        items = _read_cart_items(conn, user_id, cart_id)
+        conn.close()
+        if not items:
+            raise NotFoundError("Cart is empty")
+        cart_items = _items_to_list(items)
+        run_write(
+            lambda conn: _reserve_stock_or_raise(conn, cart_items),
+            self.db_path
+        )
+
+        def _place(conn: sqlite3.Connection) -> Order:
+            if _read_cart_items(conn, user_id, cart_id) != items:
+                raise ConflictError("Cart changed during checkout")
+            return _insert_order(conn, user_id, cart_id, cart_items, created_at)
+
+        try:
+            return run_write(_place, shard)
+        except Exception:
+            run_write(
+                lambda conn: _release_stock(conn, cart_items), self.db_path
+            )
+            raise
+
+    def list(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None
+        ) -> List[Order]:
+        def _read(conn: sqlite3.Connection) -> List[Order]:
+            rows = conn.execute(
+                """
+                SELECT id, created_at, user_id, products FROM orders
+                WHERE """ + _TIME_RANGE + """
+                ORDER BY created_at
+                """,
+                {"since": since, "until": until}
+            )
+            return [
+                Order(
+                    id=row["id"],
+                    created_at=row["created_at"],
+                    user_id=row["user_id"],
+                    products=row["products"]
+                ) for row in rows
+            ]
+
+        # Shards are read in parallel and merged by creation time.
+        orders = [
+            order for shard in scatter(_read, self.db_path) for order in shard
+        ]
+        orders.sort(key=lambda order: (order.created_at, order.id))
+
+        return orders
+
+    def report(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None
+        ) -> List[dict]:
+        def _aggregate(conn: sqlite3.Connection) -> dict:
+            row = conn.execute(
+                """
+                SELECT
+                    COUNT(*) AS order_count,
+                    COUNT(DISTINCT user_id) AS customer_count,
+                    COALESCE(SUM((
+                        SELECT SUM(json_extract(value, '$.product_quantity'))
+                        FROM json_each(orders.products)
+                    )), 0) AS units_sold
+                FROM orders
+                WHERE """ + _TIME_RANGE,
+                {"since": since, "until": until}
+            ).fetchone()
+            return dict(row)
+
+        # Every shard aggregates its own orders in SQL.
+        return scatter(_aggregate, self.db_path)
+
+    def line_batches(
+            self,
+            since: Optional[str] = None,
+            until: Optional[str] = None,
+            columns: Sequence[str] = ORDER_LINE_COLUMNS,
+            batch_size: int = 10000
+        ) -> Iterator[List[tuple]]:
+        shard_map = get_shard_map(self.db_path)
+        for path in shard_map.shard_paths if shard_map else [self.db_path]:
+            conn = get_read_connection(path)
+            try:
+                cursor = conn.cursor()
+                # Plain tuples; building a Row per line is the slow part.
+                cursor.row_factory = None
+                cursor.execute(
+                    queries.order_lines(columns),
+                    {"since": since, "until": until}
+                )
+                batch = cursor.fetchmany(batch_size)
+                while batch:
+                    yield batch
+                    batch = cursor.fetchmany(batch_size)
+            finally:
+                conn.close()
+
+    def _sales(self, sql: str) -> Dict[int, Tuple[int, float]]:
+        # Every shard summarizes its own orders.
+        sales: Dict[int, Tuple[int, float]] = {}
+        for shard in scatter(
+            lambda conn: conn.execute(sql).fetchall(), self.db_path
+        ):
+            for key, count, revenue in shard:
+                total_count, total_revenue = sales.get(key, (0, 0.0))
+                sales[key] = (total_count + count, total_revenue + revenue)
+
+        return sales
+
+    def product_sales(self) -> Dict[int, Tuple[int, float]]:
+        return self._sales(queries.PRODUCT_SALES_ALL)
+
+    def daily_sales(self) -> Dict[int, Tuple[int, float]]:
+        return self._sales(queries.DAILY_SALES_ALL)
+
+class SQLiteIdempotencyRepository(IdempotencyRepository):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+    def begin(
+            self,
+            key: str,
+            scope: str,
+            fingerprint: str,
+            now: float,
+            ttl_seconds: float
+        ) -> Optional[IdempotencyRecord]:
+        def _reserve(conn: sqlite3.Connection) -> Optional[IdempotencyRecord]:
+            # The writer holds the write lock for the whole transaction, so
+            # two concurrent retries can't both reserve the key.
+            row = conn.execute(
+                queries.IDEMPOTENCY_KEY_GET, (key, scope)
+            ).fetchone()
+            if row and row["expires_at"] > now:
+                return IdempotencyRecord(
+                    key=row["key"],
+                    scope=row["scope"],
+                    fingerprint=row["fingerprint"],
+                    status_code=row["status_code"],
+                    response_body=row["response_body"],
+                    created_at=row["created_at"],
+                    expires_at=row["expires_at"]
+                )
+            if row:
+                conn.execute(queries.IDEMPOTENCY_KEY_DELETE, (key, scope))
+            conn.execute(
+                queries.IDEMPOTENCY_KEY_INSERT,
+                (key, scope, fingerprint, now, now + ttl_seconds)
+            )
+            return None
+
+        return run_write(_reserve, self.db_path)
+
+    def complete(
+            self,
+            key: str,
+            scope: str,
+            status_code: int,
+            response_body: bytes
+        ) -> bool:
+        updated = run_write(
+            lambda conn: conn.execute(
+                queries.IDEMPOTENCY_KEY_COMPLETE,
+                (status_code, response_body, key, scope)
+            ).rowcount,
+            self.db_path
+        )
+        return updated > 0
+
+    def release(self, key: str, scope: str) -> None:
+        run_write(
+            lambda conn: conn.execute(
+                queries.IDEMPOTENCY_KEY_RELEASE, (key, scope)
+            ),
+            self.db_path
+        )
+
+    def purge(self, now: float) -> int:
+        return run_write(
+            lambda conn: conn.execute(
+                queries.IDEMPOTENCY_KEYS_PURGE, (now,)
+            ).rowcount,
+            self.db_path
+        )
+
+class SQLiteBackend(StorageBackend):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.users = SQLiteUserRepository(db_path)
+        self.products = SQLiteProductRepository(db_path)
+        self.carts = SQLiteCartRepository(db_path)
+        self.orders = SQLiteOrderRepository(db_path)
+        self.idempotency = SQLiteIdempotencyRepository(db_path)
+
+    def backup(
+            self,
+            target_dir: str,
+            name: str,
+            compress: bool = False,
+            progress: Optional[Callable[[str, int, int], None]] = None
+        ) -> List[str]:
+        # The main database, then every shard; progress is in pages.
+        databases = [("main", self.db_path)]
+        shard_map = get_shard_map(self.db_path)
+        if shard_map is not None:
+            databases += [
+                (f"shard{index}", shard_path)
+                for index, shard_path in enumerate(shard_map.shard_paths)
+                if shard_path != shard_map.catalog_path
+            ]
+        suffix = ".db.gz" if compress else ".db"
+        paths = []
+        for label, db_path in databases:
+            target_path = os.path.join(target_dir, f"{name}-{label}{suffix}")
+            report = None
+            if progress is not None:
+                def _report(copied, total, target_path=target_path):
+                    progress(target_path, copied, total)
+                report = _report
+            paths.append(backup(
+                target_path, db_path, compress=compress, progress=report
+            ))
+
+        return paths
+
+    def compact(self, max_pages: int) -> int:
+        paths = [self.db_path]
+        shard_map = get_shard_map(self.db_path)
+        if shard_map is not None:
+            paths += [
+                path for path in shard_map.shard_paths if path != self.db_path
+            ]
+
+        return sum(incremental_vacuum(path, max_pages) for path in paths)
+
+    def close(self) -> None:
+        close_connections(self.db_path)
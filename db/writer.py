@@ -0,0 +1,122 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+# Upper bound of write transactions group-committed together.
+DEFAULT_MAX_BATCH = 64
+
+Job = Tuple[Callable[[sqlite3.Connection], object], Future]
+
+class Writer:
+    """
+    Dedicated writer thread of a database.
+
+    Write transactions are submitted as callables and run one after the
+    other on the writer's own connection, so they never race each other
+    for the SQLite write lock. Jobs that queue up while a transaction is
+    running are group-committed: they run in one transaction, each inside
+    its own savepoint, and share a single commit. A failing job only
+    rolls back its own savepoint. Futures are resolved after the commit,
+    so a result is never reported before it is durable.
+    """
+    def __init__(
+            self,
+            db_path: str,
+            conn: sqlite3.Connection,
+            max_batch: int = DEFAULT_MAX_BATCH
+        ) -> None:
+        """
+        :param db_path: Path of the database, used to name the thread.
+        :param conn: Connection owned by the writer from now on; it must
+            be created with check_same_thread=False.
+        :param max_batch: Most jobs group-committed in one transaction.
+        """
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.conn = conn
+        self.jobs = 0
+        self.batches = 0
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"db-writer:{db_path}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, fn: Callable[[sqlite3.Connection], object]) -> Future:
+        """
+        Queues fn to run in a write transaction.
+
+        :return: A Future resolved with fn's result once committed.
+        """
+        future: Future = Future()
+        if threading.current_thread() is self._thread:
+            # Nested write from inside a job: it already runs in the
+            # writer's transaction.
+            future.set_result(fn(self.conn))
+        else:
+            self._queue.put((fn, future))
+
+        return future
+
+    def close(self) -> None:
+        """Runs the queued jobs, stops the thread and closes the connection."""
+        self._queue.put(None)
+        self._thread.join()
+        self.conn.close()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[Job]) -> None:
+        outcomes = []
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.conn.execute("SAVEPOINT job")
+                try:
+                    result = fn(self.conn)
+                except BaseException as e:
+                    self.conn.execute("ROLLBACK TO job")
+                    self.conn.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+                else:
+                    self.conn.execute("RELEASE job")
+                    outcomes.append((future, result, None))
+            self.conn.commit()
+        except BaseException as e:
+            # BEGIN or COMMIT failed: nothing in the batch is durable.
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            for fn, future in batch:
+                if future.running():
+                    future.set_exception(e)
+            return
+
+        self.jobs += len(outcomes)
+        self.batches += 1
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
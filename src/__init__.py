@@ -1,17 +1,125 @@
-from flask import Flask
-from flasgger import Swagger
-from db.database import init_db
-from src.routes import cart_routes, user_routes, product_routes
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+def create_app(config: Optional[dict] = None) -> "Flask":
+    # Imported here, so db/, src.models and src.services import without
+    # Flask or flasgger (tests/unit/test_imports.py keeps it that way),
+    # and db/ doesn't import the web layer back half-initialized.
+    from flask import Flask, g
+    from db.database import (
+        configure_connections,
+        configure_replica,
+        init_db,
+        is_memory_db,
+        persist_memory_db,
+        reset_database,
+        use_database
+    )
+    from db.memory_backend import MemoryBackend
+    from db.related_products import TOP_K, start_updates
+    from db.repository import register_backend
+    from db.sharding import configure_sharding
+    from src.apispec import CachedSwagger
+    from src.middleware.compression import init_compression
+    from src.middleware.rate_limit import init_rate_limiting
+    from src.routes import (
+        analytics_routes,
+        backup_routes,
+        batch_routes,
+        cart_routes,
+        order_routes,
+        product_routes,
+        user_routes
+    )
+    from src.services import cart_expiry, cart_service, user_service
 
-def create_app() -> Flask:
     app = Flask(__name__)
-    # Initialize the database
-    init_db()
+    app.config.update(config or {})
+    # A database file path or a shared-cache in-memory database URI;
+    # the default file when unset
+    db_path = app.config.get("DATABASE")
+    # Size the per-connection statement cache and the read pool
+    configure_connections(
+        app.config.get("DATABASE_CACHED_STATEMENTS"),
+        app.config.get("DATABASE_READ_POOL_SIZE")
+    )
+    # Initialize the database, or keep it in memory for tests and benchmarks
+    if app.config.get("DATABASE_BACKEND", "sqlite") == "memory":
+        register_backend(MemoryBackend(), db_path)
+    else:
+        if db_path and is_memory_db(db_path) and app.config.get(
+            "DATABASE_SNAPSHOT_PATH"
+        ):
+            persist_memory_db(app.config["DATABASE_SNAPSHOT_PATH"], db_path)
+        init_db(db_path)
+    # Serve lag-tolerant catalog reads from a replica when configured
+    if app.config.get("DATABASE_REPLICA_PATH"):
+        configure_replica(
+            app.config["DATABASE_REPLICA_PATH"],
+            app.config.get("DATABASE_REPLICA_REFRESH_SECONDS", 1.0),
+            db_path
+        )
+    # Spread carts and orders over shard databases by user id
+    if app.config.get("DATABASE_SHARDS"):
+        configure_sharding(app.config["DATABASE_SHARDS"], db_path)
+    # Keep the related products index up to date when configured
+    if app.config.get("RELATED_PRODUCTS_REFRESH_SECONDS"):
+        start_updates(
+            app.config["RELATED_PRODUCTS_REFRESH_SECONDS"],
+            app.config.get("RELATED_PRODUCTS_TOP_K", TOP_K),
+            db_path
+        )
+    # Buffer cart adds in memory when write-behind mode is configured
+    if app.config.get("CART_WRITE_BEHIND_MS"):
+        cart_service.enable_write_behind(
+            app.config["CART_WRITE_BEHIND_MS"], db_path
+        )
+    # Delete abandoned carts in the background when configured
+    if app.config.get("CART_EXPIRY_INTERVAL_SECONDS"):
+        cart_service.enable_cart_expiry(
+            app.config["CART_EXPIRY_INTERVAL_SECONDS"],
+            app.config.get(
+                "CART_TTL_SECONDS", cart_expiry.DEFAULT_TTL_SECONDS
+            ),
+            app.config.get(
+                "EMPTY_CART_TTL_SECONDS",
+                cart_expiry.DEFAULT_EMPTY_TTL_SECONDS
+            ),
+            db_path
+        )
+    if db_path:
+        # Services called without a path use the app's database.
+        @app.before_request
+        def _use_app_database():
+            g.database_token = use_database(db_path)
+
+        @app.teardown_request
+        def _reset_app_database(exc=None):
+            token = g.pop("database_token", None)
+            if token is not None:
+                reset_database(token)
+    # Cache username lookups of login and registration when configured
+    if app.config.get("USERNAME_CACHE_SIZE"):
+        user_service.enable_username_cache(
+            app.config["USERNAME_CACHE_SIZE"],
+            app.config.get("USERNAME_NEGATIVE_TTL_SECONDS", 60.0),
+            db_path
+        )
     # Register the blueprints
     app.register_blueprint(user_routes.bp)
     app.register_blueprint(product_routes.bp)
     app.register_blueprint(cart_routes.bp)
-    # Initialize Swagger
-    Swagger(app)
+    app.register_blueprint(order_routes.bp)
+    app.register_blueprint(backup_routes.bp)
+    app.register_blueprint(analytics_routes.bp)
+    app.register_blueprint(batch_routes.bp)
+    # Reject requests over their rate or concurrency limits early
+    init_rate_limiting(app)
+    # Compress large responses when the client accepts it
+    init_compression(app)
+    # Initialize Swagger; the spec is built on first use and cached
+    CachedSwagger(app, cache_path=app.config.get("SWAGGER_SPEC_CACHE"))
 
     return app
@@ -0,0 +1,77 @@
+"""
+Swagger with a cached API spec.
+
+flasgger builds the spec by parsing the YAML docstring of every route,
+on the first request to the spec of every app. CachedSwagger keeps the
+built spec, keyed by a fingerprint of the Swagger config and template
+and of the routes and their docstrings: in process memory, so apps
+created later (e.g. one per test) reuse it, and optionally in a JSON
+file (SWAGGER_SPEC_CACHE) that other workers and later starts load
+instead of parsing. Changing any of them changes the fingerprint, so a
+stale spec is never served.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+from flasgger import Swagger
+
+# Built specs, keyed by fingerprint.
+_specs: Dict[str, dict] = {}
+
+def _stable_repr(value: object) -> str:
+    # Functions in the config (e.g. rule_filter) by name, not by address,
+    # so every process computes the same fingerprint.
+    return getattr(value, "__qualname__", None) or repr(value)
+
+class CachedSwagger(Swagger):
+    def __init__(self, app=None, cache_path: Optional[str] = None, **kwargs):
+        """
+        :param cache_path: JSON file to load the spec from and save it to.
+        """
+        self.cache_path = cache_path
+        super().__init__(app, **kwargs)
+
+    def _fingerprint(self, endpoint: str) -> str:
+        digest = hashlib.sha256(endpoint.encode())
+        digest.update(json.dumps(
+            [self.config, self.template], sort_keys=True, default=_stable_repr
+        ).encode())
+        for rule in sorted(self.app.url_map.iter_rules(), key=str):
+            view = self.app.view_functions.get(rule.endpoint)
+            digest.update(f"{rule} {sorted(rule.methods)}".encode())
+            digest.update((getattr(view, "__doc__", None) or "").encode())
+        return digest.hexdigest()
+
+    def _load(self, fingerprint: str) -> Optional[dict]:
+        spec = _specs.get(fingerprint)
+        if spec is None and self.cache_path:
+            try:
+                with open(self.cache_path) as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if cached.get("fingerprint") == fingerprint:
+                spec = _specs.setdefault(fingerprint, cached["spec"])
+        return spec
+
+    def _save(self, fingerprint: str, spec: dict) -> None:
+        _specs[fingerprint] = spec
+        if self.cache_path:
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"fingerprint": fingerprint, "spec": spec}, f)
+            os.replace(tmp_path, self.cache_path)
+
+    def get_apispecs(self, endpoint: str = 'apispec_1') -> dict:
+        if self.app.debug or endpoint in self.apispecs:
+            # Debug apps rebuild the spec on every request.
+            return super().get_apispecs(endpoint)
+        fingerprint = self._fingerprint(endpoint)
+        spec = self._load(fingerprint)
+        if spec is None:
+            spec = super().get_apispecs(endpoint)
+            self._save(fingerprint, spec)
+        self.apispecs[endpoint] = spec
+
+        return spec
@@ -0,0 +1,144 @@
+import gzip
+import threading
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+from flask import Flask, Response, request
+
+# Encodings we are able to produce, in order of preference.
+SUPPORTED_ENCODINGS = ["gzip", "deflate"]
+
+DEFAULT_MIN_SIZE = 500
+DEFAULT_LEVEL = 6
+
+def choose_encoding() -> Optional[str]:
+    """
+    Picks the best encoding accepted by the current request.
+
+    :return: "gzip", "deflate" or None when the client only accepts identity.
+    """
+    return request.accept_encodings.best_match(SUPPORTED_ENCODINGS)
+
+def compress_body(data: bytes, encoding: str, level: int) -> bytes:
+    """
+    Compresses a response body with the given content-coding.
+
+    :param data: The uncompressed body.
+    :param encoding: "gzip" or "deflate".
+    :param level: zlib compression level (1-9).
+
+    :return: The compressed body.
+    """
+    if encoding == "gzip":
+        # A fixed mtime keeps the output deterministic for caching.
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "deflate":
+        # HTTP "deflate" is the zlib format (RFC 1950), not raw deflate.
+        return zlib.compress(data, level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+def should_compress(response: Response, min_size: int) -> bool:
+    """Checks whether a response is eligible for compression."""
+    if response.status_code != 200:
+        return False
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if "Content-Encoding" in response.headers:
+        return False
+    if response.mimetype != "application/json":
+        return False
+
+    return response.content_length is not None and (
+        response.content_length >= min_size
+    )
+
+class PrecompressedCache:
+    """
+    Keeps a response body and its encoded variants for a single version.
+
+    Bodies are built lazily and dropped as soon as a newer version is
+    requested, so a hot resource is encoded and compressed once per
+    version instead of once per request. A body is only cached under the
+    version it was built from, which the builder reports.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = None
+        self._bodies: Dict[str, bytes] = {}
+
+    def get(
+            self,
+            version: object,
+            encoding: Optional[str],
+            build: Callable[[], Tuple[object, bytes]],
+            level: int = DEFAULT_LEVEL
+        ) -> bytes:
+        """
+        Returns the cached body for a version, building it on a miss.
+
+        :param version: Version of the underlying data.
+        :param encoding: Content-coding or None for the identity body.
+        :param build: Callable producing the identity body, as a tuple of
+            (version it was built from, body).
+        :param level: Compression level used for encoded variants.
+
+        :return: The (possibly compressed) body.
+        """
+        key = encoding or "identity"
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._bodies = {}
+            bodies = self._bodies
+            if key in bodies:
+                return bodies[key]
+        # Build outside of the lock; a concurrent miss only costs a
+        # duplicate build, never a wrong body.
+        identity = bodies.get("identity")
+        built = version
+        if identity is None:
+            built, identity = build()
+        body = (
+            identity if encoding is None
+            else compress_body(identity, encoding, level)
+        )
+        with self._lock:
+            # The data changed between reading the version and building:
+            # serve the newer body, but don't cache it as version.
+            if built == version and self._version == version:
+                self._bodies["identity"] = identity
+                self._bodies[key] = body
+
+        return body
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version = None
+            self._bodies = {}
+
+def init_compression(app: Flask) -> None:
+    """
+    Registers negotiated gzip/deflate compression on the app.
+
+    Responses smaller than COMPRESSION_MIN_SIZE bytes are sent as is.
+    """
+    app.config.setdefault("COMPRESSION_MIN_SIZE", DEFAULT_MIN_SIZE)
+    app.config.setdefault("COMPRESSION_LEVEL", DEFAULT_LEVEL)
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        response.vary.add("Accept-Encoding")
+        if not should_compress(response, app.config["COMPRESSION_MIN_SIZE"]):
+            return response
+        encoding = choose_encoding()
+        if encoding is None:
+            return response
+        response.set_data(
+            compress_body(
+                response.get_data(),
+                encoding,
+                app.config["COMPRESSION_LEVEL"]
+            )
+        )
+        response.headers["Content-Encoding"] = encoding
+
+        return response
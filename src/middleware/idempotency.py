@@ -0,0 +1,85 @@
+import functools
+import hashlib
+import time
+from typing import Callable
+from flask import Response, current_app, jsonify, make_response, request
+from src.services import idempotency_service
+
+HEADER = "Idempotency-Key"
+PURGE_INTERVAL_SECONDS = 60
+
+_last_purge = 0.0
+
+def _fingerprint() -> str:
+    payload = request.method.encode() + b" " + request.path.encode()
+    return hashlib.sha256(payload + b"\n" + request.get_data()).hexdigest()
+
+def _maybe_purge() -> None:
+    # Expired keys are removed at most once a minute per worker.
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge >= PURGE_INTERVAL_SECONDS:
+        _last_purge = now
+        idempotency_service.purge_expired()
+
+def idempotent(view: Callable) -> Callable:
+    """
+    Makes a POST route safe to retry with an Idempotency-Key header.
+
+    The first request with a key runs the view and stores its response.
+    Retries with the same key and payload replay the stored response
+    without running the view again. Requests without the header are
+    not affected.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+
+        _maybe_purge()
+        scope = request.path
+        fingerprint = _fingerprint()
+        record = idempotency_service.begin_request(
+            key,
+            scope,
+            fingerprint,
+            current_app.config.get(
+                "IDEMPOTENCY_TTL_SECONDS",
+                idempotency_service.DEFAULT_TTL_SECONDS
+            )
+        )
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                return jsonify(
+                    {"error": "Idempotency-Key reused with another payload"}
+                ), 422
+            if record.status_code is None:
+                return jsonify(
+                    {"error": "A request with this Idempotency-Key is "
+                              "still in progress"}
+                ), 409
+            response = Response(
+                record.response_body,
+                status=record.status_code,
+                mimetype="application/json"
+            )
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_service.release_request(key, scope)
+            raise
+        if response.status_code >= 500:
+            # Server errors are not stored; the client may retry.
+            idempotency_service.release_request(key, scope)
+        else:
+            idempotency_service.complete_request(
+                key, scope, response.status_code, response.get_data()
+            )
+
+        return response
+
+    return wrapper
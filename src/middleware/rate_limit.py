@@ -0,0 +1,215 @@
+"""
+Admission control: token-bucket rate limits and per-route concurrency
+limits.
+
+Rate limits are token buckets keyed by client. RATE_LIMIT_CLIENT
+limits a client over all routes and RATE_LIMIT_ROUTES limits it per
+route rule, each as (tokens per second, burst). A request over its
+limit is answered 429 at once, with Retry-After set to when the next
+token is due.
+
+Buckets live in process memory, so every worker enforces its own
+limits. Set RATE_LIMIT_STORAGE to the path of a local SQLite file to
+share them between the workers of a host.
+
+CONCURRENCY_LIMITS caps the requests a worker runs at once per route
+rule. A request waits at most CONCURRENCY_QUEUE_TIMEOUT seconds (its
+latency budget) for a slot, and is answered 503 when none frees up, so
+a slow route sheds load instead of queueing every worker behind it.
+"""
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from flask import Flask, g, jsonify, request
+
+DEFAULT_QUEUE_TIMEOUT = 0.1
+DEFAULT_MAX_BUCKETS = 100000
+
+# (tokens per second, burst)
+Limit = Tuple[float, float]
+
+def _refill(
+        tokens: float, updated_at: float, limit: Limit, now: float
+    ) -> float:
+    rate, burst = limit
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+def _take(tokens: float, limit: Limit) -> Tuple[float, float]:
+    """
+    Takes a token from a refilled bucket.
+
+    :return: Tuple of (tokens left, seconds to wait). Nothing is taken
+        when the wait is positive.
+    """
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / limit[0]
+
+class MemoryBucketStore:
+    """Token buckets of one process, evicting the least recently used."""
+    def __init__(self, max_buckets: int = DEFAULT_MAX_BUCKETS) -> None:
+        self.max_buckets = max_buckets
+        # Key -> (tokens, updated_at)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        """
+        Takes a token from a bucket.
+
+        :return: 0 if a token was taken, otherwise the seconds until one
+            is available.
+        """
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (limit[1], now))
+            tokens = _refill(tokens, updated_at, limit, now)
+            tokens, wait = _take(tokens, limit)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                # An evicted bucket comes back full.
+                self._buckets.popitem(last=False)
+
+        return wait
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file shared by the workers of a host.
+
+    Every take is one short IMMEDIATE transaction. Durability doesn't
+    matter for rate limits, so the file isn't fsynced.
+    """
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS token_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            full_at REAL NOT NULL
+        )
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=1.0, isolation_level=None
+            )
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE key = ?",
+                (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (limit[1], now)
+            tokens = _refill(tokens, updated_at, limit, now)
+            tokens, wait = _take(tokens, limit)
+            conn.execute(
+                """
+                INSERT INTO token_buckets (key, tokens, updated_at, full_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = excluded.tokens,
+                    updated_at = excluded.updated_at,
+                    full_at = excluded.full_at
+                """,
+                (key, tokens, now, now + (limit[1] - tokens) / limit[0])
+            )
+            if now - self._last_purge >= self.PURGE_INTERVAL_SECONDS:
+                # A full bucket is the same as no bucket.
+                self._last_purge = now
+                conn.execute(
+                    "DELETE FROM token_buckets WHERE full_at <= ?", (now,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return wait
+
+def _client_id() -> str:
+    return request.remote_addr or "unknown"
+
+def _retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+def init_rate_limiting(app: Flask) -> None:
+    """
+    Registers rate limits and concurrency limits on the app.
+
+    Nothing is limited unless RATE_LIMIT_CLIENT, RATE_LIMIT_ROUTES or
+    CONCURRENCY_LIMITS is configured.
+    """
+    client_limit: Optional[Limit] = app.config.get("RATE_LIMIT_CLIENT")
+    route_limits: Dict[str, Limit] = app.config.get("RATE_LIMIT_ROUTES", {})
+    concurrency_limits: Dict[str, int] = app.config.get(
+        "CONCURRENCY_LIMITS", {}
+    )
+    queue_timeout = app.config.get(
+        "CONCURRENCY_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT
+    )
+    if not (client_limit or route_limits or concurrency_limits):
+        return
+
+    store = (
+        SQLiteBucketStore(app.config["RATE_LIMIT_STORAGE"])
+        if app.config.get("RATE_LIMIT_STORAGE")
+        else MemoryBucketStore()
+    )
+    slots = {
+        rule: threading.BoundedSemaphore(limit)
+        for rule, limit in concurrency_limits.items()
+    }
+
+    @app.before_request
+    def admit_request():
+        rule = request.url_rule.rule if request.url_rule else None
+        client = _client_id()
+        now = time.time()
+        wait = 0.0
+        if client_limit:
+            wait = store.take(f"client:{client}", client_limit, now)
+        if not wait and rule in route_limits:
+            wait = store.take(
+                f"route:{rule}:{client}", route_limits[rule], now
+            )
+        if wait:
+            response = jsonify({"error": "Too many requests"})
+            response.status_code = 429
+            response.headers["Retry-After"] = _retry_after(wait)
+            return response
+
+        semaphore = slots.get(rule)
+        if semaphore is not None:
+            if not semaphore.acquire(timeout=queue_timeout):
+                response = jsonify({"error": "Server busy"})
+                response.status_code = 503
+                response.headers["Retry-After"] = _retry_after(
+                    queue_timeout
+                )
+                return response
+            g.concurrency_slot = semaphore
+
+    @app.teardown_request
+    def release_slot(exc=None):
+        semaphore = g.pop("concurrency_slot", None)
+        if semaphore is not None:
+            semaphore.release()
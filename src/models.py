@@ -14,6 +14,18 @@ class Product:
     name: str
     description: str
     price: float
+    stock: Optional[int] = None  # None when inventory is not tracked
+
+@dataclass
+class CatalogChange:
+    seq: int       # Increases with every change, never reused
+    product_id: int
+    change: str    # "add", "edit" or "delete"
+    # The product's listed fields after the change; None after "delete"
+    name: Optional[str]
+    description: Optional[str]
+    price: Optional[float]
+    changed_at: str
 
 @dataclass
 class Cart:
@@ -27,3 +39,21 @@ class Order:
     created_at: str
     user_id: int
     products: str  # JSON string containing products and quantities
+
+@dataclass
+class IdempotencyRecord:
+    key: str
+    scope: str
+    fingerprint: str
+    status_code: Optional[int]   # None while the request is in progress
+    response_body: Optional[bytes]
+    created_at: float
+    expires_at: float
+
+@dataclass
+class Backup:
+    id: str
+    status: str    # "running", "done" or "failed"
+    # Progress per file: path -> {"copied": ..., "total": ...}
+    files: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    error: Optional[str] = None
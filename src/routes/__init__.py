@@ -1 +1 @@
-from src.routes import cart_routes, user_routes, product_routes
+from src.routes import analytics_routes, backup_routes, cart_routes, order_routes, user_routes, product_routes
@@ -0,0 +1,385 @@
+from flask import Blueprint, request, jsonify
+from src.services import analytics_service, user_service
+
+bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+
+@bp.route('/daily-revenue', methods=['GET'])
+def get_daily_revenue():
+    """
+    Orders, units and revenue per day (admin only).
+    ---
+    tags:
+      - Analytics
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: since
+        in: query
+        description: Only orders created at or after this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-01-01T00:00:00"
+      - name: until
+        in: query
+        description: Only orders created before this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-02-01T00:00:00"
+    responses:
+      200:
+        description: One entry per day with orders, oldest first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              day:
+                type: string
+                example: "2025-01-15"
+              orders:
+                type: integer
+                example: 12
+              units:
+                type: integer
+                example: 30
+              revenue:
+                type: number
+                example: 459.7
+      400:
+        description: Missing or invalid parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unauthorized: Only admins can see analytics"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        days = analytics_service.get_daily_revenue(
+            user, request.args.get("since"), request.args.get("until")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(days), 200
+
+@bp.route('/top-products', methods=['GET'])
+def get_top_products():
+    """
+    The best-selling products (admin only).
+    ---
+    tags:
+      - Analytics
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: since
+        in: query
+        description: Only orders created at or after this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-01-01T00:00:00"
+      - name: until
+        in: query
+        description: Only orders created before this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-02-01T00:00:00"
+      - name: limit
+        in: query
+        description: Number of products.
+        required: false
+        type: integer
+        default: 10
+      - name: by
+        in: query
+        description: Rank by revenue or by units sold.
+        required: false
+        type: string
+        enum: [revenue, units]
+        default: revenue
+    responses:
+      200:
+        description: Products, best first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              product_id:
+                type: integer
+                example: 101
+              units:
+                type: integer
+                example: 42
+              revenue:
+                type: number
+                example: 1049.58
+      400:
+        description: Missing or invalid parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "by must be 'revenue' or 'units'"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        products = analytics_service.get_top_products(
+            user,
+            request.args.get("since"),
+            request.args.get("until"),
+            limit=int(request.args.get("limit", 10)),
+            by=request.args.get("by", "revenue")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(products), 200
+
+@bp.route('/basket-sizes', methods=['GET'])
+def get_basket_sizes():
+    """
+    Distribution of the units per order (admin only).
+    ---
+    tags:
+      - Analytics
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: since
+        in: query
+        description: Only orders created at or after this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-01-01T00:00:00"
+      - name: until
+        in: query
+        description: Only orders created before this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-02-01T00:00:00"
+    responses:
+      200:
+        description: Orders per basket size, smallest first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              size:
+                type: integer
+                example: 3
+              orders:
+                type: integer
+                example: 17
+      400:
+        description: Missing or invalid parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unauthorized: Only admins can see analytics"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        sizes = analytics_service.get_basket_sizes(
+            user, request.args.get("since"), request.args.get("until")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(sizes), 200
+
+@bp.route('/product-sales', methods=['GET'])
+def get_product_sales():
+    """
+    The best-selling products of all time, from the sales summary (admin
+    only).
+    ---
+    tags:
+      - Analytics
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: limit
+        in: query
+        description: Number of products.
+        required: false
+        type: integer
+        default: 10
+      - name: by
+        in: query
+        description: Rank by revenue or by units sold.
+        required: false
+        type: string
+        enum: [revenue, units]
+        default: revenue
+    responses:
+      200:
+        description: Products, best first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              product_id:
+                type: integer
+                example: 101
+              units:
+                type: integer
+                example: 42
+              revenue:
+                type: number
+                example: 1049.58
+      400:
+        description: Missing or invalid parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "limit must be positive"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        products = analytics_service.get_product_sales(
+            user,
+            limit=int(request.args.get("limit", 10)),
+            by=request.args.get("by", "revenue")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(products), 200
+
+@bp.route('/daily-sales', methods=['GET'])
+def get_daily_sales():
+    """
+    Orders and revenue per day, from the sales summary (admin only).
+    ---
+    tags:
+      - Analytics
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: since
+        in: query
+        description: Only days on or after this date.
+        required: false
+        type: string
+        example: "2025-01-01"
+      - name: until
+        in: query
+        description: Only days before this date.
+        required: false
+        type: string
+        example: "2025-02-01"
+    responses:
+      200:
+        description: One entry per day with orders, oldest first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              day:
+                type: string
+                example: "2025-01-15"
+              orders:
+                type: integer
+                example: 12
+              revenue:
+                type: number
+                example: 459.7
+      400:
+        description: Missing or invalid parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Days must be YYYY-MM-DD dates"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        days = analytics_service.get_daily_sales(
+            user, request.args.get("since"), request.args.get("until")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(days), 200
@@ -0,0 +1,138 @@
+from flask import Blueprint, current_app, request, jsonify
+from src.models import Backup
+from src.services import backup_service, user_service
+
+bp = Blueprint('backups', __name__, url_prefix='/backups')
+
+def _backup_to_json(backup: Backup) -> dict:
+    return {
+        "backup_id": backup.id,
+        "status": backup.status,
+        "files": backup.files,
+        "error": backup.error
+    }
+
+@bp.route('', methods=['POST'])
+def start_backup():
+    """
+    Start an online backup of the database (admin only).
+    ---
+    tags:
+      - Backups
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            user_id:
+              type: integer
+              description: The ID of the admin user.
+              example: 1
+            compress:
+              type: boolean
+              description: Write gzip files (default true).
+              example: true
+    responses:
+      202:
+        description: Backup started; poll its status.
+        schema:
+          type: object
+          properties:
+            backup_id:
+              type: string
+              example: "20250115T100000-1a2b3c4d"
+            status:
+              type: string
+              example: "running"
+            files:
+              type: object
+            error:
+              type: string
+      400:
+        description: Missing parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unauthorized: Only admins can back up"
+    """
+    data = request.get_json() or {}
+    try:
+        user = user_service.get_user_by_id(data.get('user_id'))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        backup = backup_service.start_backup(
+            user,
+            current_app.config.get("BACKUP_DIR", "backups"),
+            bool(data.get("compress", True))
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(_backup_to_json(backup)), 202
+
+@bp.route('/<backup_id>', methods=['GET'])
+def get_backup(backup_id: str):
+    """
+    Get the status and progress of a backup (admin only).
+    ---
+    tags:
+      - Backups
+    parameters:
+      - name: backup_id
+        in: path
+        required: true
+        type: string
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+    responses:
+      200:
+        description: Status and pages copied per file.
+        schema:
+          type: object
+          properties:
+            backup_id:
+              type: string
+            status:
+              type: string
+              example: "done"
+            files:
+              type: object
+              example: {"backups/20250115T100000-1a2b3c4d-main.db.gz": {"copied": 512, "total": 512}}
+            error:
+              type: string
+      400:
+        description: Missing parameters or unauthorized user.
+      404:
+        description: Backup not found.
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        backup = backup_service.get_backup(user, backup_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if backup is None:
+        return jsonify({"error": "Backup not found"}), 404
+
+    return jsonify(_backup_to_json(backup)), 200
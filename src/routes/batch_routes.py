@@ -0,0 +1,142 @@
+import json
+import sys
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
+from werkzeug.exceptions import InternalServerError
+from werkzeug.test import EnvironBuilder
+from db.database import shared_reads
+
+bp = Blueprint('batch', __name__, url_prefix='/batch')
+
+# Most sub-requests in one batch
+MAX_BATCH_REQUESTS = 20
+# Routes that wait for new data, which the batch's snapshot never shows.
+UNBATCHED_RULES = {'/products/changes'}
+
+def _dispatch(app: Flask, environ: dict) -> bytes:
+    """
+    Runs one sub-request through the app's full dispatch, with its own
+    app context, so hooks such as rate limiting see it as a request.
+
+    :return: The JSON of its status and body.
+    """
+    with app.app_context(), app.request_context(environ):
+        rule = request.url_rule.rule if request.url_rule else None
+        if rule in UNBATCHED_RULES:
+            response = jsonify({'error': f'{rule} cannot be batched'})
+            response.status_code = 400
+        else:
+            try:
+                response = app.full_dispatch_request()
+            except Exception as e:
+                # Not app.handle_exception, which re-raises in testing and
+                # would fail the whole batch: only this entry is a 500.
+                app.log_exception(sys.exc_info())
+                response = app.finalize_request(
+                    InternalServerError(original_exception=e),
+                    from_error_handler=True
+                )
+        data = response.get_data()
+
+    # JSON bodies are spliced in as they are, not decoded and re-encoded.
+    if not response.is_json:
+        data = json.dumps(data.decode('utf-8')).encode() if data else b''
+    return b'{"status": %d, "body": %s}' % (
+        response.status_code, data.strip() or b'null'
+    )
+
+@bp.route('', methods=['POST'])
+def batch():
+    """
+    Run several GET requests in one round trip.
+
+    The sub-requests run in order through the same routes, hooks and
+    rate limits as separate requests, but share one read connection and
+    read transaction per database, so all results come from one snapshot.
+    GET /products/changes cannot be batched, as it waits for changes the
+    snapshot never shows.
+    ---
+    tags:
+      - Batch
+    parameters:
+      - in: body
+        name: batch
+        required: true
+        schema:
+          type: object
+          properties:
+            requests:
+              type: array
+              description: Up to 20 sub-requests.
+              items:
+                type: object
+                properties:
+                  method:
+                    type: string
+                    enum: [GET]
+                    default: GET
+                  path:
+                    type: string
+                    description: Path with query string.
+                    example: "/cart/view?user_id=1&cart_id=10"
+    responses:
+      200:
+        description: The results, in the order of the sub-requests.
+        schema:
+          type: object
+          properties:
+            responses:
+              type: array
+              items:
+                type: object
+                properties:
+                  status:
+                    type: integer
+                    example: 200
+                  body:
+                    description: The JSON response body, or its text.
+                    example: {"id": 1, "name": "Laptop"}
+      400:
+        description: Invalid or too many sub-requests.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Only GET requests can be batched"
+    """
+    data = request.get_json(silent=True) or {}
+    requests = data.get('requests')
+    if not isinstance(requests, list) or not requests:
+        return jsonify({'error': 'Missing requests'}), 400
+    if len(requests) > MAX_BATCH_REQUESTS:
+        return jsonify(
+            {'error': f'At most {MAX_BATCH_REQUESTS} requests per batch'}
+        ), 400
+    for sub_request in requests:
+        if not isinstance(sub_request, dict) or not str(
+            sub_request.get('path', '')
+        ).startswith('/'):
+            return jsonify({'error': 'Every request needs a path'}), 400
+        if sub_request.get('method', 'GET').upper() != 'GET':
+            return jsonify({'error': 'Only GET requests can be batched'}), 400
+
+    app = current_app._get_current_object()
+    results = []
+    with shared_reads():
+        for sub_request in requests:
+            builder = EnvironBuilder(
+                path=sub_request['path'],
+                method='GET',
+                base_url=request.host_url,
+                environ_base={'REMOTE_ADDR': request.remote_addr}
+            )
+            try:
+                results.append(_dispatch(app, builder.get_environ()))
+            finally:
+                builder.close()
+
+    return Response(
+        b'{"responses": [%s]}' % b', '.join(results),
+        status=200,
+        mimetype='application/json'
+    )
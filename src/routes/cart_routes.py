@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from src.middleware.idempotency import idempotent
 from src.services import cart_service, user_service
 from src.models import Cart
 
@@ -24,9 +25,19 @@ def view_cart():
         required: true
         type: integer
         example: 10
+      - name: expand
+        in: query
+        description: >
+          Set to "products" to get names, unit prices, line totals and
+          the cart total instead of the plain list of cart items.
+        required: false
+        type: string
+        example: products
     responses:
       200:
-        description: A list of cart items.
+        description: >
+          A list of cart items, or with expand=products an object with
+          cart_id, items (with name, unit_price and line_total) and total.
         schema:
           type: array
           items:
@@ -60,12 +71,141 @@ def view_cart():
     # Create a dummy Cart object with the given cart_id.
     dummy_cart = Cart(id=int(cart_id), user_id=user.id, items={})
     try:
+        if request.args.get("expand") == "products":
+            return jsonify(
+                cart_service.view_cart_with_products(dummy_cart, user)
+            ), 200
         cart_items = cart_service.view_cart(dummy_cart, user)
         return jsonify(cart_items), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+def _cart_lines(items: list) -> list:
+    # [{"product_id": 101, "product_quantity": 2}] -> [(101, 2)]
+    lines = []
+    for item in items:
+        pid = item.get("product_id")
+        qty = item.get("product_quantity")
+        if pid is None or qty is None:
+            raise ValueError(
+                "Each item must have product_id and product_quantity"
+            )
+        lines.append((pid, qty))
+    return lines
+
+@bp.route('', methods=['PATCH'])
+def update_cart():
+    """
+    Set quantities, remove items or replace the user's cart in one
+    transaction.
+
+    replace empties the cart and fills it with its items; set then sets
+    exact quantities and remove deletes items. A quantity of 0 deletes
+    the item. If any product doesn't exist, nothing changes.
+    ---
+    tags:
+      - Cart
+    parameters:
+      - in: body
+        name: cartChanges
+        description: The user ID and at least one of set, remove and replace.
+        required: true
+        schema:
+          type: object
+          properties:
+            user_id:
+              type: integer
+              example: 1
+            set:
+              type: array
+              description: Products with their new quantities.
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: integer
+                    example: 101
+                  product_quantity:
+                    type: integer
+                    example: 3
+            remove:
+              type: array
+              description: IDs of products to remove.
+              items:
+                type: integer
+              example: [102]
+            replace:
+              type: array
+              description: The complete new contents of the cart.
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: integer
+                    example: 101
+                  product_quantity:
+                    type: integer
+                    example: 1
+    responses:
+      200:
+        description: Cart updated successfully.
+        schema:
+          type: object
+          properties:
+            cart_id:
+              type: integer
+              example: 10
+            user_id:
+              type: integer
+              example: 1
+            items:
+              type: object
+              additionalProperties:
+                type: integer
+              example: {"101": 3}
+      400:
+        description: Invalid changes, unknown user or unknown product.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Product with id 999 not found"
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        cart = cart_service.update_cart(
+            user,
+            set_items=_cart_lines(data["set"]) if "set" in data else None,
+            remove=data.get("remove"),
+            replace=(
+                _cart_lines(data["replace"]) if "replace" in data else None
+            )
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(
+        {
+          "cart_id": cart.id,
+          "user_id": cart.user_id,
+          "items": cart.items
+        }
+    ), 200
+
 @bp.route('/add', methods=['POST'])
+@idempotent
 def add_to_cart():
     """
     Add products to the user's shopping cart.
@@ -73,6 +213,11 @@ def add_to_cart():
     tags:
       - Cart
     parameters:
+      - name: Idempotency-Key
+        in: header
+        description: Optional key making retries of this request safe.
+        required: false
+        type: string
       - in: body
         name: cartData
         description: Data containing the user ID and products to add.
@@ -120,6 +265,10 @@ def add_to_cart():
             error:
               type: string
               example: "Missing user_id or items"
+      409:
+        description: A request with the same Idempotency-Key is in progress.
+      422:
+        description: The Idempotency-Key was used with another payload.
     """
     data = request.get_json()
     user_id = data.get("user_id")
@@ -144,6 +293,10 @@ def add_to_cart():
                   "error": "Each item must have product_id and product_quantity"
                 }
               ), 400
+        if not isinstance(qty, int) or qty <= 0:
+            return jsonify(
+                {"error": "product_quantity must be a positive integer"}
+            ), 400
         products.append((pid, qty))
 
     try:
@@ -160,6 +313,7 @@ def add_to_cart():
         return jsonify({"error": str(e)}), 400
 
 @bp.route('/order', methods=['POST'])
+@idempotent
 def place_order():
     """
     Place an order based on the user's current cart.
@@ -167,6 +321,11 @@ def place_order():
     tags:
       - Cart
     parameters:
+      - name: Idempotency-Key
+        in: header
+        description: Optional key making retries of this request safe.
+        required: false
+        type: string
       - in: body
         name: orderData
         description: Data containing the user ID and the cart ID to place an order for.
@@ -208,6 +367,32 @@ def place_order():
             error:
               type: string
               example: "Missing user_id or cart_id"
+      409:
+        description: >
+          Not enough stock for some items, or a request with the same
+          Idempotency-Key is in progress.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Insufficient stock for products: 101"
+            items:
+              type: array
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: integer
+                    example: 101
+                  requested:
+                    type: integer
+                    example: 3
+                  available:
+                    type: integer
+                    example: 1
+      422:
+        description: The Idempotency-Key was used with another payload.
     """
     data = request.get_json()
     user_id = data.get("user_id")
@@ -230,5 +415,7 @@ def place_order():
             "created_at": order.created_at,
             "products": order.products
         }), 201
+    except cart_service.InsufficientStockError as e:
+        return jsonify({"error": str(e), "items": e.failures}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 400
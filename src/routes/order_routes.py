@@ -0,0 +1,176 @@
+import json
+from flask import Blueprint, request, jsonify
+from src.services import order_service, user_service
+
+bp = Blueprint('orders', __name__, url_prefix='/orders')
+
+@bp.route('', methods=['GET'])
+def get_orders():
+    """
+    List the orders of all users (admin only).
+    ---
+    tags:
+      - Orders
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: since
+        in: query
+        description: Only orders created at or after this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-01-01T00:00:00"
+      - name: until
+        in: query
+        description: Only orders created before this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-02-01T00:00:00"
+    responses:
+      200:
+        description: Orders from every shard, oldest first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              order_id:
+                type: integer
+                example: 1001
+              user_id:
+                type: integer
+                example: 2
+              created_at:
+                type: string
+                example: "2025-01-15T10:00:00"
+              products:
+                type: array
+                items:
+                  type: object
+                  properties:
+                    product_id:
+                      type: integer
+                      example: 101
+                    product_quantity:
+                      type: integer
+                      example: 3
+      400:
+        description: Missing parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unauthorized: Only admins can list orders"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        orders = order_service.get_orders(
+            user, request.args.get("since"), request.args.get("until")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify([
+        {
+            "order_id": order.id,
+            "user_id": order.user_id,
+            "created_at": order.created_at,
+            "products": json.loads(order.products)
+        } for order in orders
+    ]), 200
+
+@bp.route('/report', methods=['GET'])
+def get_orders_report():
+    """
+    Summarize the orders of a time range (admin only).
+    ---
+    tags:
+      - Orders
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+      - name: since
+        in: query
+        description: Only orders created at or after this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-01-01T00:00:00"
+      - name: until
+        in: query
+        description: Only orders created before this ISO timestamp.
+        required: false
+        type: string
+        example: "2025-02-01T00:00:00"
+    responses:
+      200:
+        description: Totals over all shards and the totals of each shard.
+        schema:
+          type: object
+          properties:
+            order_count:
+              type: integer
+              example: 42
+            customer_count:
+              type: integer
+              example: 17
+            units_sold:
+              type: integer
+              example: 96
+            per_shard:
+              type: array
+              items:
+                type: object
+                properties:
+                  order_count:
+                    type: integer
+                  customer_count:
+                    type: integer
+                  units_sold:
+                    type: integer
+      400:
+        description: Missing parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unauthorized: Only admins can see reports"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        report = order_service.get_orders_report(
+            user, request.args.get("since"), request.args.get("until")
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(report), 200
@@ -1,15 +1,94 @@
-from flask import Blueprint, request, jsonify
+import json
+import time
+from typing import Iterator, List, Tuple
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    request,
+    jsonify,
+    stream_with_context
+)
+from src.middleware import compression
+from src.models import CatalogChange, Product
 from src.services import product_service, user_service
 
 bp = Blueprint('products', __name__, url_prefix='/products')
 
+# Seconds an event stream stays open; clients reconnect with
+# Last-Event-ID and resume where it ended.
+DEFAULT_CHANGES_STREAM_SECONDS = 60.0
+# Seconds between keep-alive comments on an idle event stream
+CHANGES_HEARTBEAT_SECONDS = 15.0
+
+# Encoded and compressed catalog listing, kept per catalog version.
+catalog_cache = compression.PrecompressedCache()
+
+def _product_to_dict(product: Product) -> dict:
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'stock': product.stock
+    }
+
+def _get_products_by_ids(ids: str) -> Tuple[Response, int]:
+    try:
+        product_ids = [int(pid) for pid in ids.split(',') if pid.strip()]
+        products, missing = product_service.get_products_by_ids(product_ids)
+    except ValueError:
+        return jsonify({'error': 'ids must be comma-separated integers'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(
+        {
+            'products': [_product_to_dict(p) for p in products],
+            'missing': missing
+        }
+    ), 200
+
+def _catalog_cache_version(version: int) -> tuple:
+    # Keyed by database too, as apps in one process may use different ones.
+    return (current_app.config.get('DATABASE'), version)
+
+def _build_catalog_body() -> Tuple[tuple, bytes]:
+    # The version comes from the same snapshot as the products.
+    version, products = product_service.get_catalog_snapshot()
+    products_list = [
+        {
+            'id': p.id,
+            'name': p.name,
+            'description': p.description,
+            'price': p.price
+        } for p in products
+    ]
+    return (
+        _catalog_cache_version(version),
+        jsonify(products_list).get_data()
+    )
+
 @bp.route('', methods=['GET'])
 def get_all_products():
     """
-    Retrieve a list of all products.
+    Retrieve a list of all products, or several products by ID.
+
+    Stock levels are not part of the listing, which is cached per
+    catalog version; use GET /products/<id> for live stock.
+
+    With ids, returns an object instead: the products found, with live
+    stock, and the IDs that don't exist, both in the order asked for.
     ---
     tags:
       - Products
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        required: false
+        description: Comma-separated IDs of up to 100 products to look up.
+        example: "1,2,3"
     responses:
       200:
         description: A list of products.
@@ -31,17 +110,189 @@ def get_all_products():
                 type: number
                 format: float
                 example: 1500.00
+      400:
+        description: Invalid or too many ids.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "ids must be comma-separated integers"
     """
-    products = product_service.get_all_products()
-    products_list = [
-        {
-            'id': p.id,
-            'name': p.name,
-            'description': p.description,
-            'price': p.price
-        } for p in products
-    ]
-    return jsonify(products_list), 200
+    ids = request.args.get('ids')
+    if ids is not None:
+        return _get_products_by_ids(ids)
+
+    # The body is served from the per-version cache, so a hot listing
+    # skips both the JSON encoding and the compression.
+    version = _catalog_cache_version(product_service.get_catalog_version())
+    identity = catalog_cache.get(version, None, _build_catalog_body)
+    encoding = None
+    if len(identity) >= current_app.config['COMPRESSION_MIN_SIZE']:
+        encoding = compression.choose_encoding()
+    body = catalog_cache.get(
+        version,
+        encoding,
+        _build_catalog_body,
+        current_app.config['COMPRESSION_LEVEL']
+    )
+    response = Response(body, status=200, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def _change_to_dict(change: CatalogChange) -> dict:
+    return {
+        'seq': change.seq,
+        'product_id': change.product_id,
+        'change': change.change,
+        'name': change.name,
+        'description': change.description,
+        'price': change.price,
+        'changed_at': change.changed_at
+    }
+
+def _stream_changes(
+        changes: List[CatalogChange], since: int, limit: int, seconds: float
+    ) -> Iterator[str]:
+    deadline = time.monotonic() + seconds
+    while True:
+        if not changes:
+            yield ": keep-alive\n\n"
+        for change in changes:
+            yield (
+                f"id: {change.seq}\n"
+                f"event: {change.change}\n"
+                f"data: {json.dumps(_change_to_dict(change))}\n\n"
+            )
+            since = change.seq
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        changes = product_service.get_catalog_changes(
+            since, limit, min(remaining, CHANGES_HEARTBEAT_SECONDS)
+        )
+
+@bp.route('/changes', methods=['GET'])
+def get_catalog_changes():
+    """
+    Catalog changes after a sequence number, for caches and indexers
+    that follow the catalog incrementally.
+
+    Every add, edit and delete logs one change with a sequence number.
+    Start with since=0 (which lists the whole catalog as adds), then pass
+    the last_seq of each response as the next since. With wait, the
+    request is held until a change arrives (long polling). With
+    Accept text/event-stream, changes are streamed as server-sent events
+    whose ids are sequence numbers, and a reconnecting client resumes
+    from its Last-Event-ID.
+    ---
+    tags:
+      - Products
+    produces:
+      - application/json
+      - text/event-stream
+    parameters:
+      - name: since
+        in: query
+        type: integer
+        required: false
+        default: 0
+        description: Sequence number of the last change already seen.
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 100
+        description: Most changes returned (at most 1000).
+      - name: wait
+        in: query
+        type: number
+        required: false
+        default: 0
+        description: Seconds to wait for a change when there is none yet (at most 30).
+      - name: Last-Event-ID
+        in: header
+        type: integer
+        required: false
+        description: Event stream resume point; overrides since.
+    responses:
+      200:
+        description: The changes, oldest first.
+        schema:
+          type: object
+          properties:
+            changes:
+              type: array
+              items:
+                type: object
+                properties:
+                  seq:
+                    type: integer
+                    example: 42
+                  product_id:
+                    type: integer
+                    example: 1
+                  change:
+                    type: string
+                    enum: [add, edit, delete]
+                    example: "edit"
+                  name:
+                    type: string
+                    description: Null for deletes.
+                    example: "Laptop"
+                  description:
+                    type: string
+                    example: "Gaming laptop"
+                  price:
+                    type: number
+                    format: float
+                    example: 1400.00
+                  changed_at:
+                    type: string
+                    example: "2025-01-15T10:30:00.000"
+            last_seq:
+              type: integer
+              description: The since of the next request.
+              example: 42
+      400:
+        description: Invalid parameters.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "limit must be between 1 and 1000"
+    """
+    try:
+        since = int(
+            request.headers.get('Last-Event-ID')
+            or request.args.get('since', 0)
+        )
+        limit = int(request.args.get('limit', 100))
+        wait = float(request.args.get('wait', 0))
+        if request.accept_mimetypes.best == 'text/event-stream':
+            # Read before the stream starts, so bad parameters get a 400.
+            changes = product_service.get_catalog_changes(since, limit)
+            seconds = current_app.config.get(
+                'CATALOG_CHANGES_STREAM_SECONDS',
+                DEFAULT_CHANGES_STREAM_SECONDS
+            )
+            return Response(
+                stream_with_context(
+                    _stream_changes(changes, since, limit, seconds)
+                ),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache'}
+            )
+        changes = product_service.get_catalog_changes(since, limit, wait)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'changes': [_change_to_dict(change) for change in changes],
+        'last_seq': changes[-1].seq if changes else since
+    }), 200
 
 @bp.route('/<int:product_id>', methods=['GET'])
 def get_product(product_id: int):
@@ -75,6 +326,10 @@ def get_product(product_id: int):
               type: number
               format: float
               example: 1500.00
+            stock:
+              type: integer
+              description: Units in stock, null when not tracked.
+              example: 25
       404:
         description: Product not found.
         schema:
@@ -86,17 +341,93 @@ def get_product(product_id: int):
     """
     product = product_service.get_product_by_id(product_id)
     if product:
-        return jsonify(
-            {
-                'id': product.id,
-                'name': product.name,
-                'description': product.description,
-                'price': product.price
-            }
-        ), 200
+        return jsonify(_product_to_dict(product)), 200
     else:
         return jsonify({'error': 'Product not found'}), 404
 
+@bp.route('/<int:product_id>/related', methods=['GET'])
+def get_related_products(product_id: int):
+    """
+    Products frequently bought together with a product.
+
+    Served from an index updated in the background, so the latest orders
+    may not be counted yet.
+    ---
+    tags:
+      - Products
+    parameters:
+      - name: product_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the product.
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 10
+        description: Number of related products.
+    responses:
+      200:
+        description: Related products, most frequently bought together first.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+                example: 2
+              name:
+                type: string
+                example: "Mouse"
+              description:
+                type: string
+                example: "Wireless mouse"
+              price:
+                type: number
+                format: float
+                example: 25.00
+              orders:
+                type: integer
+                description: Orders containing both products.
+                example: 42
+      400:
+        description: Invalid limit.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "limit must be positive"
+      404:
+        description: Product not found.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Product not found"
+    """
+    try:
+        related = product_service.get_related_products(
+            product_id, int(request.args.get('limit', 10))
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    if related is None:
+        return jsonify({'error': 'Product not found'}), 404
+
+    return jsonify([
+        {
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'price': product.price,
+            'orders': orders
+        } for product, orders in related
+    ]), 200
+
 @bp.route('/add', methods=['POST'])
 def add_product():
     """
@@ -125,6 +456,10 @@ def add_product():
               type: number
               format: float
               example: 1500.00
+            stock:
+              type: integer
+              description: Units in stock, null when not tracked.
+              example: 25
     responses:
       201:
         description: Product created successfully.
@@ -144,6 +479,10 @@ def add_product():
               type: number
               format: float
               example: 1500.00
+            stock:
+              type: integer
+              description: Units in stock, null when not tracked.
+              example: 25
       400:
         description: Error creating product.
         schema:
@@ -162,14 +501,18 @@ def add_product():
     name = data.get('name')
     description = data.get('description', '')
     price = data.get('price')
+    stock = data.get('stock')
     try:
-        product = product_service.add_product(user, name, description, price)
+        product = product_service.add_product(
+            user, name, description, price, stock=stock
+        )
         return jsonify(
             {
                 'id': product.id,
                 'name': product.name,
                 'description': product.description,
-                'price': product.price
+                'price': product.price,
+                'stock': product.stock
             }
         ), 201
     except Exception as e:
@@ -208,6 +551,10 @@ def edit_product(product_id: int):
               type: number
               format: float
               example: 1700.00
+            stock:
+              type: integer
+              description: Units in stock, null when not tracked.
+              example: 25
     responses:
       200:
         description: Product updated successfully.
@@ -227,6 +574,10 @@ def edit_product(product_id: int):
               type: number
               format: float
               example: 1700.00
+            stock:
+              type: integer
+              description: Units in stock, null when not tracked.
+              example: 25
       400:
         description: Error updating product.
         schema:
@@ -244,15 +595,17 @@ def edit_product(product_id: int):
     name = data.get('name')
     description = data.get('description')
     price = data.get('price')
+    stock = data.get('stock')
     try:
         product = product_service.edit_product(
-            user, product_id, name, description, price
+            user, product_id, name, description, price, stock=stock
         )
         return jsonify(
             {   'id': product.id,
                 'name': product.name,
                 'description': product.description,
-                'price': product.price
+                'price': product.price,
+                'stock': product.stock
             }
         ), 200
     except Exception as e:
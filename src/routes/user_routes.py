@@ -118,3 +118,73 @@ def login():
         ), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+
+@bp.route('/cache/stats', methods=['GET'])
+def get_username_cache_stats():
+    """
+    Get the hit rate of the username cache (admin only).
+    ---
+    tags:
+      - Users
+    parameters:
+      - name: user_id
+        in: query
+        description: The ID of the admin user.
+        required: true
+        type: integer
+        example: 1
+    responses:
+      200:
+        description: Cache counters; enabled is false when the cache is off.
+        schema:
+          type: object
+          properties:
+            enabled:
+              type: boolean
+              example: true
+            hits:
+              type: integer
+              example: 950
+            negative_hits:
+              type: integer
+              example: 4000
+            misses:
+              type: integer
+              example: 50
+            hit_rate:
+              type: number
+              example: 0.99
+            entries:
+              type: integer
+              example: 40
+            negative_entries:
+              type: integer
+              example: 10
+      400:
+        description: Missing parameters or unauthorized user.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unauthorized: Only admins can see stats"
+    """
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    try:
+        user = user_service.get_user_by_id(int(user_id))
+    except Exception:
+        user = None
+    if user is None:
+        return jsonify({"error": "User not found"}), 400
+
+    try:
+        stats = user_service.get_username_cache_stats(user)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if stats is None:
+        return jsonify({"enabled": False}), 200
+
+    return jsonify({"enabled": True, **stats}), 200
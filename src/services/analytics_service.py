@@ -0,0 +1,329 @@
+"""
+Order analytics over columnar arrays.
+
+Order lines are streamed from the storage backend in batches (fetchmany
+on SQLite, from the normalized order_items table) into one array per
+column, so no order's products JSON is decoded and no object is built
+per line. Aggregates are grouped sums over whole columns: vectorized
+with NumPy (unique + bincount) when it is installed, and otherwise
+single passes over array.array columns.
+
+Sales of all time per product and per day don't scan order lines at
+all: they are read from the sales summary tables, which checkout keeps
+up to date (see db.sales_summary).
+"""
+import heapq
+import operator
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+from db.repository import ORDER_LINE_COLUMNS, get_backend
+from src.models import User
+
+BATCH_SIZE = 10000
+
+# Set to False to use the array fallback even when NumPy is installed.
+USE_NUMPY = True
+
+class AnalyticsServiceError(Exception):
+    pass
+
+def _numpy():
+    if not USE_NUMPY:
+        return None
+    try:
+        # Imported on first use; it would double the import time of the
+        # services.
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class OrderLines:
+    """
+    Order lines as one array per column, named by column: order_id,
+    day, product_id, quantity and unit_price. Only the columns a report
+    needs are read.
+    """
+    def __init__(
+            self, batches: Iterable[List[tuple]], columns: Sequence[str]
+        ) -> None:
+        arrays = [
+            array("d" if column == "unit_price" else "q")
+            for column in columns
+        ]
+        for batch in batches:
+            for column, values in zip(arrays, zip(*batch)):
+                column.extend(values)
+        self.np = _numpy()
+        if self.np is not None:
+            # Views of the same buffers, no copy.
+            arrays = [
+                self.np.frombuffer(
+                    column,
+                    dtype=self.np.float64 if column.typecode == "d"
+                    else self.np.int64
+                ) if column else self.np.zeros(0)
+                for column in arrays
+            ]
+        self.columns = dict(zip(columns, arrays))
+
+    def __getattr__(self, column: str) -> Sequence:
+        try:
+            return self.__dict__["columns"][column]
+        except KeyError:
+            raise AttributeError(column) from None
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def revenues(self) -> Sequence[float]:
+        if self.np is not None:
+            return self.quantity * self.unit_price
+        return array("d", map(operator.mul, self.quantity, self.unit_price))
+
+    def order_days(self) -> Sequence[int]:
+        """The day of every order, once per order."""
+        if self.np is not None:
+            _, first = self.np.unique(self.order_id, return_index=True)
+            return self.day[first]
+        return list(dict(zip(self.order_id, self.day)).values())
+
+    def group_sum(
+            self, keys: Sequence, weights: Optional[Sequence] = None
+        ) -> Tuple[list, list]:
+        """
+        Sums weights by key, or counts keys without weights.
+
+        :return: Tuple of (keys, sums), ordered by key.
+        """
+        if self.np is not None:
+            groups, inverse = self.np.unique(keys, return_inverse=True)
+            sums = self.np.bincount(
+                inverse, weights=weights, minlength=len(groups)
+            )
+            return groups.tolist(), sums.tolist()
+        if weights is None:
+            sums = Counter(keys)
+        else:
+            sums = defaultdict(int)
+            for key, weight in zip(keys, weights):
+                sums[key] += weight
+        groups = sorted(sums)
+        return groups, [sums[group] for group in groups]
+
+def _check_admin(admin_user: User) -> None:
+    if admin_user.role != "admin":
+        raise AnalyticsServiceError(
+            "Unauthorized: Only admins can see analytics"
+        )
+
+def _format_day(day: int) -> str:
+    # YYYYMMDD -> YYYY-MM-DD
+    return f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}"
+
+def _parse_day(date: str) -> int:
+    # YYYY-MM-DD -> YYYYMMDD
+    return int(datetime.strptime(date, "%Y-%m-%d").strftime("%Y%m%d"))
+
+def _check_times(*times: Optional[str]) -> None:
+    # They are compared as strings, so garbage would silently match nothing.
+    try:
+        for time in times:
+            if time:
+                datetime.fromisoformat(time)
+    except ValueError:
+        raise AnalyticsServiceError("Times must be ISO timestamps")
+
+def _check_ranking(limit: int, by: str) -> None:
+    if by not in ("revenue", "units"):
+        raise AnalyticsServiceError("by must be 'revenue' or 'units'")
+    if limit <= 0:
+        raise AnalyticsServiceError("limit must be positive")
+
+def _ranked(products: List[dict], limit: int, by: str) -> List[dict]:
+    # Ties go to the lower product id.
+    return heapq.nlargest(
+        limit, products,
+        key=lambda product: (product[by], -product["product_id"])
+    )
+
+def load_order_lines(
+        columns: Sequence[str] = ORDER_LINE_COLUMNS,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        db_path: Optional[str] = None
+    ) -> OrderLines:
+    """Loads the lines of orders created in [since, until) into columns."""
+    _check_times(since, until)
+    batches = get_backend(db_path).orders.line_batches(
+        since, until, columns, BATCH_SIZE
+    )
+
+    return OrderLines(batches, columns)
+
+def get_daily_revenue(
+        admin_user: User,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        db_path: Optional[str] = None
+    ) -> List[dict]:
+    """
+    Orders, units sold and revenue per day. Only admins can see
+    analytics.
+
+    :param admin_user: The user attempting the operation
+    :param since: Only orders created at or after this ISO timestamp
+    :param until: Only orders created before this ISO timestamp
+
+    :return: List of dictionaries with day (YYYY-MM-DD), orders, units
+        and revenue, oldest day first
+    """
+    _check_admin(admin_user)
+    lines = load_order_lines(
+        ("order_id", "day", "quantity", "unit_price"), since, until, db_path
+    )
+    days, units = lines.group_sum(lines.day, lines.quantity)
+    _, revenue = lines.group_sum(lines.day, lines.revenues())
+    # Every day with lines has orders, so the groups line up.
+    _, orders = lines.group_sum(lines.order_days())
+
+    return [
+        {
+            "day": _format_day(day),
+            "orders": int(day_orders),
+            "units": int(day_units),
+            "revenue": round(day_revenue, 2)
+        } for day, day_orders, day_units, day_revenue in zip(
+            days, orders, units, revenue
+        )
+    ]
+
+def get_top_products(
+        admin_user: User,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 10,
+        by: str = "revenue",
+        db_path: Optional[str] = None
+    ) -> List[dict]:
+    """
+    The best-selling products. Only admins can see analytics.
+
+    :param admin_user: The user attempting the operation
+    :param since: Only orders created at or after this ISO timestamp
+    :param until: Only orders created before this ISO timestamp
+    :param limit: Number of products
+    :param by: Rank by 'revenue' or 'units'
+
+    :return: List of dictionaries with product_id, units and revenue,
+        best first
+    """
+    _check_admin(admin_user)
+    _check_ranking(limit, by)
+    lines = load_order_lines(
+        ("product_id", "quantity", "unit_price"), since, until, db_path
+    )
+    product_ids, units = lines.group_sum(lines.product_id, lines.quantity)
+    _, revenue = lines.group_sum(lines.product_id, lines.revenues())
+    products = [
+        {
+            "product_id": product_id,
+            "units": int(product_units),
+            "revenue": round(product_revenue, 2)
+        } for product_id, product_units, product_revenue in zip(
+            product_ids, units, revenue
+        )
+    ]
+
+    return _ranked(products, limit, by)
+
+def get_basket_sizes(
+        admin_user: User,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        db_path: Optional[str] = None
+    ) -> List[dict]:
+    """
+    Distribution of basket sizes, the units in an order. Only admins can
+    see analytics.
+
+    :param admin_user: The user attempting the operation
+    :param since: Only orders created at or after this ISO timestamp
+    :param until: Only orders created before this ISO timestamp
+
+    :return: List of dictionaries with size and orders, smallest first
+    """
+    _check_admin(admin_user)
+    lines = load_order_lines(("order_id", "quantity"), since, until, db_path)
+    _, sizes = lines.group_sum(lines.order_id, lines.quantity)
+    sizes, orders = lines.group_sum(sizes)
+
+    return [
+        {"size": int(size), "orders": int(count)}
+        for size, count in zip(sizes, orders)
+    ]
+
+def get_product_sales(
+        admin_user: User,
+        limit: int = 10,
+        by: str = "revenue",
+        db_path: Optional[str] = None
+    ) -> List[dict]:
+    """
+    The best-selling products of all time, from the sales summary. Only
+    admins can see analytics.
+
+    :param admin_user: The user attempting the operation
+    :param limit: Number of products
+    :param by: Rank by 'revenue' or 'units'
+
+    :return: List of dictionaries with product_id, units and revenue,
+        best first
+    """
+    _check_admin(admin_user)
+    _check_ranking(limit, by)
+    sales = get_backend(db_path).orders.product_sales()
+
+    return _ranked([
+        {
+            "product_id": product_id,
+            "units": units,
+            "revenue": round(revenue, 2)
+        } for product_id, (units, revenue) in sales.items()
+    ], limit, by)
+
+def get_daily_sales(
+        admin_user: User,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        db_path: Optional[str] = None
+    ) -> List[dict]:
+    """
+    Orders and revenue per day, from the sales summary. Only admins can
+    see analytics.
+
+    :param admin_user: The user attempting the operation
+    :param since: Only days on or after this date (YYYY-MM-DD)
+    :param until: Only days before this date (YYYY-MM-DD)
+
+    :return: List of dictionaries with day (YYYY-MM-DD), orders and
+        revenue, oldest day first
+    """
+    _check_admin(admin_user)
+    try:
+        first = _parse_day(since) if since else None
+        end = _parse_day(until) if until else None
+    except ValueError:
+        raise AnalyticsServiceError("Days must be YYYY-MM-DD dates")
+    sales = get_backend(db_path).orders.daily_sales()
+
+    return [
+        {
+            "day": _format_day(day),
+            "orders": sales[day][0],
+            "revenue": round(sales[day][1], 2)
+        } for day in sorted(sales)
+        if (first is None or day >= first) and (end is None or day < end)
+    ]
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+from db.repository import StorageError, get_backend
+from src.models import Backup, User
+
+class BackupServiceError(Exception):
+    pass
+
+# Backups started by this process, by id.
+_backups: Dict[str, Backup] = {}
+_backups_lock = threading.Lock()
+
+def start_backup(
+        admin_user: User,
+        backup_dir: str,
+        compress: bool = True,
+        db_path: Optional[str] = None
+    ) -> Backup:
+    """
+    Starts an online backup of the database (and its shards) in the
+    background. Only admins can start backups.
+
+    The copy runs in small steps from a consistent snapshot, so requests
+    keep being served while it runs; poll get_backup for progress.
+
+    :param admin_user: The user attempting the operation
+    :param backup_dir: Directory the backup files are written to
+    :param compress: Write gzip files
+
+    :return: The Backup, in the 'running' status
+    """
+    if admin_user.role != "admin":
+        raise BackupServiceError("Unauthorized: Only admins can back up")
+
+    backend = get_backend(db_path)
+    os.makedirs(backup_dir, exist_ok=True)
+    backup = Backup(
+        id=f"{time.strftime('%Y%m%dT%H%M%S')}-{os.urandom(4).hex()}",
+        status="running"
+    )
+    with _backups_lock:
+        _backups[backup.id] = backup
+
+    def _progress(path: str, copied: int, total: int) -> None:
+        backup.files[path] = {"copied": copied, "total": total}
+
+    def _run() -> None:
+        try:
+            backend.backup(backup_dir, backup.id, compress, _progress)
+        except (StorageError, OSError) as e:
+            backup.error = str(e)
+            backup.status = "failed"
+        else:
+            backup.status = "done"
+
+    threading.Thread(
+        target=_run, name=f"backup-{backup.id}", daemon=True
+    ).start()
+
+    return backup
+
+def get_backup(admin_user: User, backup_id: str) -> Optional[Backup]:
+    """
+    Looks up a backup started by this process. Only admins can see
+    backups.
+
+    :return: The Backup, or None if it doesn't exist
+    """
+    if admin_user.role != "admin":
+        raise BackupServiceError("Unauthorized: Only admins can see backups")
+
+    return _backups.get(backup_id)
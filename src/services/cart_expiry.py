@@ -0,0 +1,137 @@
+"""
+Expiry of abandoned carts.
+
+A cart that hasn't changed for ttl_seconds is deleted, and so is an
+empty one after empty_ttl_seconds (write-behind mode creates cart rows
+empty, and a crash before the flush leaves them so). The sweep
+deletes batch_size carts per transaction, so the writer is never held
+for long, and then releases the freed pages with an incremental vacuum
+(see db.compaction), so the database file shrinks instead of keeping
+the space on its free list.
+
+With write-behind, every batch is deleted with the buffer paused.
+Buffered changes haven't touched updated_at yet, so they are flushed
+first; otherwise a cart the user just changed could look abandoned.
+Adds then wait until the batch is deleted, so none is acknowledged
+against a cart being deleted and then lost.
+
+A sweep can also delete the cart of a user who comes back after the
+TTL; their next add simply starts a new cart.
+"""
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, Optional
+from db.compaction import DEFAULT_MAX_PAGES
+from db.repository import get_backend, utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_EMPTY_TTL_SECONDS = 3600
+DEFAULT_INTERVAL_SECONDS = 300
+DEFAULT_BATCH_SIZE = 500
+
+def sweep(
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        empty_ttl_seconds: float = DEFAULT_EMPTY_TTL_SECONDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_pages: int = DEFAULT_MAX_PAGES,
+        now: Optional[float] = None,
+        db_path: Optional[str] = None,
+        pause: Optional[Callable[[], ContextManager[object]]] = None
+    ) -> Dict[str, int]:
+    """
+    Deletes the expired carts of a database and releases their space.
+
+    :param ttl_seconds: Age since the last change after which a cart
+        expires
+    :param empty_ttl_seconds: The same for empty carts
+    :param batch_size: Carts deleted per transaction
+    :param max_pages: Most pages released per database
+    :param now: Time of the sweep, as a Unix timestamp; now by default
+    :param pause: Returns a context manager that writes the buffered
+        cart changes and holds off new ones; every batch is deleted in
+        one
+
+    :return: Dictionary with the carts deleted and the pages released
+    """
+    now = time.time() if now is None else now
+    idle_before = utc_timestamp(now - ttl_seconds)
+    empty_before = utc_timestamp(now - empty_ttl_seconds)
+    backend = get_backend(db_path)
+    carts = 0
+    while True:
+        with pause() if pause is not None else nullcontext():
+            deleted = backend.carts.delete_expired(
+                idle_before, empty_before, batch_size
+            )
+        if deleted == 0:
+            break
+        carts += deleted
+
+    return {
+        "carts": carts,
+        "pages": backend.compact(max_pages) if carts else 0
+    }
+
+class CartSweeper:
+    """Runs sweep() in the background every interval_seconds."""
+    def __init__(
+            self,
+            db_path: Optional[str] = None,
+            interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+            ttl_seconds: float = DEFAULT_TTL_SECONDS,
+            empty_ttl_seconds: float = DEFAULT_EMPTY_TTL_SECONDS,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            pause: Optional[Callable[[], ContextManager[object]]] = None
+        ) -> None:
+        self.db_path = db_path
+        self.pause = pause
+        self.interval = interval_seconds
+        self.ttl_seconds = ttl_seconds
+        self.empty_ttl_seconds = empty_ttl_seconds
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sweeps = 0
+        self.carts_deleted = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cart-sweeper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stop.set()
+        thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                result = sweep(
+                    self.ttl_seconds,
+                    self.empty_ttl_seconds,
+                    self.batch_size,
+                    db_path=self.db_path,
+                    pause=self.pause
+                )
+            except Exception:
+                logger.exception("Cart expiry sweep failed")
+                continue
+            self.sweeps += 1
+            self.carts_deleted += result["carts"]
+            if result["carts"]:
+                logger.info(
+                    "Expired %d carts, released %d pages",
+                    result["carts"], result["pages"]
+                )
@@ -1,13 +1,102 @@
-import json
-from typing import Optional
+from contextlib import nullcontext
+from typing import ContextManager, Dict, Optional
 from datetime import datetime
-from db.database import get_db_connection
+from db.database import default_db_path
+from db.repository import InsufficientStock, StorageError, get_backend
 from src.models import Cart, Order, User
-from src.services.product_service import get_product_by_id
+from src.services.cart_expiry import CartSweeper
+from src.services.cart_write_behind import CartWriteBehind
 
 class CartServiceError(Exception):
     pass
 
+class InsufficientStockError(CartServiceError):
+    def __init__(self, failures: list[dict]) -> None:
+        self.failures = failures
+        product_ids = ", ".join(str(f["product_id"]) for f in failures)
+        super().__init__(f"Insufficient stock for products: {product_ids}")
+
+# Write-behind buffers, keyed by database path.
+_write_behind: Dict[str, CartWriteBehind] = {}
+
+def enable_write_behind(
+        interval_ms: int = 50,
+        db_path: Optional[str] = None
+    ) -> CartWriteBehind:
+    """
+    Enables write-behind mode for cart adds on a database.
+
+    See src.services.cart_write_behind for the crash-safety semantics.
+
+    :param interval_ms: How often pending carts are flushed.
+    :param db_path: Optional database path.
+
+    :return: The running CartWriteBehind buffer.
+    """
+    key = db_path or default_db_path()
+    write_behind = _write_behind.get(key)
+    if write_behind is None:
+        write_behind = CartWriteBehind(db_path, interval_ms)
+        _write_behind[key] = write_behind
+    write_behind.start()
+
+    return write_behind
+
+def disable_write_behind(
+        db_path: Optional[str] = None, flush: bool = True
+    ) -> None:
+    """
+    Disables write-behind mode, flushing pending carts by default.
+    """
+    write_behind = _write_behind.pop(db_path or default_db_path(), None)
+    if write_behind is not None:
+        write_behind.stop(flush=flush)
+
+# Expiry sweepers, keyed by database path.
+_sweepers: Dict[str, CartSweeper] = {}
+
+def enable_cart_expiry(
+        interval_seconds: float,
+        ttl_seconds: float,
+        empty_ttl_seconds: float,
+        db_path: Optional[str] = None
+    ) -> CartSweeper:
+    """
+    Starts deleting abandoned carts of a database in the background.
+
+    See src.services.cart_expiry for what expires.
+
+    :param interval_seconds: How often expired carts are swept.
+    :param ttl_seconds: Age since the last change after which a cart
+        expires.
+    :param empty_ttl_seconds: The same for empty carts.
+
+    :return: The running CartSweeper.
+    """
+    disable_cart_expiry(db_path)
+    sweeper = CartSweeper(
+        db_path, interval_seconds, ttl_seconds, empty_ttl_seconds,
+        pause=lambda: _pause_write_behind(db_path)
+    )
+    _sweepers[db_path or default_db_path()] = sweeper
+    sweeper.start()
+
+    return sweeper
+
+def disable_cart_expiry(db_path: Optional[str] = None) -> None:
+    sweeper = _sweepers.pop(db_path or default_db_path(), None)
+    if sweeper is not None:
+        sweeper.stop()
+
+def _get_write_behind(db_path: Optional[str]) -> Optional[CartWriteBehind]:
+    if not _write_behind:
+        return None
+    return _write_behind.get(db_path or default_db_path())
+
+def _pause_write_behind(db_path: Optional[str]) -> ContextManager[object]:
+    write_behind = _get_write_behind(db_path)
+    return write_behind.paused() if write_behind is not None else nullcontext()
+
 def add_to_cart(
     user: User,
     products: list[tuple[int, int]],
@@ -17,61 +106,118 @@ def add_to_cart(
     Adds products to the user's shopping cart.
     
     This function checks if a cart already exists for the user.
-    - If so, it loads the existing items (stored as JSON) and updates the quantities.
+    - If so, it loads the existing items and updates the quantities.
     - If not, it creates a new cart record for the user.
-    
+
+    When write-behind mode is enabled, the new quantities are only
+    applied in memory and written by the background flusher.
+
     :param user: The user adding products to the cart.
     :param products: A list of tuples where each tuple is (product_id, product_quantity).
-    :param db_path: Optional path to the SQLite database.
+    :param db_path: Optional database path.
     :return: A Cart object with a cart_id and an items dictionary mapping product_id (as string) to product_quantity.
+    :raises ValueError: A quantity isn't a positive integer.
     """
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if the user already has a cart.
-    cursor.execute(
-        "SELECT id, items FROM carts WHERE user_id = ?",
-        (user.id,)
-    )
-    row = cursor.fetchone()
-    if row:
-        cart_id = row["id"]
-        existing_items = json.loads(row["items"]) if row["items"] else {}
-    else:
-        # Create a new cart with an empty items dictionary.
-        empty_items_json = json.dumps({})
-        cursor.execute(
-            "INSERT INTO carts (user_id, items) VALUES (?, ?)",
-            (user.id, empty_items_json)
+    for product_id, quantity in products:
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError(f"Invalid quantity for product {product_id}")
+    write_behind = _get_write_behind(db_path)
+    if write_behind is not None:
+        return _add_to_cart_write_behind(
+            write_behind, user, products, db_path
         )
-        cart_id = cursor.lastrowid
-        existing_items = {}
-
-    # Process each product.
-    for product_id, product_quantity in products:
-        # Verify that the product exists.
-        product = get_product_by_id(product_id, db_path)
-        if not product:
-            conn.close()
-            raise CartServiceError(f"Product with id {product_id} not found")
-        
-        # Convert product_id to a string to ensure consistent key types.
-        key = str(product_id)
-        if key in existing_items:
-            existing_items[key] += product_quantity
-        else:
-            existing_items[key] = product_quantity
 
-    # Update the cart row with the new items JSON.
-    new_items_json = json.dumps(existing_items)
-    cursor.execute(
-        "UPDATE carts SET items = ? WHERE id = ? AND user_id = ?",
-        (new_items_json, cart_id, user.id)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        return get_backend(db_path).carts.add_items(user.id, products)
+    except StorageError as e:
+        raise CartServiceError(str(e))
+
+def update_cart(
+        user: User,
+        set_items: Optional[list[tuple[int, int]]] = None,
+        remove: Optional[list[int]] = None,
+        replace: Optional[list[tuple[int, int]]] = None,
+        db_path: Optional[str] = None
+    ) -> Cart:
+    """
+    Changes the user's cart in one transaction, creating it if needed.
+
+    replace empties the cart and fills it with its lines; set then sets
+    exact quantities and remove deletes lines. A quantity of 0 deletes
+    the line. If a product doesn't exist, nothing changes.
+
+    :param user: The user whose cart is changed.
+    :param set_items: (product_id, product_quantity) tuples to set.
+    :param remove: Product ids to remove.
+    :param replace: (product_id, product_quantity) tuples making up the
+        new cart.
+    :param db_path: Optional database path.
+
+    :return: The updated Cart object.
+    """
+    if set_items is None and remove is None and replace is None:
+        raise CartServiceError("Nothing to change")
+    lines = [
+        *(replace or []),
+        *(set_items or []),
+        *((product_id, 0) for product_id in remove or [])
+    ]
+    for product_id, quantity in lines:
+        if not isinstance(quantity, int) or quantity < 0:
+            raise CartServiceError(
+                f"Invalid quantity for product {product_id}"
+            )
+    if len({product_id for product_id, _ in lines}) < len(lines):
+        raise CartServiceError("A product can only be changed once")
+
+    write_behind = _get_write_behind(db_path)
+    if write_behind is None:
+        return _set_cart_items(user, lines, replace is not None, db_path)
+    # Pending adds are applied first, and the buffered copy would
+    # overwrite the change when flushed. Adds wait until it's discarded.
+    with write_behind.user_lock(user.id):
+        write_behind.flush([user.id])
+        cart = _set_cart_items(user, lines, replace is not None, db_path)
+        write_behind.discard(user.id)
+
+    return cart
+
+def _set_cart_items(
+        user: User,
+        lines: list[tuple[int, int]],
+        replace: bool,
+        db_path: Optional[str]
+    ) -> Cart:
+    try:
+        return get_backend(db_path).carts.set_items(
+            user.id, lines, replace=replace
+        )
+    except StorageError as e:
+        raise CartServiceError(str(e))
+
+def _add_to_cart_write_behind(
+        write_behind: CartWriteBehind,
+        user: User,
+        products: list[tuple[int, int]],
+        db_path: Optional[str] = None
+    ) -> Cart:
+    backend = get_backend(db_path)
+    # Validate every product before touching the buffered cart.
+    missing = backend.products.find_missing(pid for pid, _ in products)
+    if missing:
+        raise CartServiceError(f"Product with id {missing[0]} not found")
 
-    return Cart(id=cart_id, user_id=user.id, items=existing_items)
+    with write_behind.user_lock(user.id):
+        pending = write_behind.get(user.id)
+        if pending is not None:
+            cart_id, base_items = pending.cart_id, pending.items
+        else:
+            # The cart row is created synchronously so its id is durable.
+            cart = backend.carts.get_or_create(user.id)
+            cart_id, base_items = cart.id, cart.items
+        pending = write_behind.apply(user.id, cart_id, base_items, products)
+
+    return Cart(id=pending.cart_id, user_id=user.id, items=pending.items)
 
 def view_cart(
         cart: Cart, user: User, db_path: Optional[str] = None
@@ -85,20 +231,52 @@ def view_cart(
 
     :return: List of dictionaries with 'product_id' and 'product_quantity'
     """
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT items FROM carts WHERE user_id = ? AND id = ?",
-        (user.id, cart.id)
+    write_behind = _get_write_behind(db_path)
+    pending = write_behind.get(user.id) if write_behind else None
+    if pending is not None and pending.cart_id == cart.id:
+        # Serve the user's own unflushed changes.
+        items_dict = pending.items
+    else:
+        stored = get_backend(db_path).carts.get(user.id, cart.id)
+        if stored is None:
+            return []
+        items_dict = stored.items
+
+    return _items_to_list(items_dict)
+
+def view_cart_with_products(
+        cart: Cart, user: User, db_path: Optional[str] = None
+    ) -> dict:
+    """
+    Retrieves the user's cart priced against the catalog.
+
+    Names, unit prices, line totals and the cart total are computed by
+    the storage backend in one query (a single JOIN on SQLite), so
+    clients don't need one product lookup per line.
+    Lines whose product no longer exists have null prices and are left
+    out of the total.
+
+    :param cart: Cart object (with attribute cart_id) to identify the cart row.
+    :param user: The user whose cart is being viewed.
+    :param db_path: Optional database path.
+
+    :return: Dictionary with 'cart_id', 'items' and 'total'.
+    """
+    write_behind = _get_write_behind(db_path)
+    pending = write_behind.get(user.id) if write_behind else None
+    # Price the user's own unflushed changes, if any.
+    items = (
+        pending.items
+        if pending is not None and pending.cart_id == cart.id
+        else None
     )
-    row = cursor.fetchone()
-    conn.close()
-    
-    if not row:
-        return []
-    # The items column contains a JSON string, e.g., '{"101": 3, "102": 1}'
-    items_dict = json.loads(row["items"])
+    lines, total = get_backend(db_path).carts.get_priced(
+        user.id, cart.id, items
+    )
+
+    return {"cart_id": cart.id, "items": lines, "total": total}
 
+def _items_to_list(items_dict: Dict[str, int]) -> list[dict]:
     return [
         {
             "product_id": int(pid),
@@ -116,14 +294,10 @@ def clean_cart(
 
     :param user: The user owner of the cart
     """
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "DELETE FROM carts WHERE user_id = ? AND id = ?",
-        (user.id, cart.id)
-    )
-    conn.commit()
-    conn.close()
+    write_behind = _get_write_behind(db_path)
+    if write_behind is not None:
+        write_behind.discard(user.id)
+    get_backend(db_path).carts.delete(user.id, cart.id)
 
 def place_order(
         cart: Cart,
@@ -133,35 +307,35 @@ def place_order(
     """
     Places an order based on the user's current cart. The order record will include the cart's products as a JSON string.
 
+    Stock is reserved atomically with the order insert. If any item is
+    short, nothing is written and InsufficientStockError lists every
+    failing item.
+
     :param user: The user placing the order.
     :param db_path: Optional database path.
 
     :return: Order object with associated serialized products.
     """
-    # Retrieve the cart items (expected to be a list of dictionaries with product_id and product_quantity)
-    cart_items = view_cart(cart, user, db_path)
-    if not cart_items:
-        raise CartServiceError("Cart is empty")
-    # Serialize the cart items into a JSON string.
-    products_json = json.dumps(cart_items)
-
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    created_at = datetime.now().isoformat()
-    # Insert the order record, including the products JSON.
-    cursor.execute(
-        "INSERT INTO orders (user_id, created_at, products) VALUES (?, ?, ?)",
-        (user.id, created_at, products_json)
-    )
-    order_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    # Clear the user's cart after placing the order.
-    clean_cart(cart, user, db_path)
-
-    return Order(
-        id=order_id,
-        user_id=user.id,
-        created_at=created_at,
-        products=products_json
-    )
+    write_behind = _get_write_behind(db_path)
+    if write_behind is None:
+        return _place_order(cart, user, db_path)
+    # The order must contain every acknowledged cart change, and adds
+    # wait until the ordered cart is discarded.
+    with write_behind.user_lock(user.id):
+        write_behind.flush([user.id])
+        order = _place_order(cart, user, db_path)
+        write_behind.discard(user.id)
+
+    return order
+
+def _place_order(
+        cart: Cart, user: User, db_path: Optional[str]
+    ) -> Order:
+    try:
+        return get_backend(db_path).orders.place(
+            user.id, cart.id, datetime.now().isoformat()
+        )
+    except InsufficientStock as e:
+        raise InsufficientStockError(e.failures)
+    except StorageError as e:
+        raise CartServiceError(str(e))
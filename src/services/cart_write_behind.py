@@ -0,0 +1,220 @@
+"""
+Write-behind buffer for cart mutations.
+
+Cart adds are applied to an in-memory copy of the user's cart and
+acknowledged straight away. A background thread coalesces the pending
+carts and writes them in one transaction every ``interval_ms``.
+
+Crash-safety semantics:
+- Only the cart *contents* are buffered. A cart row is always created
+  synchronously, so cart ids handed out to clients are durable.
+- Acknowledged cart changes that were not flushed yet are lost if the
+  process crashes. The loss window is bounded by ``interval_ms`` plus
+  the duration of one flush. A lost change leaves the cart as it was at
+  the last flush; it is never half applied.
+- ``place_order`` flushes the user's cart before reading it, so an order
+  always contains every acknowledged change. Orders themselves are
+  never buffered.
+- Writes that flush a user's cart, change it in the database and then
+  discard the buffered copy hold the user's lock (``user_lock``), as
+  adds do. An add acknowledged meanwhile can't be discarded unwritten.
+- The expiry sweep deletes carts while ``paused()``: every pending
+  cart is flushed, and no add is buffered until the batch is deleted,
+  so none is buffered against a cart deleted under it.
+- ``stop()`` flushes everything by default and is registered with
+  ``atexit``, so a clean shutdown loses nothing.
+- A failed flush keeps the carts pending and retries on the next tick.
+- Flushes only update existing rows. A cart deleted by ``clean_cart`` or
+  ``place_order`` is never brought back by a stale pending copy.
+"""
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from db.repository import get_backend
+from src.models import Cart
+
+logger = logging.getLogger(__name__)
+
+# Locks shared by all users, keyed by user id modulo their number
+USER_LOCKS = 64
+
+@dataclass
+class PendingCart:
+    cart_id: int
+    items: Dict[str, int] = field(default_factory=dict)
+    version: int = 0
+
+class CartWriteBehind:
+    def __init__(
+            self,
+            db_path: Optional[str] = None,
+            interval_ms: int = 50
+        ) -> None:
+        self.db_path = db_path
+        self.interval = interval_ms / 1000.0
+        self._lock = threading.Lock()
+        # Serializes flushes so an older snapshot never overwrites a
+        # newer one.
+        self._flush_lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(USER_LOCKS)]
+        self._pending: Dict[int, PendingCart] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cart-write-behind", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, flush: bool = True) -> None:
+        """
+        Stops the background thread.
+
+        :param flush: Write pending carts before returning. Passing False
+            drops them, which is what a crash looks like.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stop.set()
+        thread.join()
+        atexit.unregister(self.stop)
+        if flush:
+            self.flush()
+        else:
+            with self._lock:
+                self._pending.clear()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Cart write-behind flush failed")
+
+    def user_lock(self, user_id: int) -> threading.Lock:
+        """
+        Serializes the changes of a user's cart: adds, and writes that
+        flush the cart, change it in the database and discard it.
+        """
+        return self._user_locks[user_id % USER_LOCKS]
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """
+        Flushes every pending cart and holds every user's lock until the
+        block exits, so no add is buffered meanwhile.
+        """
+        # Always taken in the same order; other holders take only one.
+        for lock in self._user_locks:
+            lock.acquire()
+        try:
+            self.flush()
+            yield
+        finally:
+            for lock in reversed(self._user_locks):
+                lock.release()
+
+    def get(self, user_id: int) -> Optional[PendingCart]:
+        """Returns a copy of the user's pending cart, if any."""
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                return None
+            return PendingCart(
+                pending.cart_id, dict(pending.items), pending.version
+            )
+
+    def apply(
+            self,
+            user_id: int,
+            cart_id: int,
+            base_items: Dict[str, int],
+            products: Iterable[Tuple[int, int]]
+        ) -> PendingCart:
+        """
+        Adds product quantities to the user's pending cart.
+
+        :param user_id: Owner of the cart.
+        :param cart_id: Id of the (already persisted) cart row.
+        :param base_items: Items currently stored, used when the cart is
+            not pending yet.
+        :param products: (product_id, product_quantity) tuples to add.
+
+        :return: A copy of the updated pending cart.
+        """
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None or pending.cart_id != cart_id:
+                pending = PendingCart(cart_id, dict(base_items))
+                self._pending[user_id] = pending
+            for product_id, product_quantity in products:
+                key = str(product_id)
+                pending.items[key] = (
+                    pending.items.get(key, 0) + product_quantity
+                )
+            pending.version += 1
+            return PendingCart(
+                pending.cart_id, dict(pending.items), pending.version
+            )
+
+    def discard(self, user_id: int) -> None:
+        """Drops the user's pending cart without writing it."""
+        with self._lock:
+            self._pending.pop(user_id, None)
+
+    def flush(self, user_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Writes pending carts in one batch.
+
+        :param user_ids: Only flush these users; all users when None.
+
+        :return: Number of carts written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if user_ids is None:
+                    selected = list(self._pending.items())
+                else:
+                    selected = [
+                        (user_id, self._pending[user_id])
+                        for user_id in user_ids
+                        if user_id in self._pending
+                    ]
+                snapshot = [
+                    (user_id, p.cart_id, dict(p.items), p.version)
+                    for user_id, p in selected
+                ]
+            if not snapshot:
+                return 0
+
+            get_backend(self.db_path).carts.save_items(
+                Cart(id=cart_id, user_id=user_id, items=items)
+                for user_id, cart_id, items, _ in snapshot
+            )
+
+            with self._lock:
+                # Carts changed while we were writing stay pending.
+                for user_id, cart_id, _, version in snapshot:
+                    pending = self._pending.get(user_id)
+                    if (
+                        pending is not None
+                        and pending.cart_id == cart_id
+                        and pending.version == version
+                    ):
+                        del self._pending[user_id]
+            self.flushes += 1
+            self.rows_written += len(snapshot)
+
+            return len(snapshot)
@@ -0,0 +1,67 @@
+import time
+from typing import Optional
+from db.repository import get_backend
+from src.models import IdempotencyRecord
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+class IdempotencyServiceError(Exception):
+    pass
+
+def begin_request(
+        key: str,
+        scope: str,
+        fingerprint: str,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        db_path: Optional[str] = None
+    ) -> Optional[IdempotencyRecord]:
+    """
+    Reserves an idempotency key before the request is processed.
+
+    An expired record for the same key is replaced.
+
+    :param key: Client supplied Idempotency-Key.
+    :param scope: Namespace of the key, e.g. the request path.
+    :param fingerprint: Hash of the request payload.
+    :param ttl_seconds: How long the key and its response are kept.
+
+    :return: None if the key was reserved and the request should run,
+        otherwise the existing record (in progress or completed).
+    """
+    return get_backend(db_path).idempotency.begin(
+        key, scope, fingerprint, time.time(), ttl_seconds
+    )
+
+def complete_request(
+        key: str,
+        scope: str,
+        status_code: int,
+        response_body: bytes,
+        db_path: Optional[str] = None
+    ) -> None:
+    """
+    Stores the response of a reserved request so retries can replay it.
+    """
+    completed = get_backend(db_path).idempotency.complete(
+        key, scope, status_code, response_body
+    )
+    if not completed:
+        raise IdempotencyServiceError("Idempotency key not reserved")
+
+def release_request(
+        key: str,
+        scope: str,
+        db_path: Optional[str] = None
+    ) -> None:
+    """
+    Drops a reservation so that a failed request can be retried.
+    """
+    get_backend(db_path).idempotency.release(key, scope)
+
+def purge_expired(db_path: Optional[str] = None) -> int:
+    """
+    Deletes expired idempotency keys.
+
+    :return: Number of deleted keys.
+    """
+    return get_backend(db_path).idempotency.purge(time.time())
@@ -0,0 +1,62 @@
+from typing import List, Optional
+from db.repository import get_backend
+from src.models import Order, User
+
+class OrderServiceError(Exception):
+    pass
+
+def get_orders(
+        admin_user: User,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        db_path: Optional[str] = None
+    ) -> List[Order]:
+    """
+    Lists the orders of all users. Only admins can list orders.
+
+    On a sharded database, orders are read from every shard in parallel
+    and merged by creation time.
+
+    :param admin_user: The user attempting the operation
+    :param since: Only orders created at or after this ISO timestamp
+    :param until: Only orders created before this ISO timestamp
+
+    :return: List of Order objects, oldest first
+    """
+    if admin_user.role != "admin":
+        raise OrderServiceError("Unauthorized: Only admins can list orders")
+
+    return get_backend(db_path).orders.list(since, until)
+
+def get_orders_report(
+        admin_user: User,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        db_path: Optional[str] = None
+    ) -> dict:
+    """
+    Summarizes orders over a time range. Only admins can see reports.
+
+    Every shard aggregates its own orders in the storage backend and only
+    the totals are merged, so the report never loads the orders
+    themselves.
+
+    :param admin_user: The user attempting the operation
+    :param since: Only orders created at or after this ISO timestamp
+    :param until: Only orders created before this ISO timestamp
+
+    :return: Dictionary with order_count, customer_count, units_sold and
+        the same counts per shard
+    """
+    if admin_user.role != "admin":
+        raise OrderServiceError("Unauthorized: Only admins can see reports")
+
+    per_shard = get_backend(db_path).orders.report(since, until)
+    # A user's orders all live on one shard, so customer counts add up.
+    report = {
+        key: sum(shard[key] for shard in per_shard)
+        for key in ("order_count", "customer_count", "units_sold")
+    }
+    report["per_shard"] = per_shard
+
+    return report
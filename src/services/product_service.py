@@ -1,17 +1,40 @@
-import sqlite3
-from typing import List, Optional
-from db.database import get_db_connection
-from src.models import Product, User
+import threading
+import time
+from typing import List, Optional, Tuple
+from db.repository import NotFoundError, get_backend
+from src.models import CatalogChange, Product, User
+
+# Most changes returned at once, and longest wait for one
+MAX_CHANGES = 1000
+MAX_CHANGES_WAIT = 30.0
+# Most products looked up at once
+MAX_PRODUCT_IDS = 100
+# Waiting consumers are woken by changes made in this process and check
+# the log this often for changes made by other processes.
+CHANGES_POLL_SECONDS = 1.0
+
+# Notified after every catalog change made in this process; the
+# generation counts them, so a change made between reading the log and
+# waiting isn't slept through.
+_catalog_changed = threading.Condition()
+_catalog_generation = 0
 
 class ProductServiceError(Exception):
     pass
 
+def _notify_catalog_changed() -> None:
+    global _catalog_generation
+    with _catalog_changed:
+        _catalog_generation += 1
+        _catalog_changed.notify_all()
+
 def add_product(
         admin_user: User,
         name: str,
         description: str,
         price: float,
-        db_path: Optional[str] = None
+        db_path: Optional[str] = None,
+        stock: Optional[int] = None
     ) -> Product:
     """
     Adds a new product. Only admins can add products.
@@ -20,24 +43,21 @@ def add_product(
     :param name: Product name
     :param description: Product description
     :param price: Product price
+    :param stock: Units in stock, or None to not track inventory
 
     :return: Product object
     """
     if admin_user.role != "admin":
         raise ProductServiceError("Unauthorized: Only admins can add products")
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO products (name, description, price) VALUES (?, ?, ?)",
-        (name, description, price)
-    )
-    conn.commit()
-    product_id = cursor.lastrowid
-    conn.close()
+    if stock is not None and stock < 0:
+        raise ProductServiceError("Stock cannot be negative")
 
-    return Product(
-        id=product_id, name=name, description=description, price=price
+    product = get_backend(db_path).products.add(
+        name, description, price, stock
     )
+    _notify_catalog_changed()
+
+    return product
 
 def edit_product(
         admin_user: User,
@@ -45,13 +65,15 @@ def edit_product(
         name: Optional[str] = None,
         description: Optional[str] = None,
         price: Optional[float] = None,
-        db_path: Optional[str] = None
+        db_path: Optional[str] = None,
+        stock: Optional[int] = None
     ) -> Product:
     """
     Edits an existing product. Only admins can edit products.
 
     :param admin_user: The user attempting the operation
     :param product_id: ID of the product to edit
+    :param stock: New units in stock; None leaves it unchanged
 
     :return: Updated Product object
     """
@@ -59,29 +81,18 @@ def edit_product(
         raise ProductServiceError(
             "Unauthorized: Only admins can edit products"
         )
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    # Fetch current product details
-    cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        raise ProductServiceError("Product not found")
-    new_name = name if name is not None else row["name"]
-    new_description = (
-        description if description is not None else row["description"]
-    )
-    new_price = price if price is not None else row["price"]
-    cursor.execute(
-        "UPDATE products SET name = ?, description = ?, price = ? WHERE id = ?",
-        (new_name, new_description, new_price, product_id)
-    )
-    conn.commit()
-    conn.close()
+    if stock is not None and stock < 0:
+        raise ProductServiceError("Stock cannot be negative")
 
-    return Product(
-        id=product_id, name=new_name, description=new_description, price=new_price
-    )
+    try:
+        product = get_backend(db_path).products.update(
+            product_id, name, description, price, stock
+        )
+    except NotFoundError as e:
+        raise ProductServiceError(str(e))
+    _notify_catalog_changed()
+
+    return product
 
 def delete_product(
         admin_user: User,
@@ -98,45 +109,129 @@ def delete_product(
         raise ProductServiceError(
             "Unauthorized: Only admins can delete products"
         )
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-    if cursor.rowcount == 0:
-        conn.close()
-        raise ProductServiceError("Product not found")
-    conn.commit()
-    conn.close()
+
+    try:
+        get_backend(db_path).products.delete(product_id)
+    except NotFoundError as e:
+        raise ProductServiceError(str(e))
+    _notify_catalog_changed()
 
 def get_product_by_id(
         product_id: int,
         db_path: Optional[str] = None
     ) -> Optional[Product]:
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return Product(
-            id=row["id"],
-            name=row["name"],
-            description=row["description"],
-            price=row["price"]
+    return get_backend(db_path).products.get(product_id)
+
+def get_products_by_ids(
+        product_ids: List[int],
+        db_path: Optional[str] = None
+    ) -> Tuple[List[Product], List[int]]:
+    """
+    Looks up several products in one query.
+
+    :param product_ids: IDs of the products, at most MAX_PRODUCT_IDS;
+        repeated ids are looked up once
+
+    :return: Tuple of (products found, ids not found), both in the
+        order of product_ids
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        raise ProductServiceError("No product ids given")
+    if len(product_ids) > MAX_PRODUCT_IDS:
+        raise ProductServiceError(
+            f"At most {MAX_PRODUCT_IDS} products can be looked up at once"
         )
-    return None
+    found = get_backend(db_path).products.get_many(product_ids)
+
+    return (
+        [found[pid] for pid in product_ids if pid in found],
+        [pid for pid in product_ids if pid not in found]
+    )
 
 def get_all_products(db_path: Optional[str] = None) -> List[Product]:
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM products")
-    rows = cursor.fetchall()
-    conn.close()
-
-    return [
-        Product(
-            id=row["id"],
-            name=row["name"],
-            description=row["description"],
-            price=row["price"]
-        ) for row in rows
-    ]
+    return get_backend(db_path).products.list_all()
+
+def get_catalog_version(db_path: Optional[str] = None) -> int:
+    """
+    Returns the current catalog version.
+
+    The version is bumped in the same transaction as every add, edit or
+    delete, so it can be used as a cache key for the product listing.
+    """
+    return get_backend(db_path).products.catalog_version()
+
+def get_catalog_snapshot(
+        db_path: Optional[str] = None
+    ) -> Tuple[int, List[Product]]:
+    """
+    Reads the catalog version and all products in one read transaction.
+
+    :return: Tuple of (catalog version, list of products).
+    """
+    return get_backend(db_path).products.catalog_snapshot()
+
+def get_catalog_changes(
+        since: int = 0,
+        limit: int = 100,
+        wait: float = 0.0,
+        db_path: Optional[str] = None
+    ) -> List[CatalogChange]:
+    """
+    Reads the catalog changes after a sequence number, so consumers can
+    follow the catalog without re-reading it. Pass the seq of the last
+    change received as the next since; since=0 starts with the whole
+    catalog.
+
+    :param since: Sequence number of the last change already seen
+    :param limit: Most changes returned, up to MAX_CHANGES
+    :param wait: Seconds to wait for a change when there is none yet
+        (long polling), up to MAX_CHANGES_WAIT
+
+    :return: List of CatalogChange objects, oldest first; empty when
+        nothing changed within the wait
+    """
+    if since < 0:
+        raise ProductServiceError("since cannot be negative")
+    if not 0 < limit <= MAX_CHANGES:
+        raise ProductServiceError(
+            f"limit must be between 1 and {MAX_CHANGES}"
+        )
+    if not 0 <= wait <= MAX_CHANGES_WAIT:
+        raise ProductServiceError(
+            f"wait must be between 0 and {MAX_CHANGES_WAIT:g} seconds"
+        )
+    products = get_backend(db_path).products
+    deadline = time.monotonic() + wait
+    while True:
+        generation = _catalog_generation
+        changes = products.changes(since, limit)
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        with _catalog_changed:
+            if generation == _catalog_generation:
+                _catalog_changed.wait(min(remaining, CHANGES_POLL_SECONDS))
+
+def get_related_products(
+        product_id: int,
+        limit: int = 10,
+        db_path: Optional[str] = None
+    ) -> Optional[List[Tuple[Product, int]]]:
+    """
+    The products most often bought together with a product, from the
+    index db.related_products keeps (at most its top_k per product).
+
+    :param product_id: The product to find related products for
+    :param limit: Number of related products
+
+    :return: List of tuples of (product, orders containing both), most
+        frequent first, or None when the product doesn't exist
+    """
+    if limit <= 0:
+        raise ProductServiceError("limit must be positive")
+    products = get_backend(db_path).products
+    if products.get(product_id) is None:
+        return None
+
+    return products.related(product_id, limit)
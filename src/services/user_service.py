@@ -1,12 +1,79 @@
-import sqlite3
 import hashlib
-from typing import Optional
-from db.database import get_db_connection
+from typing import Dict, Optional
+from db.database import default_db_path
+from db.repository import DuplicateError, get_backend
 from src.models import User
+from src.services.username_cache import UsernameCache
 
 class UserServiceError(Exception):
     pass
 
+# Username caches, keyed by database path.
+_username_caches: Dict[str, UsernameCache] = {}
+
+def enable_username_cache(
+        max_entries: int = 10000,
+        negative_ttl_seconds: float = 60.0,
+        db_path: Optional[str] = None
+    ) -> UsernameCache:
+    """
+    Caches username lookups of login and registration on a database.
+
+    See src.services.username_cache for the staleness semantics.
+
+    :param max_entries: Capacity of the positive and negative caches.
+    :param negative_ttl_seconds: How long a missing username is cached.
+    :param db_path: Optional database path.
+
+    :return: The UsernameCache.
+    """
+    key = db_path or default_db_path()
+    cache = _username_caches.get(key)
+    if cache is None:
+        cache = UsernameCache(max_entries, negative_ttl_seconds)
+        _username_caches[key] = cache
+
+    return cache
+
+def disable_username_cache(db_path: Optional[str] = None) -> None:
+    _username_caches.pop(db_path or default_db_path(), None)
+
+def get_username_cache_stats(
+        admin_user: User,
+        db_path: Optional[str] = None
+    ) -> Optional[dict]:
+    """
+    Returns the hit and miss counts, hit rate and sizes of the username
+    cache, or None when it isn't enabled. Only admins can see them.
+    """
+    if admin_user.role != "admin":
+        raise UserServiceError("Unauthorized: Only admins can see stats")
+    cache = _get_username_cache(db_path)
+
+    return cache.stats() if cache is not None else None
+
+def _get_username_cache(db_path: Optional[str]) -> Optional[UsernameCache]:
+    if not _username_caches:
+        return None
+    return _username_caches.get(db_path or default_db_path())
+
+def _get_user_by_username(
+        username: str, db_path: Optional[str]
+    ) -> Optional[User]:
+    cache = _get_username_cache(db_path)
+    if cache is None:
+        return get_backend(db_path).users.get_by_username(username)
+    cached, user = cache.get(username)
+    if cached:
+        return user
+    user = get_backend(db_path).users.get_by_username(username)
+    if user is not None:
+        cache.put(user)
+    else:
+        cache.put_missing(username)
+
+    return user
+
 def hash_password(password: str) -> str:
     """Hashes the password using SHA256."""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -18,28 +85,29 @@ def register_user(
         db_path: Optional[str] = None
     ) -> User:
     """
-    Registers a new user.
+    Registers a new user. With the username cache enabled, a cached
+    username is rejected without a database round trip.
     :param username: Username
     :param password: Plain text password
     :param role: Role of the user (admin or regular)
     
     :return: User object
     """
+    cache = _get_username_cache(db_path)
+    if cache is not None and cache.get(username)[1] is not None:
+        raise UserServiceError("Username already exists")
     hashed = hash_password(password)
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, hashed, role)
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
-        return User(id=user_id, username=username, password=hashed, role=role)
-    except sqlite3.IntegrityError:
+        user = get_backend(db_path).users.add(username, hashed, role)
+    except DuplicateError:
+        if cache is not None:
+            cache.invalidate(username)
         raise UserServiceError("Username already exists")
-    finally:
-        conn.close()
+    if cache is not None:
+        # Also drops the name from the negative cache.
+        cache.put(user)
+
+    return user
 
 def login_user(
         username: str,
@@ -47,24 +115,16 @@ def login_user(
         db_path: Optional[str] = None
     ) -> User:
     """
-    Authenticates a user.
+    Authenticates a user. With the username cache enabled, cached and
+    cached-missing usernames are resolved without a database round trip.
     :param username: Username
     :param password: Plain text password
     :return: User object if authenticated
     """
     hashed = hash_password(password)
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    row = cursor.fetchone()
-    conn.close()
-    if row and row["password"] == hashed:
-        return User(
-            id=row["id"],
-            username=row["username"],
-            password=row["password"],
-            role=row["role"]
-        )
+    user = _get_user_by_username(username, db_path)
+    if user and user.password == hashed:
+        return user
     else:
         raise UserServiceError("Invalid username or password")
 
@@ -72,17 +132,4 @@ def get_user_by_id(
         user_id: int,
         db_path: Optional[str] = None
     ) -> Optional[User]:
-    conn = get_db_connection(db_path) if db_path else get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return User(
-            id=row["id"],
-            username=row["username"],
-            password=row["password"],
-            role=row["role"]
-        )
-
-    return None
+    return get_backend(db_path).users.get_by_id(user_id)
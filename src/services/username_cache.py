@@ -0,0 +1,101 @@
+"""
+Bounded in-memory cache of username lookups for login and registration.
+
+Known users are kept in an LRU of user records (id, role and password
+hash), so logins and duplicate registrations of hot usernames skip the
+database. Usernames that don't exist are kept in a second, TTL-bounded
+LRU, so credential-stuffing and registration floods that retry the same
+unknown names don't reach the database either.
+
+Usernames are never deleted or renamed, so a positive entry can't go
+stale. A negative entry can: registering the name in this process drops
+it immediately, but a registration in another process is only seen when
+the entry expires, which is why negative entries have a TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Optional, Tuple
+from src.models import User
+
+class UsernameCache:
+    def __init__(
+            self,
+            max_entries: int = 10000,
+            negative_ttl_seconds: float = 60.0
+        ) -> None:
+        """
+        :param max_entries: Capacity of each of the positive and negative
+            caches; the least recently used entries are evicted.
+        :param negative_ttl_seconds: How long a username is known not to
+            exist.
+        """
+        self.max_entries = max_entries
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._users: "OrderedDict[str, User]" = OrderedDict()
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Tuple[bool, Optional[User]]:
+        """
+        :return: Tuple of (cached, user). user is None when the username
+            is cached as missing; nothing is known unless cached is True.
+        """
+        with self._lock:
+            user = self._users.get(username)
+            if user is not None:
+                self._users.move_to_end(username)
+                self.hits += 1
+                return True, replace(user)
+            expires_at = self._missing.get(username)
+            if expires_at is not None:
+                if expires_at > time.monotonic():
+                    self._missing.move_to_end(username)
+                    self.negative_hits += 1
+                    return True, None
+                del self._missing[username]
+            self.misses += 1
+            return False, None
+
+    def put(self, user: User) -> None:
+        with self._lock:
+            self._missing.pop(user.username, None)
+            self._users[user.username] = replace(user)
+            self._users.move_to_end(user.username)
+            if len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+
+    def put_missing(self, username: str) -> None:
+        with self._lock:
+            if username in self._users:
+                return
+            self._missing[username] = (
+                time.monotonic() + self.negative_ttl_seconds
+            )
+            self._missing.move_to_end(username)
+            if len(self._missing) > self.max_entries:
+                self._missing.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._users.pop(username, None)
+            self._missing.pop(username, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    (self.hits + self.negative_hits) / lookups
+                    if lookups else 0.0
+                ),
+                "entries": len(self._users),
+                "negative_entries": len(self._missing)
+            }
@@ -0,0 +1,94 @@
+import json
+import unittest
+import uuid
+from src import create_app
+from src.services.user_service import login_user
+from db.database import close_connections, memory_db_uri
+
+class AnalyticsIntegrationTests(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database, so tests can run in parallel.
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path})
+        self.client = self.app.test_client()
+
+        self.client.post('/users/register', json={
+            "username": "adminUser", "password": "adminpass", "role": "admin"
+        })
+        self.client.post('/users/register', json={
+            "username": "regularUser", "password": "userpass", "role": "regular"
+        })
+        self.admin = login_user("adminUser", "adminpass", db_path=self.db_path)
+        self.user = login_user("regularUser", "userpass", db_path=self.db_path)
+        resp = self.client.post('/products/add', json={
+            "user_id": self.admin.id,
+            "name": "Mouse",
+            "description": "Wireless mouse",
+            "price": 20.0
+        })
+        self.product_id = json.loads(resp.data)["id"]
+        resp = self.client.post('/cart/add', json={
+            "user_id": self.user.id,
+            "items": [{"product_id": self.product_id, "product_quantity": 3}]
+        })
+        cart_id = json.loads(resp.data)["cart_id"]
+        resp = self.client.post('/cart/order', json={
+            "user_id": self.user.id, "cart_id": cart_id
+        })
+        self.assertEqual(resp.status_code, 201)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+
+    def get(self, path, user_id, **params):
+        return self.client.get(
+            path, query_string={"user_id": user_id, **params}
+        )
+
+    def test_admin_only(self):
+        for path in (
+            '/analytics/daily-revenue', '/analytics/top-products',
+            '/analytics/basket-sizes', '/analytics/product-sales',
+            '/analytics/daily-sales'
+        ):
+            resp = self.get(path, self.user.id)
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn("Unauthorized", json.loads(resp.data)["error"])
+            self.assertEqual(self.get(path, self.admin.id).status_code, 200)
+        resp = self.client.get('/analytics/daily-revenue')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_date_filters(self):
+        resp = self.get(
+            '/analytics/daily-revenue', self.admin.id, since="2000-01-01"
+        )
+        days = json.loads(resp.data)
+        self.assertEqual(len(days), 1)
+        self.assertEqual(days[0]["units"], 3)
+        self.assertEqual(days[0]["revenue"], 60.0)
+        resp = self.get(
+            '/analytics/top-products', self.admin.id,
+            until="2000-01-01T00:00:00"
+        )
+        self.assertEqual(json.loads(resp.data), [])
+        resp = self.get(
+            '/analytics/basket-sizes', self.admin.id, since="2000-01-01"
+        )
+        self.assertEqual(json.loads(resp.data), [{"size": 3, "orders": 1}])
+        resp = self.get(
+            '/analytics/daily-sales', self.admin.id, until="2000-01-01"
+        )
+        self.assertEqual(json.loads(resp.data), [])
+
+    def test_bad_dates(self):
+        for path in (
+            '/analytics/daily-revenue', '/analytics/top-products',
+            '/analytics/basket-sizes', '/analytics/daily-sales'
+        ):
+            for param in ("since", "until"):
+                resp = self.get(path, self.admin.id, **{param: "garbage"})
+                self.assertEqual(resp.status_code, 400, (path, param))
+                self.assertIn("error", json.loads(resp.data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from src import create_app
+from src.services.user_service import login_user
+from db.database import close_connections
+
+class BackupIntegrationTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.dir, "live.db")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        self.app = create_app({
+            "TESTING": True,
+            "DATABASE": self.db_path,
+            "BACKUP_DIR": self.backup_dir
+        })
+        self.client = self.app.test_client()
+
+        self.client.post('/users/register', json={
+            "username": "adminUser", "password": "adminpass", "role": "admin"
+        })
+        self.client.post('/users/register', json={
+            "username": "regularUser", "password": "userpass", "role": "regular"
+        })
+        self.admin = login_user("adminUser", "adminpass", db_path=self.db_path)
+        self.user = login_user("regularUser", "userpass", db_path=self.db_path)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        shutil.rmtree(self.dir)
+
+    def get_backup(self, backup_id, user_id):
+        return self.client.get(
+            f'/backups/{backup_id}', query_string={"user_id": user_id}
+        )
+
+    def wait(self, backup_id):
+        deadline = time.monotonic() + 10
+        while True:
+            resp = self.get_backup(backup_id, self.admin.id)
+            self.assertEqual(resp.status_code, 200)
+            backup = json.loads(resp.data)
+            if backup["status"] != "running" or time.monotonic() > deadline:
+                return backup
+            time.sleep(0.01)
+
+    def test_admin_backs_up(self):
+        resp = self.client.post('/backups', json={
+            "user_id": self.admin.id, "compress": False
+        })
+        self.assertEqual(resp.status_code, 202)
+        backup = self.wait(json.loads(resp.data)["backup_id"])
+        self.assertEqual(backup["status"], "done")
+        self.assertIsNone(backup["error"])
+        for path, pages in backup["files"].items():
+            self.assertTrue(os.path.exists(path))
+            self.assertTrue(path.startswith(self.backup_dir))
+            self.assertEqual(pages["copied"], pages["total"])
+
+    def test_admin_only(self):
+        resp = self.client.post('/backups', json={"user_id": self.user.id})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("Unauthorized", json.loads(resp.data)["error"])
+        self.assertEqual(self.client.post('/backups', json={}).status_code, 400)
+        self.assertFalse(os.path.exists(self.backup_dir))
+
+        resp = self.client.post('/backups', json={"user_id": self.admin.id})
+        backup_id = json.loads(resp.data)["backup_id"]
+        resp = self.get_backup(backup_id, self.user.id)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("Unauthorized", json.loads(resp.data)["error"])
+        resp = self.client.get(f'/backups/{backup_id}')
+        self.assertEqual(resp.status_code, 400)
+        resp = self.get_backup("missing", self.admin.id)
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(self.wait(backup_id)["status"], "done")
+
+if __name__ == '__main__':
+    unittest.main()
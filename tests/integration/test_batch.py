@@ -0,0 +1,110 @@
+import json
+import unittest
+import uuid
+from unittest import mock
+from src import create_app
+from src.services import product_service
+from src.services.user_service import login_user
+from db.database import close_connections, memory_db_uri
+
+class BatchIntegrationTests(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database, so tests can run in parallel.
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path})
+        self.client = self.app.test_client()
+
+        self.client.post('/users/register', json={
+            "username": "adminUser", "password": "adminpass", "role": "admin"
+        })
+        self.client.post('/users/register', json={
+            "username": "regularUser", "password": "userpass", "role": "regular"
+        })
+        self.admin = login_user("adminUser", "adminpass", db_path=self.db_path)
+        self.user = login_user("regularUser", "userpass", db_path=self.db_path)
+        resp = self.client.post('/products/add', json={
+            "user_id": self.admin.id,
+            "name": "Laptop",
+            "description": "Gaming laptop",
+            "price": 1500.0
+        })
+        self.product_id = json.loads(resp.data)["id"]
+
+    def tearDown(self):
+        close_connections(self.db_path)
+
+    def batch(self, *paths):
+        return self.client.post('/batch', json={
+            "requests": [{"method": "GET", "path": path} for path in paths]
+        })
+
+    def test_storefront_page(self):
+        resp = self.client.post('/cart/add', json={
+            "user_id": self.user.id,
+            "items": [{"product_id": self.product_id, "product_quantity": 2}]
+        })
+        cart_id = json.loads(resp.data)["cart_id"]
+
+        resp = self.batch(
+            '/products',
+            f'/cart/view?user_id={self.user.id}&cart_id={cart_id}',
+            f'/products/{self.product_id}',
+            '/products/999999',
+            '/no-such-route'
+        )
+        self.assertEqual(resp.status_code, 200)
+        results = json.loads(resp.data)["responses"]
+        self.assertEqual(
+            [result["status"] for result in results], [200, 200, 200, 404, 404]
+        )
+        self.assertEqual(results[0]["body"][0]["name"], "Laptop")
+        self.assertEqual(results[1]["body"][0]["product_quantity"], 2)
+        self.assertEqual(results[2]["body"]["id"], self.product_id)
+        self.assertEqual(results[3]["body"], {"error": "Product not found"})
+        self.assertIsInstance(results[4]["body"], str)
+
+    def test_failing_sub_request(self):
+        with mock.patch.object(
+            product_service, "get_product_by_id",
+            side_effect=RuntimeError("Database on fire")
+        ), self.assertLogs(self.app.logger, "ERROR"):
+            resp = self.batch(f'/products/{self.product_id}', '/products')
+        # Only the failing sub-request is an error.
+        self.assertEqual(resp.status_code, 200)
+        results = json.loads(resp.data)["responses"]
+        self.assertEqual(
+            [result["status"] for result in results], [500, 200]
+        )
+
+    def test_invalid_batches(self):
+        self.assertEqual(self.client.post('/batch', json={}).status_code, 400)
+        resp = self.client.post('/batch', json={
+            "requests": [{"method": "POST", "path": "/cart/add"}]
+        })
+        self.assertEqual(resp.status_code, 400)
+        resp = self.batch(*['/products'] * 21)
+        self.assertEqual(resp.status_code, 400)
+        resp = self.batch('/products/changes?wait=30')
+        self.assertEqual(
+            json.loads(resp.data)["responses"][0]["status"], 400
+        )
+
+    def test_sub_requests_are_rate_limited(self):
+        app = create_app({
+            "TESTING": True,
+            "DATABASE": self.db_path,
+            "RATE_LIMIT_CLIENT": (1, 2)
+        })
+        resp = app.test_client().post('/batch', json={
+            "requests": [{"path": "/products"}]
+        })
+        results = json.loads(resp.data)["responses"]
+        # The batch itself takes one token, its sub-request the other.
+        self.assertEqual(results[0]["status"], 200)
+        resp = app.test_client().post('/batch', json={
+            "requests": [{"path": "/products"}]
+        })
+        self.assertEqual(resp.status_code, 429)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,22 +1,17 @@
 import json
-import os
-import tempfile
 import unittest
+import uuid
 from src import create_app
-from src.services .user_service import register_user
-from db.database import init_db
+from src.services .user_service import login_user
+from db.database import close_connections, memory_db_uri
 
 class CartIntegrationTests(unittest.TestCase):
     def setUp(self):
-        # Create a temporary SQLite database.
-        self.db_fd, self.db_path = tempfile.mkstemp()
-        init_db(self.db_path)
-        
+        # Use a private in-memory database, so tests can run in parallel.
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
+
         # Create the Flask app configured for testing.
-        self.app = create_app()
-        self.app.config['TESTING'] = True
-        # Override the database configuration to use the temporary DB.
-        self.app.config['DATABASE'] = self.db_path
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path})
         self.client = self.app.test_client()
         
         # Register an admin user (for adding products).
@@ -51,12 +46,12 @@ class CartIntegrationTests(unittest.TestCase):
             # If registration fails, we assume it is because the user is already registered.
             self.assertEqual(regular_response.status_code, 400)
 
-        self.mock_admin_user = register_user(
-            "adminUser", "adminpass", "admin", db_path=self.db_path
+        self.mock_admin_user = login_user(
+            "adminUser", "adminpass", db_path=self.db_path
         )
 
-        self.mock_regular_user = register_user(
-            "regularUser", "adminpass", "regular", db_path=self.db_path
+        self.mock_regular_user = login_user(
+            "regularUser", "userpass", db_path=self.db_path
         )
 
         # Admin adds six products.
@@ -76,8 +71,7 @@ class CartIntegrationTests(unittest.TestCase):
             i+1
 
     def tearDown(self):
-        os.close(self.db_fd)
-        os.unlink(self.db_path)
+        close_connections(self.db_path)
 
     def test_shopping_journey(self):
         # 1. Regular user views list of products.
@@ -102,6 +96,19 @@ class CartIntegrationTests(unittest.TestCase):
         self.assertEqual(len(cart["items"]), 3)
         cart_id = cart["cart_id"]
 
+        # The expanded view prices every line in one request.
+        view_resp = self.client.get(
+            f'/cart/view?user_id={self.mock_regular_user.id}'
+            f'&cart_id={cart_id}&expand=products'
+        )
+        self.assertEqual(view_resp.status_code, 200)
+        expanded = json.loads(view_resp.data)
+        self.assertEqual(expanded["cart_id"], cart_id)
+        self.assertAlmostEqual(
+            expanded["total"],
+            sum(item["line_total"] or 0 for item in expanded["items"])
+        )
+
         # 3. Regular user places an order using the cart.
         order_resp = self.client.post('/cart/order', json={
             "user_id": self.mock_regular_user.id,
@@ -120,5 +127,163 @@ class CartIntegrationTests(unittest.TestCase):
         for item in order_products:
             self.assertEqual(item["product_quantity"], 2)
 
+    def test_retries_with_idempotency_key(self):
+        add_payload = {
+            "user_id": self.mock_regular_user.id,
+            "items": [{"product_id": self.product_ids[0], "product_quantity": 1}]
+        }
+        add_headers = {"Idempotency-Key": str(uuid.uuid4())}
+        first_add = self.client.post(
+            '/cart/add', json=add_payload, headers=add_headers
+        )
+        self.assertEqual(first_add.status_code, 201)
+        retry_add = self.client.post(
+            '/cart/add', json=add_payload, headers=add_headers
+        )
+        self.assertEqual(retry_add.status_code, 201)
+        self.assertEqual(retry_add.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(json.loads(retry_add.data), json.loads(first_add.data))
+        cart = json.loads(first_add.data)
+        # The retry must not have added the product a second time.
+        view_resp = self.client.get(
+            f'/cart/view?user_id={self.mock_regular_user.id}'
+            f'&cart_id={cart["cart_id"]}'
+        )
+        quantities = {
+            item["product_id"]: item["product_quantity"]
+            for item in json.loads(view_resp.data)
+        }
+        self.assertEqual(
+            quantities[self.product_ids[0]],
+            cart["items"][str(self.product_ids[0])]
+        )
+
+        # Reusing the key with another payload is rejected.
+        other_add = self.client.post(
+            '/cart/add',
+            json={**add_payload, "items": [
+                {"product_id": self.product_ids[1], "product_quantity": 1}
+            ]},
+            headers=add_headers
+        )
+        self.assertEqual(other_add.status_code, 422)
+
+        order_payload = {
+            "user_id": self.mock_regular_user.id,
+            "cart_id": cart["cart_id"]
+        }
+        order_headers = {"Idempotency-Key": str(uuid.uuid4())}
+        first_order = self.client.post(
+            '/cart/order', json=order_payload, headers=order_headers
+        )
+        self.assertEqual(first_order.status_code, 201)
+        retry_order = self.client.post(
+            '/cart/order', json=order_payload, headers=order_headers
+        )
+        self.assertEqual(retry_order.status_code, 201)
+        self.assertEqual(
+            json.loads(retry_order.data)["order_id"],
+            json.loads(first_order.data)["order_id"]
+        )
+
+    def test_update_cart(self):
+        user_id = self.mock_regular_user.id
+        self.client.post('/cart/add', json={
+            "user_id": user_id,
+            "items": [
+                {"product_id": pid, "product_quantity": 1}
+                for pid in self.product_ids[:3]
+            ]
+        })
+        resp = self.client.patch('/cart', json={
+            "user_id": user_id,
+            "set": [
+                {"product_id": self.product_ids[0], "product_quantity": 4},
+                {"product_id": self.product_ids[1], "product_quantity": 0}
+            ],
+            "remove": [self.product_ids[2]]
+        })
+        self.assertEqual(resp.status_code, 200)
+        cart = json.loads(resp.data)
+        self.assertEqual(cart["items"], {str(self.product_ids[0]): 4})
+
+        resp = self.client.patch('/cart', json={
+            "user_id": user_id,
+            "replace": [
+                {"product_id": self.product_ids[5], "product_quantity": 2}
+            ]
+        })
+        self.assertEqual(
+            json.loads(resp.data)["items"], {str(self.product_ids[5]): 2}
+        )
+
+        resp = self.client.patch('/cart', json={
+            "user_id": user_id,
+            "set": [{"product_id": 999999, "product_quantity": 1}]
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(
+            self.client.patch('/cart', json={"set": []}).status_code, 400
+        )
+        # Clean up so the cart does not leak into other tests.
+        self.client.post('/cart/order', json={
+            "user_id": user_id, "cart_id": cart["cart_id"]
+        })
+
+    def test_add_rejects_non_positive_quantities(self):
+        prod_resp = self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Limited Product",
+            "description": "Only one left",
+            "price": 50.0,
+            "stock": 1
+        })
+        product = json.loads(prod_resp.data)
+        for quantity in (-5, 0, "2"):
+            resp = self.client.post('/cart/add', json={
+                "user_id": self.mock_regular_user.id,
+                "items": [
+                    {"product_id": product["id"], "product_quantity": quantity}
+                ]
+            })
+            self.assertEqual(resp.status_code, 400)
+        view_resp = self.client.get(f'/products/{product["id"]}')
+        self.assertEqual(json.loads(view_resp.data)["stock"], 1)
+
+    def test_order_with_insufficient_stock(self):
+        prod_resp = self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Limited Product",
+            "description": "Only one left",
+            "price": 50.0,
+            "stock": 1
+        })
+        self.assertEqual(prod_resp.status_code, 201)
+        product = json.loads(prod_resp.data)
+        self.assertEqual(product["stock"], 1)
+
+        add_cart_resp = self.client.post('/cart/add', json={
+            "user_id": self.mock_regular_user.id,
+            "items": [{"product_id": product["id"], "product_quantity": 2}]
+        })
+        cart = json.loads(add_cart_resp.data)
+        order_resp = self.client.post('/cart/order', json={
+            "user_id": self.mock_regular_user.id,
+            "cart_id": cart["cart_id"]
+        })
+        self.assertEqual(order_resp.status_code, 409)
+        failures = json.loads(order_resp.data)["items"]
+        self.assertEqual(failures[0]["product_id"], product["id"])
+        self.assertEqual(failures[0]["available"], 1)
+        # Clean up so the cart does not leak into other tests.
+        self.client.put(
+            f'/products/edit/{product["id"]}',
+            json={"user_id": self.mock_admin_user.id, "stock": 100}
+        )
+        self.client.post('/cart/order', json={
+            "user_id": self.mock_regular_user.id,
+            "cart_id": cart["cart_id"]
+        })
+
 if __name__ == '__main__':
     unittest.main()
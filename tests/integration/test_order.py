@@ -0,0 +1,113 @@
+import json
+import unittest
+import uuid
+from src import create_app
+from src.services.user_service import login_user
+from db.database import close_connections, memory_db_uri
+from db.sharding import disable_sharding, shard_path_for
+
+class OrderIntegrationTests(unittest.TestCase):
+    def setUp(self):
+        # Use private in-memory databases, so tests can run in parallel.
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
+        self.shard_paths = [
+            memory_db_uri(f"test-{uuid.uuid4().hex}") for _ in range(2)
+        ]
+        self.app = create_app({
+            "TESTING": True,
+            "DATABASE": self.db_path,
+            "DATABASE_SHARDS": self.shard_paths
+        })
+        self.client = self.app.test_client()
+
+        self.client.post('/users/register', json={
+            "username": "adminUser", "password": "adminpass", "role": "admin"
+        })
+        self.admin = login_user("adminUser", "adminpass", db_path=self.db_path)
+        resp = self.client.post('/products/add', json={
+            "user_id": self.admin.id,
+            "name": "Mouse",
+            "description": "Wireless mouse",
+            "price": 20.0
+        })
+        self.product_id = json.loads(resp.data)["id"]
+
+        # Customers until both shards have orders.
+        self.users = []
+        shards = set()
+        while len(shards) < 2:
+            username = f"user_{len(self.users)}"
+            self.client.post('/users/register', json={
+                "username": username, "password": "userpass", "role": "regular"
+            })
+            user = login_user(username, "userpass", db_path=self.db_path)
+            self.users.append(user)
+            shards.add(shard_path_for(user.id, self.db_path))
+        for quantity, user in enumerate(self.users, start=1):
+            resp = self.client.post('/cart/add', json={
+                "user_id": user.id,
+                "items": [
+                    {"product_id": self.product_id, "product_quantity": quantity}
+                ]
+            })
+            cart_id = json.loads(resp.data)["cart_id"]
+            resp = self.client.post('/cart/order', json={
+                "user_id": user.id, "cart_id": cart_id
+            })
+            self.assertEqual(resp.status_code, 201)
+
+    def tearDown(self):
+        disable_sharding(self.db_path)
+        for path in self.shard_paths:
+            close_connections(path)
+        close_connections(self.db_path)
+
+    def get(self, path, user_id, **params):
+        return self.client.get(
+            path, query_string={"user_id": user_id, **params}
+        )
+
+    def test_admin_only(self):
+        for path in ('/orders', '/orders/report'):
+            resp = self.get(path, self.users[0].id)
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn("Unauthorized", json.loads(resp.data)["error"])
+            self.assertEqual(self.client.get(path).status_code, 400)
+            self.assertEqual(self.get(path, 999999).status_code, 400)
+
+    def test_orders_from_every_shard(self):
+        resp = self.get('/orders', self.admin.id)
+        self.assertEqual(resp.status_code, 200)
+        orders = json.loads(resp.data)
+        self.assertEqual(
+            sorted(order["user_id"] for order in orders),
+            sorted(user.id for user in self.users)
+        )
+        self.assertEqual(
+            [order["created_at"] for order in orders],
+            sorted(order["created_at"] for order in orders)
+        )
+        resp = self.get('/orders', self.admin.id, until="2000-01-01")
+        self.assertEqual(json.loads(resp.data), [])
+
+    def test_report_sums_the_shards(self):
+        resp = self.get('/orders/report', self.admin.id)
+        self.assertEqual(resp.status_code, 200)
+        report = json.loads(resp.data)
+        self.assertEqual(len(report["per_shard"]), 2)
+        self.assertTrue(
+            all(shard["order_count"] > 0 for shard in report["per_shard"])
+        )
+        self.assertEqual(report["order_count"], len(self.users))
+        self.assertEqual(report["customer_count"], len(self.users))
+        self.assertEqual(
+            report["units_sold"], sum(range(1, len(self.users) + 1))
+        )
+        for key in ("order_count", "customer_count", "units_sold"):
+            self.assertEqual(
+                report[key],
+                sum(shard[key] for shard in report["per_shard"])
+            )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,22 +1,23 @@
+import gzip
 import json
-import os
-import tempfile
+import uuid
+import zlib
 import unittest
+from unittest import mock
 from src import create_app
+from src.routes import product_routes
+from src.services import cart_service, product_service
 from src.services .user_service import register_user
-from db.database import init_db
+from db import related_products
+from db.database import close_connections, memory_db_uri
 
 class ProductIntegrationTests(unittest.TestCase):
     def setUp(self):
-        # Create a temporary SQLite database.
-        self.db_fd, self.db_path = tempfile.mkstemp()
-        init_db(self.db_path)
+        # Use a private in-memory database, so tests can run in parallel.
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
 
         # Create the Flask app and configure for testing.
-        self.app = create_app()
-        self.app.config['TESTING'] = True
-        # Override your DB config to point to the temporary DB.
-        self.app.config['DATABASE'] = self.db_path
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path})
         self.client = self.app.test_client()
 
         # Register an admin user.
@@ -56,8 +57,7 @@ class ProductIntegrationTests(unittest.TestCase):
         )
 
     def tearDown(self):
-        os.close(self.db_fd)
-        os.unlink(self.db_path)
+        close_connections(self.db_path)
 
     def test_admin_add_edit_delete_products_and_regular_user_view(self):
         # Step 1: Admin adds 4 products.
@@ -136,5 +136,190 @@ class ProductIntegrationTests(unittest.TestCase):
                 self.assertEqual(prod["name"], "Updated Product 2")
                 self.assertEqual(prod["price"], 25.0)
 
+    def test_catalog_listing_compression(self):
+        # Make sure the listing is above the compression threshold.
+        resp = self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Long Product",
+            "description": "Long description " * 50,
+            "price": 99.0
+        })
+        self.assertEqual(resp.status_code, 201)
+        new_product = json.loads(resp.data)
+
+        plain = self.client.get('/products')
+        self.assertEqual(plain.status_code, 200)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        products = json.loads(plain.data)
+
+        gzipped = self.client.get(
+            '/products', headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(gzipped.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", gzipped.headers["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(gzipped.data)), products)
+
+        deflated = self.client.get(
+            '/products', headers={"Accept-Encoding": "deflate"}
+        )
+        self.assertEqual(deflated.headers["Content-Encoding"], "deflate")
+        self.assertEqual(json.loads(zlib.decompress(deflated.data)), products)
+
+        # An edit must invalidate the cached compressed listing.
+        resp = self.client.put(
+            f'/products/edit/{new_product["id"]}',
+            json={"user_id": self.mock_admin_user.id, "price": 199.0}
+        )
+        self.assertEqual(resp.status_code, 200)
+        gzipped = self.client.get(
+            '/products', headers={"Accept-Encoding": "gzip"}
+        )
+        listing = json.loads(gzip.decompress(gzipped.data))
+        edited = next(p for p in listing if p["id"] == new_product["id"])
+        self.assertEqual(edited["price"], 199.0)
+
+    def test_listing_is_cached_under_its_own_version(self):
+        version = product_service.get_catalog_version(db_path=self.db_path)
+        self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Fresh",
+            "description": "",
+            "price": 1.0
+        })
+        # The version read lags behind the snapshot the body is built from,
+        # as it can with a replica.
+        with mock.patch.object(
+            product_service, "get_catalog_version", return_value=version
+        ):
+            listing = json.loads(self.client.get('/products').data)
+        self.assertIn("Fresh", [p["name"] for p in listing])
+        stale = product_routes.catalog_cache.get(
+            (self.db_path, version), None, lambda: (None, b"rebuilt")
+        )
+        self.assertEqual(stale, b"rebuilt")
+
+    def test_small_response_not_compressed(self):
+        resp = self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Tiny",
+            "description": "",
+            "price": 1.0
+        })
+        product = json.loads(resp.data)
+        resp = self.client.get(
+            f'/products/{product["id"]}',
+            headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(json.loads(resp.data)["name"], "Tiny")
+
+    def test_related_products(self):
+        ids = []
+        for name in ("Laptop", "Mouse"):
+            resp = self.client.post('/products/add', json={
+                "user_id": self.mock_admin_user.id,
+                "name": name,
+                "description": "",
+                "price": 10.0
+            })
+            ids.append(json.loads(resp.data)["id"])
+        user = register_user(
+            "buyer", "buyerpass", "regular", db_path=self.db_path
+        )
+        cart = cart_service.add_to_cart(
+            user, [(ids[0], 1), (ids[1], 1)], db_path=self.db_path
+        )
+        cart_service.place_order(cart, user, db_path=self.db_path)
+        related_products.update(self.db_path)
+
+        resp = self.client.get(f'/products/{ids[0]}/related')
+        self.assertEqual(resp.status_code, 200)
+        related = json.loads(resp.data)
+        self.assertEqual(
+            [(p["id"], p["name"], p["orders"]) for p in related],
+            [(ids[1], "Mouse", 1)]
+        )
+        resp = self.client.get(f'/products/{ids[0]}/related?limit=0')
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get('/products/999/related')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_get_products_by_ids(self):
+        resp = self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Laptop",
+            "description": "Gaming laptop",
+            "price": 1500.0,
+            "stock": 3
+        })
+        product_id = json.loads(resp.data)["id"]
+
+        resp = self.client.get(f'/products?ids={product_id},999999')
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data)
+        self.assertEqual(
+            [(p["id"], p["stock"]) for p in data["products"]],
+            [(product_id, 3)]
+        )
+        self.assertEqual(data["missing"], [999999])
+        self.assertEqual(self.client.get('/products?ids=1,x').status_code, 400)
+        self.assertEqual(self.client.get('/products?ids=').status_code, 400)
+
+    def test_catalog_changes(self):
+        resp = self.client.post('/products/add', json={
+            "user_id": self.mock_admin_user.id,
+            "name": "Tiny",
+            "description": "",
+            "price": 1.0
+        })
+        product = json.loads(resp.data)
+        resp = self.client.get('/products/changes?since=0')
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data)
+        self.assertEqual(
+            [(c["product_id"], c["change"]) for c in data["changes"]],
+            [(product["id"], "add")]
+        )
+        last_seq = data["last_seq"]
+        self.client.delete(
+            f'/products/delete/{product["id"]}',
+            json={"user_id": self.mock_admin_user.id}
+        )
+        data = json.loads(
+            self.client.get(f'/products/changes?since={last_seq}').data
+        )
+        self.assertEqual(
+            [c["change"] for c in data["changes"]], ["delete"]
+        )
+        last_seq = data["last_seq"]
+        data = json.loads(
+            self.client.get(f'/products/changes?since={last_seq}').data
+        )
+        self.assertEqual(data, {"changes": [], "last_seq": last_seq})
+        resp = self.client.get('/products/changes?limit=0')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_catalog_changes_event_stream(self):
+        self.app.config["CATALOG_CHANGES_STREAM_SECONDS"] = 0
+        for name in ("First", "Second"):
+            self.client.post('/products/add', json={
+                "user_id": self.mock_admin_user.id,
+                "name": name,
+                "description": "",
+                "price": 1.0
+            })
+        resp = self.client.get(
+            '/products/changes',
+            headers={"Accept": "text/event-stream", "Last-Event-ID": "1"}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "text/event-stream")
+        events = resp.get_data(as_text=True).strip().split("\n\n")
+        self.assertEqual(len(events), 1)
+        lines = events[0].split("\n")
+        self.assertEqual(lines[:2], ["id: 2", "event: add"])
+        self.assertEqual(json.loads(lines[2][len("data: "):])["name"], "Second")
+
 if __name__ == '__main__':
     unittest.main()
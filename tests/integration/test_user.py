@@ -1,26 +1,22 @@
 import json
-import os
-import tempfile
 import unittest
+import uuid
 from src import create_app
-from db.database import init_db
+from src.services.user_service import disable_username_cache, login_user
+from db.database import close_connections, memory_db_uri
 
 class UserIntegrationTests(unittest.TestCase):
     def setUp(self):
-        # Create a temporary database file.
-        self.db_fd, self.db_path = tempfile.mkstemp()
-        # Initialize the test database.
-        init_db(self.db_path)
+        # Every test gets its own in-memory database, so tests don't
+        # share data and can run in parallel.
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
         # Create the Flask application configured for testing.
-        self.app = create_app()
-        self.app.config['TESTING'] = True
-        # Override the database configuration to use the temporary DB.
-        self.app.config['DATABASE'] = self.db_path
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path})
         self.client = self.app.test_client()
 
     def tearDown(self):
-        os.close(self.db_fd)
-        os.unlink(self.db_path)
+        disable_username_cache(self.db_path)
+        close_connections(self.db_path)
 
     def test_user_already_registered_and_login(self):
         # Attempt to register a new user.
@@ -53,5 +49,69 @@ class UserIntegrationTests(unittest.TestCase):
         login_data = json.loads(login_response.data)
         self.assertIn("id", login_data)
 
+    def test_username_cache_stats(self):
+        app = create_app({
+            "TESTING": True,
+            "DATABASE": self.db_path,
+            "USERNAME_CACHE_SIZE": 100
+        })
+        client = app.test_client()
+        for username, role in (
+            ("adminUser", "admin"), ("regularUser", "regular")
+        ):
+            client.post('/users/register', json={
+                "username": username, "password": "pass", "role": role
+            })
+        admin = login_user("adminUser", "pass", db_path=self.db_path)
+        regular = login_user("regularUser", "pass", db_path=self.db_path)
+
+        def stats(user_id):
+            return client.get(
+                '/users/cache/stats', query_string={"user_id": user_id}
+            )
+
+        resp = stats(regular.id)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("Unauthorized", json.loads(resp.data)["error"])
+        self.assertEqual(client.get('/users/cache/stats').status_code, 400)
+
+        before = json.loads(stats(admin.id).data)
+        client.post('/users/login', json={
+            "username": "adminUser", "password": "pass"
+        })
+        for _ in range(2):
+            client.post('/users/login', json={
+                "username": "ghost", "password": "pass"
+            })
+        resp = stats(admin.id)
+        self.assertEqual(resp.status_code, 200)
+        after = json.loads(resp.data)
+        self.assertEqual(set(after), {
+            "enabled", "hits", "negative_hits", "misses", "hit_rate",
+            "entries", "negative_entries"
+        })
+        self.assertTrue(after["enabled"])
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["negative_hits"] - before["negative_hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["entries"], 2)
+        self.assertEqual(after["negative_entries"], 1)
+        lookups = after["hits"] + after["negative_hits"] + after["misses"]
+        self.assertAlmostEqual(
+            after["hit_rate"],
+            (after["hits"] + after["negative_hits"]) / lookups
+        )
+
+    def test_username_cache_stats_when_disabled(self):
+        self.client.post('/users/register', json={
+            "username": "adminUser", "password": "pass", "role": "admin"
+        })
+        admin = login_user("adminUser", "pass", db_path=self.db_path)
+        resp = self.client.get(
+            '/users/cache/stats', query_string={"user_id": admin.id}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data), {"enabled": False})
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from db import sales_summary
+from db.database import close_connections, init_db, run_write
+from src.services import (
+    analytics_service,
+    cart_service,
+    product_service,
+    user_service
+)
+from src.services.analytics_service import AnalyticsServiceError
+
+class TestAnalyticsService(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.user = user_service.register_user(
+            "user_1", "userpass", "regular", db_path=self.db_path
+        )
+        self.laptop = product_service.add_product(
+            self.admin, "Laptop", "Gaming laptop", 1500.00, db_path=self.db_path
+        )
+        self.mouse = product_service.add_product(
+            self.admin, "Mouse", "Wireless mouse", 20.00, db_path=self.db_path
+        )
+        for created_at, items in (
+            ("2025-01-10T09:00:00", [(self.laptop.id, 1), (self.mouse.id, 2)]),
+            ("2025-01-10T18:00:00", [(self.mouse.id, 1)]),
+            ("2025-01-11T12:00:00", [(self.mouse.id, 3)]),
+        ):
+            cart = cart_service.add_to_cart(
+                self.user, items, db_path=self.db_path
+            )
+            order = cart_service.place_order(
+                cart, self.user, db_path=self.db_path
+            )
+            run_write(
+                lambda conn: self._backdate(conn, order.id, created_at),
+                self.db_path
+            )
+        # The orders were edited by hand.
+        sales_summary.rebuild(self.db_path)
+        # Revenue uses the prices paid, not the current ones.
+        product_service.edit_product(
+            self.admin, self.mouse.id, price=25.00, db_path=self.db_path
+        )
+
+    @staticmethod
+    def _backdate(conn, order_id, created_at):
+        conn.execute(
+            "UPDATE orders SET created_at = ? WHERE id = ?",
+            (created_at, order_id)
+        )
+        conn.execute(
+            """
+            UPDATE order_items
+            SET created_at = ?, day = CAST(strftime('%Y%m%d', ?) AS INTEGER)
+            WHERE order_id = ?
+            """,
+            (created_at, created_at, order_id)
+        )
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_daily_revenue(self):
+        days = analytics_service.get_daily_revenue(
+            self.admin, db_path=self.db_path
+        )
+        self.assertEqual(days, [
+            {"day": "2025-01-10", "orders": 2, "units": 4, "revenue": 1560.0},
+            {"day": "2025-01-11", "orders": 1, "units": 3, "revenue": 60.0},
+        ])
+        days = analytics_service.get_daily_revenue(
+            self.admin, since="2025-01-11", db_path=self.db_path
+        )
+        self.assertEqual([day["day"] for day in days], ["2025-01-11"])
+        with self.assertRaises(AnalyticsServiceError):
+            analytics_service.get_daily_revenue(
+                self.admin, until="next week", db_path=self.db_path
+            )
+
+    def test_top_products(self):
+        by_revenue = analytics_service.get_top_products(
+            self.admin, db_path=self.db_path
+        )
+        self.assertEqual(by_revenue, [
+            {"product_id": self.laptop.id, "units": 1, "revenue": 1500.0},
+            {"product_id": self.mouse.id, "units": 6, "revenue": 120.0},
+        ])
+        by_units = analytics_service.get_top_products(
+            self.admin, limit=1, by="units", db_path=self.db_path
+        )
+        self.assertEqual([p["product_id"] for p in by_units], [self.mouse.id])
+        with self.assertRaises(AnalyticsServiceError):
+            analytics_service.get_top_products(
+                self.admin, by="name", db_path=self.db_path
+            )
+
+    def test_basket_sizes(self):
+        sizes = analytics_service.get_basket_sizes(
+            self.admin, db_path=self.db_path
+        )
+        self.assertEqual(sizes, [
+            {"size": 1, "orders": 1},
+            {"size": 3, "orders": 2},
+        ])
+
+    def test_sales_summary(self):
+        products = analytics_service.get_product_sales(
+            self.admin, by="units", db_path=self.db_path
+        )
+        self.assertEqual(products, [
+            {"product_id": self.mouse.id, "units": 6, "revenue": 120.0},
+            {"product_id": self.laptop.id, "units": 1, "revenue": 1500.0},
+        ])
+        days = analytics_service.get_daily_sales(
+            self.admin, until="2025-01-11", db_path=self.db_path
+        )
+        self.assertEqual(
+            days, [{"day": "2025-01-10", "orders": 2, "revenue": 1560.0}]
+        )
+        with self.assertRaises(AnalyticsServiceError):
+            analytics_service.get_daily_sales(
+                self.admin, since="yesterday", db_path=self.db_path
+            )
+
+    def test_unauthorized(self):
+        with self.assertRaises(AnalyticsServiceError):
+            analytics_service.get_daily_revenue(
+                self.user, db_path=self.db_path
+            )
+
+class TestAnalyticsServiceWithoutNumpy(TestAnalyticsService):
+    """Runs the analytics tests on the array fallback."""
+    def setUp(self):
+        patcher = mock.patch.object(analytics_service, "USE_NUMPY", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+from flasgger import Swagger
+from db.database import close_connections, memory_db_uri
+from src import apispec, create_app
+
+class TestCachedSwagger(unittest.TestCase):
+    def setUp(self):
+        apispec._specs.clear()
+        self.dir = tempfile.mkdtemp()
+        self.spec_path = os.path.join(self.dir, "apispec.json")
+        self.db_paths = []
+
+    def tearDown(self):
+        for db_path in self.db_paths:
+            close_connections(db_path)
+        if os.path.exists(self.spec_path):
+            os.unlink(self.spec_path)
+        os.rmdir(self.dir)
+
+    def get_spec(self, **config):
+        db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
+        self.db_paths.append(db_path)
+        app = create_app({
+            "TESTING": True,
+            "DATABASE": db_path,
+            "SWAGGER_SPEC_CACHE": self.spec_path,
+            **config
+        })
+        response = app.test_client().get("/apispec_1.json")
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_spec_is_built_once(self):
+        with mock.patch.object(
+            Swagger, "get_apispecs", autospec=True,
+            side_effect=Swagger.get_apispecs
+        ) as build:
+            spec = self.get_spec()
+            self.assertIn("/products", spec["paths"])
+            self.assertEqual(self.get_spec(), spec)
+            # A new process finds the spec in the cache file.
+            apispec._specs.clear()
+            self.assertEqual(self.get_spec(), spec)
+        self.assertEqual(build.call_count, 1)
+
+    def test_config_change_rebuilds_the_spec(self):
+        self.get_spec()
+        spec = self.get_spec(SWAGGER={"title": "Shop API"})
+        self.assertEqual(spec["info"]["title"], "Shop API")
+        apispec._specs.clear()
+        spec = self.get_spec(SWAGGER={"title": "Store API"})
+        self.assertEqual(spec["info"]["title"], "Store API")
+
+    def test_stale_cache_file_is_ignored(self):
+        with open(self.spec_path, "w") as f:
+            json.dump({"fingerprint": "old", "spec": {"paths": {}}}, f)
+        self.assertIn("/products", self.get_spec()["paths"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from db.backup import backup
+from db.database import close_connections, init_db, run_write
+from db.memory_backend import MemoryBackend
+from db.repository import register_backend, unregister_backend
+from src.services import backup_service, user_service
+from src.services.backup_service import BackupServiceError
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.dir, "live.db")
+        init_db(self.db_path)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        shutil.rmtree(self.dir)
+
+    def _insert_users(self, prefix, count):
+        run_write(lambda conn: conn.executemany(
+            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+            ((f"{prefix}{i}", "hash", "regular") for i in range(count))
+        ), self.db_path)
+
+    def test_backup_is_consistent_during_writes(self):
+        self._insert_users("seed", 5000)
+        stop = threading.Event()
+
+        def keep_writing():
+            i = 0
+            while not stop.is_set():
+                self._insert_users(f"live{i}-", 10)
+                i += 1
+
+        writer = threading.Thread(target=keep_writing)
+        writer.start()
+        steps = []
+        target = os.path.join(self.dir, "copy.db")
+        try:
+            backup(
+                target, self.db_path, pages=8, sleep=0.001,
+                progress=lambda copied, total: steps.append((copied, total))
+            )
+        finally:
+            stop.set()
+            writer.join()
+
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1][0], steps[-1][1])
+        conn = sqlite3.connect(target)
+        try:
+            check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(check, "ok")
+        # Writes commit in batches of 10; a torn copy would break that.
+        self.assertEqual((count - 5000) % 10, 0)
+        self.assertFalse(os.path.exists(f"{target}.tmp"))
+
+    def test_compressed_backup(self):
+        self._insert_users("user", 100)
+        target = os.path.join(self.dir, "copy.db.gz")
+        backup(target, self.db_path, compress=True)
+
+        restored = os.path.join(self.dir, "restored.db")
+        with gzip.open(target, "rb") as packed, open(restored, "wb") as raw:
+            shutil.copyfileobj(packed, raw)
+        conn = sqlite3.connect(restored)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(count, 100)
+
+    def _wait(self, backup):
+        deadline = time.monotonic() + 10
+        while backup.status == "running" and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_service_backs_up_in_background(self):
+        admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        regular = user_service.register_user(
+            "regular", "userpass", "regular", db_path=self.db_path
+        )
+        backup_dir = os.path.join(self.dir, "backups")
+        with self.assertRaises(BackupServiceError):
+            backup_service.start_backup(
+                regular, backup_dir, db_path=self.db_path
+            )
+
+        started = backup_service.start_backup(
+            admin, backup_dir, db_path=self.db_path
+        )
+        self._wait(started)
+        self.assertEqual(started.status, "done")
+        self.assertIs(backup_service.get_backup(admin, started.id), started)
+        (path, progress), = started.files.items()
+        self.assertTrue(path.endswith("-main.db.gz"))
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(progress["copied"], progress["total"])
+
+    def test_service_reports_unsupported_backend(self):
+        register_backend(MemoryBackend(), "memory-backup-test")
+        try:
+            admin = user_service.register_user(
+                "admin", "adminpass", "admin", db_path="memory-backup-test"
+            )
+            started = backup_service.start_backup(
+                admin, self.dir, db_path="memory-backup-test"
+            )
+            self._wait(started)
+        finally:
+            unregister_backend("memory-backup-test")
+        self.assertEqual(started.status, "failed")
+        self.assertIn("not supported", started.error)
+
+if __name__ == '__main__':
+    unittest.main()
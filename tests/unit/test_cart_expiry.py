@@ -0,0 +1,163 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from db.database import close_connections, get_read_connection, init_db
+from db.repository import get_backend
+from src.services import cart_expiry, cart_service, product_service
+from src.services import user_service
+
+HOUR = 3600
+
+class TestCartExpiry(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.users = [
+            user_service.register_user(
+                f"user_{i}", "userpass", "regular", db_path=self.db_path
+            ) for i in range(3)
+        ]
+        self.product = product_service.add_product(
+            self.admin, "Mouse", "Wireless mouse", 20.00, db_path=self.db_path
+        )
+
+    def tearDown(self):
+        cart_service.disable_cart_expiry(self.db_path)
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def cart_users(self):
+        conn = get_read_connection(self.db_path)
+        user_ids = [row[0] for row in conn.execute(
+            "SELECT user_id FROM carts ORDER BY user_id"
+        )]
+        conn.close()
+        return user_ids
+
+    def test_sweep_deletes_expired_carts(self):
+        full, _, empty = self.users
+        cart_service.add_to_cart(
+            full, [(self.product.id, 1)], db_path=self.db_path
+        )
+        get_backend(self.db_path).carts.get_or_create(empty.id)
+        self.assertEqual(self.cart_users(), [full.id, empty.id])
+
+        # Nothing is old enough yet.
+        result = cart_expiry.sweep(
+            ttl_seconds=24 * HOUR, empty_ttl_seconds=HOUR,
+            db_path=self.db_path
+        )
+        self.assertEqual(result, {"carts": 0, "pages": 0})
+        # Two hours later only the empty cart has expired.
+        result = cart_expiry.sweep(
+            ttl_seconds=24 * HOUR, empty_ttl_seconds=HOUR,
+            now=time.time() + 2 * HOUR, db_path=self.db_path
+        )
+        self.assertEqual(result["carts"], 1)
+        self.assertEqual(self.cart_users(), [full.id])
+        result = cart_expiry.sweep(
+            ttl_seconds=24 * HOUR, empty_ttl_seconds=HOUR,
+            now=time.time() + 25 * HOUR, db_path=self.db_path
+        )
+        self.assertEqual(result["carts"], 1)
+        self.assertEqual(self.cart_users(), [])
+
+    def test_sweep_in_batches_and_shrinks_the_file(self):
+        description = "x" * 2000
+        products = [
+            product_service.add_product(
+                self.admin, f"Product {i}", description, 1.0,
+                db_path=self.db_path
+            ) for i in range(200)
+        ]
+        for user in self.users:
+            cart_service.add_to_cart(
+                user, [(product.id, 1) for product in products],
+                db_path=self.db_path
+            )
+        result = cart_expiry.sweep(
+            ttl_seconds=0, batch_size=1, now=time.time() + 1,
+            db_path=self.db_path
+        )
+        self.assertEqual(result["carts"], 3)
+        self.assertGreater(result["pages"], 0)
+        conn = get_read_connection(self.db_path)
+        self.assertEqual(
+            conn.execute("PRAGMA freelist_count").fetchone()[0], 0
+        )
+        conn.close()
+
+    def test_sweep_flushes_buffered_changes_first(self):
+        write_behind = cart_service.enable_write_behind(
+            interval_ms=60000, db_path=self.db_path
+        )
+        self.addCleanup(
+            cart_service.disable_write_behind, self.db_path, False
+        )
+        # The cart row is stored empty and the add is only buffered.
+        cart_service.add_to_cart(
+            self.users[0], [(self.product.id, 1)], db_path=self.db_path
+        )
+        result = cart_expiry.sweep(
+            ttl_seconds=HOUR, empty_ttl_seconds=0, now=time.time() + 1,
+            db_path=self.db_path, pause=write_behind.paused
+        )
+        self.assertEqual(result["carts"], 0)
+        self.assertEqual(self.cart_users(), [self.users[0].id])
+
+    def test_add_during_sweep_is_kept(self):
+        write_behind = cart_service.enable_write_behind(
+            interval_ms=60000, db_path=self.db_path
+        )
+        self.addCleanup(
+            cart_service.disable_write_behind, self.db_path, False
+        )
+        user = self.users[0]
+        carts = get_backend(self.db_path).carts
+        carts.get_or_create(user.id)
+        delete_expired = carts.delete_expired
+        adder = threading.Thread(
+            target=cart_service.add_to_cart,
+            args=(user, [(self.product.id, 2)], self.db_path)
+        )
+
+        def add_then_delete(*args):
+            # The user adds to their idle cart while it is being swept.
+            if adder.ident is not None:
+                return 0
+            adder.start()
+            adder.join(0.2)
+            return delete_expired(*args)
+
+        with mock.patch.object(carts, "delete_expired", add_then_delete):
+            cart_expiry.sweep(
+                ttl_seconds=0, now=time.time() + 1, db_path=self.db_path,
+                pause=write_behind.paused
+            )
+        adder.join()
+        write_behind.flush()
+        cart = carts.get_or_create(user.id)
+        self.assertEqual(cart.items, {str(self.product.id): 2})
+
+    def test_background_sweeper(self):
+        get_backend(self.db_path).carts.get_or_create(self.users[0].id)
+        sweeper = cart_service.enable_cart_expiry(
+            0.01, ttl_seconds=HOUR, empty_ttl_seconds=0, db_path=self.db_path
+        )
+        for _ in range(200):
+            if sweeper.carts_deleted:
+                break
+            time.sleep(0.01)
+        cart_service.disable_cart_expiry(self.db_path)
+        self.assertEqual(sweeper.carts_deleted, 1)
+        self.assertEqual(self.cart_users(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
 import json
 import os
+import threading
+import time
 import unittest
 import tempfile
-from db.database import init_db
+from unittest import mock
+from db.database import close_connections, get_db_connection, init_db
+from db.repository import get_backend
 from src.services import cart_service, user_service, product_service
 
 class TestOrderService(unittest.TestCase):
@@ -42,6 +46,7 @@ class TestOrderService(unittest.TestCase):
         )
 
     def tearDown(self):
+        close_connections(self.db_path)
         os.close(self.db_fd)
         os.unlink(self.db_path)
 
@@ -49,6 +54,12 @@ class TestOrderService(unittest.TestCase):
         # Add product to user's cart
         cart = self.cart_1
         self.assertIsNotNone(cart.id)
+        for quantity in (-5, 0):
+            with self.assertRaises(ValueError):
+                cart_service.add_to_cart(
+                    self.user_1, [(self.product_1.id, quantity)],
+                    db_path=self.db_path
+                )
 
     def test_view_cart(self):
         # Add product to the user's cart first.
@@ -72,6 +83,30 @@ class TestOrderService(unittest.TestCase):
         self.assertEqual(len(cart_items), 2)
         self.assertEqual(cart_items[1]['product_id'], self.product_2.id)
 
+    def test_view_cart_with_products(self):
+        cart = cart_service.view_cart_with_products(
+            cart=self.cart_2, user=self.user_2, db_path=self.db_path
+        )
+        self.assertEqual(cart["cart_id"], self.cart_2.id)
+        self.assertEqual(
+            [item["product_id"] for item in cart["items"]],
+            [self.product_1.id, self.product_2.id]
+        )
+        self.assertEqual(cart["items"][1]["name"], "Watch")
+        self.assertEqual(cart["items"][1]["unit_price"], 600.00)
+        self.assertEqual(cart["items"][1]["line_total"], 1800.00)
+        self.assertEqual(cart["total"], 3300.00)
+
+    def test_view_cart_with_deleted_product(self):
+        product_service.delete_product(
+            self.admin, self.product_2.id, db_path=self.db_path
+        )
+        cart = cart_service.view_cart_with_products(
+            cart=self.cart_2, user=self.user_2, db_path=self.db_path
+        )
+        self.assertIsNone(cart["items"][1]["unit_price"])
+        self.assertEqual(cart["total"], 1500.00)
+
     def test_clean_cart(self):
         cart_with_product = self.cart_1
         cart_service.clean_cart(
@@ -108,5 +143,275 @@ class TestOrderService(unittest.TestCase):
                 cart=self.cart_1, user=self.user_1, db_path=self.db_path
             )
 
+    def test_place_order_reserves_stock(self):
+        product = product_service.add_product(
+            self.admin, "Phone", "Smartphone", 800.00, stock=5,
+            db_path=self.db_path
+        )
+        cart = cart_service.add_to_cart(
+            self.user_1, [(product.id, 2)], db_path=self.db_path
+        )
+        cart_service.place_order(cart, self.user_1, db_path=self.db_path)
+        self.assertEqual(
+            product_service.get_product_by_id(
+                product.id, db_path=self.db_path
+            ).stock,
+            3
+        )
+
+    def test_place_order_insufficient_stock(self):
+        phone = product_service.add_product(
+            self.admin, "Phone", "Smartphone", 800.00, stock=1,
+            db_path=self.db_path
+        )
+        tablet = product_service.add_product(
+            self.admin, "Tablet", "Drawing tablet", 400.00, stock=10,
+            db_path=self.db_path
+        )
+        cart = cart_service.add_to_cart(
+            self.user_1,
+            [(phone.id, 2), (tablet.id, 1)],
+            db_path=self.db_path
+        )
+        with self.assertRaises(cart_service.InsufficientStockError) as ctx:
+            cart_service.place_order(cart, self.user_1, db_path=self.db_path)
+        self.assertEqual(
+            ctx.exception.failures,
+            [{"product_id": phone.id, "requested": 2, "available": 1}]
+        )
+        # Nothing was reserved and the cart is left untouched.
+        self.assertEqual(
+            product_service.get_product_by_id(
+                tablet.id, db_path=self.db_path
+            ).stock,
+            10
+        )
+        cart_items = cart_service.view_cart(
+            cart, self.user_1, db_path=self.db_path
+        )
+        self.assertEqual(len(cart_items), 3)
+
+    def test_update_cart(self):
+        cart = cart_service.update_cart(
+            self.user_2,
+            set_items=[(self.product_1.id, 5)],
+            remove=[self.product_2.id],
+            db_path=self.db_path
+        )
+        self.assertEqual(cart.id, self.cart_2.id)
+        self.assertEqual(cart.items, {str(self.product_1.id): 5})
+        cart = cart_service.update_cart(
+            self.user_2, set_items=[(self.product_1.id, 0)],
+            db_path=self.db_path
+        )
+        self.assertEqual(cart.items, {})
+
+    def test_update_cart_replace(self):
+        cart = cart_service.update_cart(
+            self.user_2, replace=[(self.product_2.id, 1)],
+            db_path=self.db_path
+        )
+        self.assertEqual(cart.items, {str(self.product_2.id): 1})
+
+    def test_update_cart_is_all_or_nothing(self):
+        with self.assertRaises(cart_service.CartServiceError):
+            cart_service.update_cart(
+                self.user_2,
+                set_items=[(self.product_1.id, 7), (999, 1)],
+                db_path=self.db_path
+            )
+        cart_items = cart_service.view_cart(
+            self.cart_2, self.user_2, db_path=self.db_path
+        )
+        self.assertEqual(len(cart_items), 2)
+        self.assertEqual(cart_items[0]["product_quantity"], 1)
+
+    def test_update_cart_invalid_changes(self):
+        for changes in (
+            {},
+            {"set_items": [(self.product_1.id, -1)]},
+            {"set_items": [(self.product_1.id, 1)], "remove": [self.product_1.id]}
+        ):
+            with self.assertRaises(cart_service.CartServiceError):
+                cart_service.update_cart(
+                    self.user_1, db_path=self.db_path, **changes
+                )
+
+class TestCartWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.user_1 = user_service.register_user(
+            "user_1", "userpass", "regular", db_path=self.db_path
+        )
+        self.user_2 = user_service.register_user(
+            "user_2", "userpass", "regular", db_path=self.db_path
+        )
+        self.product = product_service.add_product(
+            self.admin, "Laptop", "Gaming laptop", 1500.00, db_path=self.db_path
+        )
+        # A long interval keeps the background thread out of the way.
+        self.write_behind = cart_service.enable_write_behind(
+            interval_ms=60000, db_path=self.db_path
+        )
+
+    def tearDown(self):
+        cart_service.disable_write_behind(db_path=self.db_path, flush=False)
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def stored_items(self, user):
+        conn = get_db_connection(self.db_path)
+        row = conn.execute(
+            "SELECT items FROM carts WHERE user_id = ?", (user.id,)
+        ).fetchone()
+        conn.close()
+        return json.loads(row["items"]) if row else None
+
+    def test_add_is_buffered_until_flush(self):
+        cart = cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 2)], db_path=self.db_path
+        )
+        self.assertEqual(cart.items, {str(self.product.id): 2})
+        # The cart row exists, but its contents are not written yet.
+        self.assertEqual(self.stored_items(self.user_1), {})
+        # Reads see the user's own unflushed changes.
+        cart_items = cart_service.view_cart(
+            cart, self.user_1, db_path=self.db_path
+        )
+        self.assertEqual(cart_items[0]["product_quantity"], 2)
+
+        self.write_behind.flush()
+        self.assertEqual(
+            self.stored_items(self.user_1), {str(self.product.id): 2}
+        )
+
+    def test_view_cart_with_products_sees_pending_changes(self):
+        cart = cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 2)], db_path=self.db_path
+        )
+        expanded = cart_service.view_cart_with_products(
+            cart, self.user_1, db_path=self.db_path
+        )
+        self.assertEqual(expanded["total"], 3000.00)
+
+    def test_mutations_are_coalesced(self):
+        for _ in range(3):
+            cart_service.add_to_cart(
+                self.user_1, [(self.product.id, 1)], db_path=self.db_path
+            )
+        cart_service.add_to_cart(
+            self.user_2, [(self.product.id, 5)], db_path=self.db_path
+        )
+        self.assertEqual(self.write_behind.flush(), 2)
+        self.assertEqual(self.write_behind.flushes, 1)
+        self.assertEqual(
+            self.stored_items(self.user_1), {str(self.product.id): 3}
+        )
+        self.assertEqual(
+            self.stored_items(self.user_2), {str(self.product.id): 5}
+        )
+
+    def test_place_order_flushes_user_cart(self):
+        cart = cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 4)], db_path=self.db_path
+        )
+        order = cart_service.place_order(
+            cart, self.user_1, db_path=self.db_path
+        )
+        order_products = json.loads(order.products)
+        self.assertEqual(order_products[0]["product_quantity"], 4)
+        self.assertIsNone(self.write_behind.get(self.user_1.id))
+        self.assertIsNone(self.stored_items(self.user_1))
+
+    def test_crash_loses_only_unflushed_changes(self):
+        cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 1)], db_path=self.db_path
+        )
+        self.write_behind.flush()
+        cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 1)], db_path=self.db_path
+        )
+        # Stopping without a flush is what a crash looks like.
+        cart_service.disable_write_behind(db_path=self.db_path, flush=False)
+        self.assertEqual(
+            self.stored_items(self.user_1), {str(self.product.id): 1}
+        )
+
+    def test_clean_cart_is_not_undone_by_flush(self):
+        cart = cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 1)], db_path=self.db_path
+        )
+        cart_service.clean_cart(cart, self.user_1, db_path=self.db_path)
+        self.assertEqual(self.write_behind.flush(), 0)
+        self.assertIsNone(self.stored_items(self.user_1))
+
+    def test_update_cart_applies_pending_adds_first(self):
+        cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 2)], db_path=self.db_path
+        )
+        product = product_service.add_product(
+            self.admin, "Watch", "Sports smartwatch", 600.00,
+            db_path=self.db_path
+        )
+        cart_service.update_cart(
+            self.user_1, set_items=[(product.id, 1)], db_path=self.db_path
+        )
+        self.write_behind.flush()
+        self.assertEqual(
+            self.stored_items(self.user_1),
+            {str(self.product.id): 2, str(product.id): 1}
+        )
+
+    def test_add_during_update_cart_is_kept(self):
+        cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 2)], db_path=self.db_path
+        )
+        repository = type(get_backend(self.db_path).carts)
+        set_items = repository.set_items
+        adder = threading.Thread(
+            target=cart_service.add_to_cart,
+            args=(self.user_1, [(self.product.id, 1)]),
+            kwargs={"db_path": self.db_path}
+        )
+
+        def set_items_during_add(carts, *args, **kwargs):
+            adder.start()
+            # Gives the add time to be buffered, unless it waits.
+            adder.join(0.1)
+            return set_items(carts, *args, **kwargs)
+
+        with mock.patch.object(repository, "set_items", set_items_during_add):
+            cart_service.update_cart(
+                self.user_1, set_items=[(self.product.id, 5)],
+                db_path=self.db_path
+            )
+        adder.join()
+        self.write_behind.flush()
+        # The add is applied after the update, not discarded with it.
+        self.assertEqual(
+            self.stored_items(self.user_1), {str(self.product.id): 6}
+        )
+
+    def test_background_flush(self):
+        cart_service.disable_write_behind(db_path=self.db_path)
+        cart_service.enable_write_behind(
+            interval_ms=10, db_path=self.db_path
+        )
+        cart_service.add_to_cart(
+            self.user_1, [(self.product.id, 3)], db_path=self.db_path
+        )
+        deadline = time.monotonic() + 2
+        while self.stored_items(self.user_1) == {}:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertEqual(
+            self.stored_items(self.user_1), {str(self.product.id): 3}
+        )
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import uuid
+from db.database import (
+    close_connections,
+    configure_replica,
+    get_db_connection,
+    get_read_connection,
+    init_db,
+    memory_db_uri,
+    restore_snapshot,
+    run_write,
+    shared_reads,
+    snapshot,
+    submit_write,
+    writer_stats
+)
+
+class TestDatabaseRouting(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def insert_user(self, username):
+        return run_write(
+            lambda conn: conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, "hash", "regular")
+            ).lastrowid,
+            self.db_path
+        )
+
+    def count_users(self, replica_ok=False):
+        conn = get_read_connection(self.db_path, replica_ok=replica_ok)
+        count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        conn.close()
+        return count
+
+    def test_read_connection_is_read_only(self):
+        conn = get_read_connection(self.db_path)
+        with self.assertRaises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM users")
+        conn.close()
+
+    def test_run_write_commits(self):
+        self.assertIsNotNone(self.insert_user("user_1"))
+        self.assertEqual(self.count_users(), 1)
+
+    def test_run_write_rolls_back_on_error(self):
+        def failing_write(conn):
+            conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                ("user_1", "hash", "regular")
+            )
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            run_write(failing_write, self.db_path)
+        self.assertEqual(self.count_users(), 0)
+
+    def test_queued_writes_are_group_committed(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_write(conn):
+            started.set()
+            release.wait()
+
+        # init_db's migrations already ran on the writer.
+        before = writer_stats(self.db_path)
+        # Keep the writer busy so the next jobs pile up in the queue.
+        blocker = submit_write(blocking_write, self.db_path)
+        started.wait()
+
+        def insert(username):
+            return lambda conn: conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, "hash", "regular")
+            ).lastrowid
+
+        def failing_write(conn):
+            insert("user_failed")(conn)
+            raise RuntimeError("boom")
+
+        futures = [
+            submit_write(insert(f"user_{i}"), self.db_path) for i in range(5)
+        ]
+        failed = submit_write(failing_write, self.db_path)
+        release.set()
+        blocker.result()
+        for future in futures:
+            self.assertIsNotNone(future.result())
+        with self.assertRaises(RuntimeError):
+            failed.result()
+        # The failing job only rolled back its own changes.
+        self.assertEqual(self.count_users(), 5)
+        after = writer_stats(self.db_path)
+        self.assertEqual(after["jobs"] - before["jobs"], 7)
+        self.assertEqual(after["batches"] - before["batches"], 2)
+
+    def test_nested_write(self):
+        def outer(conn):
+            return run_write(
+                lambda inner: inner.execute(
+                    "INSERT INTO users (username, password, role) "
+                    "VALUES (?, ?, ?)",
+                    ("user_1", "hash", "regular")
+                ).lastrowid,
+                self.db_path
+            )
+
+        self.assertIsNotNone(run_write(outer, self.db_path))
+        self.assertEqual(self.count_users(), 1)
+
+    def test_read_connections_are_pooled(self):
+        conn = get_read_connection(self.db_path)
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM users").fetchone()
+        conn.close()
+        # The same connection comes back, without the open snapshot.
+        reused = get_read_connection(self.db_path)
+        self.assertIs(reused, conn)
+        self.assertFalse(reused.in_transaction)
+        self.insert_user("user_1")
+        self.assertEqual(
+            reused.execute("SELECT COUNT(*) FROM users").fetchone()[0], 1
+        )
+        reused.close()
+        close_connections(self.db_path)
+        fresh = get_read_connection(self.db_path)
+        self.assertIsNot(fresh, conn)
+        fresh.close()
+
+    def test_shared_reads(self):
+        with shared_reads():
+            conn = get_read_connection(self.db_path)
+            conn.close()
+            self.assertIs(get_read_connection(self.db_path), conn)
+            self.assertTrue(conn.in_transaction)
+        # Returned to the pool when the block ends.
+        self.assertFalse(conn.in_transaction)
+        self.assertIs(get_read_connection(self.db_path), conn)
+        conn.close()
+
+    def test_shared_reads_see_one_snapshot(self):
+        with shared_reads():
+            self.assertEqual(self.count_users(), 0)
+            self.insert_user("user_1")
+            self.assertEqual(self.count_users(), 0)
+        self.assertEqual(self.count_users(), 1)
+
+    def test_replica_reads(self):
+        replica_dir = tempfile.mkdtemp()
+        replica_path = os.path.join(replica_dir, "replica.db")
+        try:
+            replica = configure_replica(
+                replica_path, refresh_seconds=3600, db_path=self.db_path
+            )
+            self.insert_user("user_1")
+            # The replica lags until its next refresh.
+            self.assertEqual(self.count_users(replica_ok=True), 0)
+            self.assertEqual(self.count_users(), 1)
+            replica.refresh()
+            self.assertEqual(self.count_users(replica_ok=True), 1)
+        finally:
+            close_connections(self.db_path)
+            os.unlink(replica_path)
+            os.rmdir(replica_dir)
+
+class TestMemoryDatabase(TestDatabaseRouting):
+    """Runs the routing tests on a shared-cache in-memory database."""
+    def setUp(self):
+        self.db_path = memory_db_uri(f"test-{uuid.uuid4().hex}")
+        init_db(self.db_path)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+
+    def test_replica_reads(self):
+        self.skipTest("Replicas are for file databases")
+
+    def test_shared_reads_see_one_snapshot(self):
+        self.skipTest("In-memory databases read uncommitted data")
+
+    def test_database_lives_until_closed(self):
+        self.insert_user("user_1")
+        # No connection stays open here, yet the data survives.
+        self.assertEqual(self.count_users(), 1)
+        close_connections(self.db_path)
+        conn = get_db_connection(self.db_path)
+        tables = conn.execute("SELECT name FROM sqlite_master").fetchall()
+        conn.close()
+        self.assertEqual(tables, [])
+
+    def test_snapshot_round_trip(self):
+        self.insert_user("user_1")
+        snapshot_dir = tempfile.mkdtemp()
+        snapshot_path = os.path.join(snapshot_dir, "snapshot.db")
+        other_db = memory_db_uri(f"test-{uuid.uuid4().hex}")
+        try:
+            snapshot(snapshot_path, self.db_path)
+            restore_snapshot(snapshot_path, other_db)
+            conn = get_read_connection(other_db)
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            conn.close()
+            self.assertEqual(count, 1)
+        finally:
+            close_connections(other_db)
+            os.unlink(snapshot_path)
+            os.rmdir(snapshot_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import unittest
+import tempfile
+from db.database import close_connections, init_db
+from src.services import idempotency_service
+
+class TestIdempotencyService(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_first_request_reserves_key(self):
+        record = idempotency_service.begin_request(
+            "key-1", "/cart/order", "fp", db_path=self.db_path
+        )
+        self.assertIsNone(record)
+        # A concurrent retry sees the reservation in progress.
+        record = idempotency_service.begin_request(
+            "key-1", "/cart/order", "fp", db_path=self.db_path
+        )
+        self.assertIsNotNone(record)
+        self.assertIsNone(record.status_code)
+
+    def test_completed_request_is_replayed(self):
+        idempotency_service.begin_request(
+            "key-1", "/cart/order", "fp", db_path=self.db_path
+        )
+        idempotency_service.complete_request(
+            "key-1", "/cart/order", 201, b'{"order_id": 1}',
+            db_path=self.db_path
+        )
+        record = idempotency_service.begin_request(
+            "key-1", "/cart/order", "fp", db_path=self.db_path
+        )
+        self.assertEqual(record.status_code, 201)
+        self.assertEqual(record.response_body, b'{"order_id": 1}')
+        # The same key in another scope is independent.
+        self.assertIsNone(
+            idempotency_service.begin_request(
+                "key-1", "/cart/add", "fp", db_path=self.db_path
+            )
+        )
+
+    def test_released_key_can_be_reused(self):
+        idempotency_service.begin_request(
+            "key-1", "/cart/order", "fp", db_path=self.db_path
+        )
+        idempotency_service.release_request(
+            "key-1", "/cart/order", db_path=self.db_path
+        )
+        self.assertIsNone(
+            idempotency_service.begin_request(
+                "key-1", "/cart/order", "fp", db_path=self.db_path
+            )
+        )
+
+    def test_expired_keys(self):
+        idempotency_service.begin_request(
+            "key-1", "/cart/order", "fp", ttl_seconds=-1,
+            db_path=self.db_path
+        )
+        idempotency_service.begin_request(
+            "key-2", "/cart/order", "fp", ttl_seconds=-1,
+            db_path=self.db_path
+        )
+        # An expired key is treated as new.
+        self.assertIsNone(
+            idempotency_service.begin_request(
+                "key-1", "/cart/order", "fp", db_path=self.db_path
+            )
+        )
+        self.assertEqual(
+            idempotency_service.purge_expired(db_path=self.db_path), 1
+        )
+
+    def test_complete_unreserved_key(self):
+        with self.assertRaises(idempotency_service.IdempotencyServiceError):
+            idempotency_service.complete_request(
+                "missing", "/cart/order", 201, b"{}", db_path=self.db_path
+            )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Modules used by CLI jobs and background workers, without the web app.
+HEADLESS_MODULES = [
+    "db.database",
+    "db.repository",
+    "src.services.backup_service",
+    "src.services.cart_service",
+    "src.services.idempotency_service",
+    "src.services.order_service",
+    "src.services.product_service",
+    "src.services.user_service",
+]
+# Only the app factory may import these.
+WEB_PACKAGES = ("flask", "flasgger", "werkzeug", "jinja2", "jsonschema")
+# Cumulative import time of HEADLESS_MODULES, in microseconds. It is
+# about 100ms today; the margin absorbs slow CI machines.
+IMPORT_BUDGET_US = 400_000
+
+def import_times(modules):
+    """
+    Imports modules in a fresh interpreter with -X importtime.
+
+    :return: Tuple of (names of all imported modules, dictionary of
+        top-level imports to their cumulative import time in us).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "; ".join(f"import {module}" for module in modules)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    names = []
+    top_level = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        names.append(name.strip())
+        # Nested imports are indented; their time is in their parent's.
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative)
+    return names, top_level
+
+class TestImportBudget(unittest.TestCase):
+    def test_headless_modules_skip_the_web_stack(self):
+        names, _ = import_times(HEADLESS_MODULES)
+        web = [name for name in names if name.split(".")[0] in WEB_PACKAGES]
+        self.assertEqual(web, [])
+
+    def test_headless_import_time_budget(self):
+        _, top_level = import_times(HEADLESS_MODULES)
+        total = sum(
+            top_level.get(module, 0) for module in HEADLESS_MODULES
+        )
+        self.assertLess(total, IMPORT_BUDGET_US)
+
+if __name__ == '__main__':
+    unittest.main()
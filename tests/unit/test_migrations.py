@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from db.database import close_connections, get_read_connection, init_db
+from db.migrations import (
+    MIGRATIONS,
+    migrate,
+    pending_migrations,
+    schema_version
+)
+from db.repository import get_backend
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_init_db_applies_every_migration(self):
+        self.assertEqual(schema_version(self.db_path), MIGRATIONS[-1].version)
+        self.assertEqual(pending_migrations(self.db_path), [])
+        self.assertEqual(migrate(self.db_path), [])
+
+    def test_init_db_skips_ddl_when_current(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP TABLE idempotency_keys")
+        conn.commit()
+        conn.close()
+        init_db(self.db_path)
+        conn = get_read_connection(self.db_path)
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )]
+        conn.close()
+        self.assertNotIn("idempotency_keys", tables)
+
+    def test_rerun_after_crash_before_version_bump(self):
+        get_backend(self.db_path).products.add(
+            "Mouse", "Wireless mouse", 20.0, None
+        )
+        for version in (6, 5, 2, 0):
+            # As if the process died after the schema steps committed.
+            conn = sqlite3.connect(self.db_path)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.close()
+            self.assertEqual(
+                migrate(self.db_path),
+                list(range(version + 1, MIGRATIONS[-1].version + 1))
+            )
+            self.assertEqual(
+                schema_version(self.db_path), MIGRATIONS[-1].version
+            )
+        conn = get_read_connection(self.db_path)
+        changes = conn.execute(
+            "SELECT COUNT(*) FROM catalog_changes"
+        ).fetchone()[0]
+        conn.close()
+        # The catalog isn't logged again.
+        self.assertEqual(changes, 1)
+
+    def test_backfills_order_items_in_batches(self):
+        # Roll the database back to the base schema with JSON-only orders.
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP TABLE order_items")
+        conn.execute("DROP INDEX idx_carts_user_id")
+        conn.execute("DROP INDEX idx_carts_updated_at")
+        conn.execute("ALTER TABLE carts DROP COLUMN created_at")
+        conn.execute("ALTER TABLE carts DROP COLUMN updated_at")
+        conn.execute("INSERT INTO carts (user_id, items) VALUES (1, '{}')")
+        conn.execute(
+            "INSERT INTO products (id, name, description, price)"
+            " VALUES (101, 'Mouse', 'Wireless mouse', 20.0)"
+        )
+        conn.executemany(
+            "INSERT INTO orders (user_id, created_at, products)"
+            " VALUES (?, ?, ?)",
+            [
+                (i % 3 + 1, "2025-01-01T00:00:00", json.dumps([
+                    {"product_id": 101, "product_quantity": i},
+                    {"product_id": 102, "product_quantity": 1}
+                ]))
+                for i in range(1, 8)
+            ]
+        )
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(migrate(self.db_path, batch_size=2), [1, 2, 3, 4, 5, 6, 7])
+        conn = get_read_connection(self.db_path)
+        rows = conn.execute(
+            "SELECT product_id, COUNT(*), SUM(quantity), MAX(unit_price),"
+            " MIN(day), MAX(day) FROM order_items"
+            " GROUP BY product_id ORDER BY product_id"
+        ).fetchall()
+        conn.close()
+        # 102 doesn't exist, so its price isn't known.
+        self.assertEqual([tuple(row) for row in rows], [
+            (101, 7, 28, 20.0, 20250101, 20250101),
+            (102, 7, 7, None, 20250101, 20250101)
+        ])
+        # The existing catalog opens the change log.
+        conn = get_read_connection(self.db_path)
+        changes = conn.execute(
+            "SELECT seq, product_id, change FROM catalog_changes"
+        ).fetchall()
+        conn.close()
+        self.assertEqual([tuple(row) for row in changes], [(1, 101, "add")])
+        conn = get_read_connection(self.db_path)
+        cart = conn.execute(
+            "SELECT created_at, updated_at FROM carts"
+        ).fetchone()
+        conn.close()
+        self.assertIsNotNone(cart["created_at"])
+        self.assertEqual(cart["created_at"], cart["updated_at"])
+        self.assertEqual(schema_version(self.db_path), 7)
+
+if __name__ == '__main__':
+    unittest.main()
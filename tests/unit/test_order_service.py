@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from db.database import close_connections, init_db, run_write
+from src.services import (
+    cart_service,
+    order_service,
+    product_service,
+    user_service
+)
+
+class TestOrderReports(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.user = user_service.register_user(
+            "user_1", "userpass", "regular", db_path=self.db_path
+        )
+        self.product = product_service.add_product(
+            self.admin, "Laptop", "Gaming laptop", 1500.00, db_path=self.db_path
+        )
+        for created_at, quantity in (
+            ("2025-01-10T12:00:00", 2),
+            ("2025-02-10T12:00:00", 5),
+        ):
+            cart = cart_service.add_to_cart(
+                self.user, [(self.product.id, quantity)], db_path=self.db_path
+            )
+            order = cart_service.place_order(
+                cart, self.user, db_path=self.db_path
+            )
+            run_write(
+                lambda conn: conn.execute(
+                    "UPDATE orders SET created_at = ? WHERE id = ?",
+                    (created_at, order.id)
+                ),
+                self.db_path
+            )
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_get_orders_in_range(self):
+        orders = order_service.get_orders(
+            self.admin, since="2025-02-01", db_path=self.db_path
+        )
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0].created_at, "2025-02-10T12:00:00")
+
+    def test_report(self):
+        report = order_service.get_orders_report(
+            self.admin, until="2025-02-01", db_path=self.db_path
+        )
+        self.assertEqual(report["order_count"], 1)
+        self.assertEqual(report["customer_count"], 1)
+        self.assertEqual(report["units_sold"], 2)
+        report = order_service.get_orders_report(
+            self.admin, db_path=self.db_path
+        )
+        self.assertEqual(report["units_sold"], 7)
+
+    def test_regular_user_cannot_see_orders(self):
+        with self.assertRaises(order_service.OrderServiceError):
+            order_service.get_orders(self.user, db_path=self.db_path)
+        with self.assertRaises(order_service.OrderServiceError):
+            order_service.get_orders_report(self.user, db_path=self.db_path)
+
+if __name__ == '__main__':
+    unittest.main()
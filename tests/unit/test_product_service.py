@@ -1,7 +1,9 @@
 import os
+import threading
+import time
 import unittest
 import tempfile
-from db.database import init_db
+from db.database import close_connections, init_db
 from src.services import user_service, product_service
 
 class TestProductService(unittest.TestCase):
@@ -17,6 +19,7 @@ class TestProductService(unittest.TestCase):
         )
 
     def tearDown(self):
+        close_connections(self.db_path)
         os.close(self.db_fd)
         os.unlink(self.db_path)
 
@@ -61,5 +64,120 @@ class TestProductService(unittest.TestCase):
             product_service.get_product_by_id(product.id, db_path=self.db_path)
         )
 
+    def test_product_stock(self):
+        product = product_service.add_product(
+            self.admin, "Phone", "Smartphone", 800.00, stock=10,
+            db_path=self.db_path
+        )
+        self.assertEqual(product.stock, 10)
+        updated_product = product_service.edit_product(
+            self.admin, product.id, stock=4, db_path=self.db_path
+        )
+        self.assertEqual(updated_product.stock, 4)
+        # Products without stock are not tracked.
+        self.assertIsNone(self.mock_add_product().stock)
+        # db_path keeps its position from before stock existed.
+        product = product_service.add_product(
+            self.admin, "Phone", "Smartphone", 800.00, self.db_path
+        )
+        self.assertIsNone(product.stock)
+        with self.assertRaises(product_service.ProductServiceError):
+            product_service.edit_product(
+                self.admin, product.id, stock=-1, db_path=self.db_path
+            )
+
+    def test_get_products_by_ids(self):
+        first = self.mock_add_product()
+        second = self.mock_add_product()
+        products, missing = product_service.get_products_by_ids(
+            [second.id, 999, first.id, second.id], db_path=self.db_path
+        )
+        self.assertEqual([p.id for p in products], [second.id, first.id])
+        self.assertEqual(missing, [999])
+        too_many = list(range(product_service.MAX_PRODUCT_IDS + 1))
+        for product_ids in ([], too_many):
+            with self.assertRaises(product_service.ProductServiceError):
+                product_service.get_products_by_ids(
+                    product_ids, db_path=self.db_path
+                )
+
+    def test_catalog_version_bumped_on_changes(self):
+        version = product_service.get_catalog_version(db_path=self.db_path)
+        product = self.mock_add_product()
+        product_service.edit_product(
+            self.admin, product.id, price=1400.00, db_path=self.db_path
+        )
+        product_service.delete_product(
+            self.admin, product.id, db_path=self.db_path
+        )
+        self.assertEqual(
+            product_service.get_catalog_version(db_path=self.db_path),
+            version + 3
+        )
+
+    def test_catalog_snapshot(self):
+        product = self.mock_add_product()
+        version, products = product_service.get_catalog_snapshot(
+            db_path=self.db_path
+        )
+        self.assertEqual(
+            version,
+            product_service.get_catalog_version(db_path=self.db_path)
+        )
+        self.assertEqual([p.id for p in products], [product.id])
+
+    def test_catalog_changes(self):
+        product = self.mock_add_product()
+        product_service.edit_product(
+            self.admin, product.id, price=1400.00, db_path=self.db_path
+        )
+        product_service.delete_product(
+            self.admin, product.id, db_path=self.db_path
+        )
+        changes = product_service.get_catalog_changes(db_path=self.db_path)
+        self.assertEqual(
+            [(c.seq, c.product_id, c.change, c.price) for c in changes],
+            [
+                (1, product.id, "add", 1500.00),
+                (2, product.id, "edit", 1400.00),
+                (3, product.id, "delete", None)
+            ]
+        )
+        self.assertEqual(
+            [c.seq for c in product_service.get_catalog_changes(
+                1, limit=1, db_path=self.db_path
+            )],
+            [2]
+        )
+        self.assertEqual(
+            product_service.get_catalog_changes(3, db_path=self.db_path), []
+        )
+        with self.assertRaises(product_service.ProductServiceError):
+            product_service.get_catalog_changes(-1, db_path=self.db_path)
+        with self.assertRaises(product_service.ProductServiceError):
+            product_service.get_catalog_changes(
+                limit=product_service.MAX_CHANGES + 1, db_path=self.db_path
+            )
+
+    def test_catalog_changes_long_poll(self):
+        timer = threading.Timer(0.1, self.mock_add_product)
+        timer.start()
+        began = time.monotonic()
+        changes = product_service.get_catalog_changes(
+            wait=5.0, db_path=self.db_path
+        )
+        timer.join()
+        self.assertEqual([c.change for c in changes], ["add"])
+        # Woken by the change, not by the poll interval
+        self.assertLess(
+            time.monotonic() - began, product_service.CHANGES_POLL_SECONDS
+        )
+        self.assertEqual(
+            product_service.get_catalog_changes(
+                1, wait=0.05, db_path=self.db_path
+            ),
+            []
+        )
+
 if __name__ == '__main__':
     unittest.main()
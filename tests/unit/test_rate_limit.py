@@ -0,0 +1,101 @@
+import os
+import tempfile
+import threading
+import unittest
+from flask import Flask
+from src.middleware.rate_limit import (
+    MemoryBucketStore,
+    SQLiteBucketStore,
+    init_rate_limiting
+)
+
+class BucketStoreContract:
+    def test_burst_then_refill(self):
+        limit = (2.0, 3.0)
+        for _ in range(3):
+            self.assertEqual(self.store.take("a", limit, 100.0), 0)
+        # Empty: the next token is due in half a second.
+        self.assertAlmostEqual(self.store.take("a", limit, 100.0), 0.5)
+        self.assertEqual(self.store.take("b", limit, 100.0), 0)
+        self.assertEqual(self.store.take("a", limit, 100.5), 0)
+        self.assertGreater(self.store.take("a", limit, 100.5), 0)
+
+class TestMemoryBucketStore(BucketStoreContract, unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryBucketStore()
+
+    def test_evicted_bucket_comes_back_full(self):
+        store = MemoryBucketStore(max_buckets=1)
+        store.take("a", (1.0, 1.0), 100.0)
+        store.take("b", (1.0, 1.0), 100.0)
+        self.assertEqual(store.take("a", (1.0, 1.0), 100.0), 0)
+
+class TestSQLiteBucketStore(BucketStoreContract, unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.store = SQLiteBucketStore(self.db_path)
+
+    def tearDown(self):
+        os.close(self.db_fd)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def test_buckets_are_shared(self):
+        other = SQLiteBucketStore(self.db_path)
+        self.assertEqual(self.store.take("a", (1.0, 1.0), 100.0), 0)
+        self.assertGreater(other.take("a", (1.0, 1.0), 100.0), 0)
+
+class TestAdmissionControl(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update({
+            "RATE_LIMIT_ROUTES": {"/login": (0.5, 2)},
+            "CONCURRENCY_LIMITS": {"/slow": 1},
+            "CONCURRENCY_QUEUE_TIMEOUT": 0.01
+        })
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+        @self.app.route("/login")
+        def login():
+            return "ok"
+
+        @self.app.route("/slow")
+        def slow():
+            self.started.set()
+            self.release.wait(5)
+            return "ok"
+
+        init_rate_limiting(self.app)
+        self.client = self.app.test_client()
+
+    def test_rate_limited_route_returns_429(self):
+        self.assertEqual(self.client.get("/login").status_code, 200)
+        self.assertEqual(self.client.get("/login").status_code, 200)
+        response = self.client.get("/login")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "2")
+        # Other clients have their own bucket.
+        response = self.client.get(
+            "/login", environ_base={"REMOTE_ADDR": "10.0.0.2"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_busy_route_sheds_load(self):
+        first = threading.Thread(
+            target=lambda: self.app.test_client().get("/slow")
+        )
+        first.start()
+        self.started.wait(5)
+        try:
+            response = self.client.get("/slow")
+            self.assertEqual(response.status_code, 503)
+            self.assertIn("Retry-After", response.headers)
+        finally:
+            self.release.set()
+            first.join()
+        self.assertEqual(self.client.get("/slow").status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+from array import array
+from unittest import mock
+from db import related_products
+from db.database import close_connections, get_read_connection, init_db
+from src.services import cart_service, product_service, user_service
+
+class TestRelatedProducts(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.user = user_service.register_user(
+            "user_1", "userpass", "regular", db_path=self.db_path
+        )
+        self.products = [
+            product_service.add_product(
+                self.admin, f"Product {i}", "", 10.0, db_path=self.db_path
+            ) for i in range(4)
+        ]
+
+    def tearDown(self):
+        related_products.stop_updates(self.db_path)
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def place_order(self, *indexes):
+        cart = cart_service.add_to_cart(
+            self.user,
+            [(self.products[i].id, 1) for i in indexes],
+            db_path=self.db_path
+        )
+        return cart_service.place_order(cart, self.user, db_path=self.db_path)
+
+    def related(self, index, limit=10):
+        related = product_service.get_related_products(
+            self.products[index].id, limit, db_path=self.db_path
+        )
+        return [
+            (self.products.index(product), orders)
+            for product, orders in related
+        ]
+
+    def pairs(self):
+        conn = get_read_connection(self.db_path)
+        pairs = conn.execute("SELECT COUNT(*) FROM product_pairs").fetchone()
+        conn.close()
+        return pairs[0]
+
+    def test_count_pairs(self):
+        order_ids = array("q", [1, 1, 1, 2, 2, 3])
+        product_ids = array("q", [7, 8, 9, 7, 8, 9])
+        expected = {
+            (7, 8): 2, (8, 7): 2,
+            (7, 9): 1, (9, 7): 1,
+            (8, 9): 1, (9, 8): 1
+        }
+        self.assertEqual(
+            related_products.count_pairs(order_ids, product_ids), expected
+        )
+        with mock.patch.object(related_products, "USE_NUMPY", False):
+            self.assertEqual(
+                related_products.count_pairs(order_ids, product_ids),
+                expected
+            )
+        self.assertEqual(
+            related_products.count_pairs(array("q", [1]), array("q", [7])),
+            {}
+        )
+
+    def test_update_counts_new_orders_only(self):
+        self.place_order(0, 1, 2)
+        self.place_order(0, 1)
+        self.place_order(3)
+        stats = related_products.update(self.db_path, batch_size=2)
+        self.assertEqual(stats, {"orders": 3, "pairs": 8, "reranked": 3})
+        self.assertEqual(self.related(0), [(1, 2), (2, 1)])
+        self.assertEqual(self.related(3), [])
+
+        # Nothing new
+        self.assertEqual(
+            related_products.update(self.db_path),
+            {"orders": 0, "pairs": 0, "reranked": 0}
+        )
+        self.place_order(0, 2)
+        self.place_order(0, 2)
+        related_products.update(self.db_path)
+        self.assertEqual(self.related(0), [(2, 3), (1, 2)])
+        self.assertEqual(self.related(0, limit=1), [(2, 3)])
+
+    def test_top_k_and_rebuild(self):
+        self.place_order(0, 1, 2, 3)
+        self.place_order(0, 3)
+        related_products.update(self.db_path, top_k=1)
+        self.assertEqual(self.related(0), [(3, 2)])
+        # The whole row is kept, only the ranking is cut.
+        self.assertEqual(self.pairs(), 12)
+
+        related_products.rebuild(self.db_path, top_k=2)
+        self.assertEqual(self.related(0), [(3, 2), (1, 1)])
+        self.assertEqual(self.pairs(), 12)
+
+    def test_deleted_products_are_not_ranked(self):
+        self.place_order(0, 1)
+        self.place_order(0, 1)
+        self.place_order(0, 2)
+        self.place_order(0, 3)
+        related_products.update(self.db_path, top_k=2)
+        self.assertEqual(self.related(0), [(1, 2), (2, 1)])
+
+        product_service.delete_product(
+            self.admin, self.products[1].id, db_path=self.db_path
+        )
+        stats = related_products.update(self.db_path, top_k=2)
+        # Only the products that ranked it, not the whole catalog.
+        self.assertEqual(stats["reranked"], 1)
+        self.assertEqual(self.related(0), [(2, 1), (3, 1)])
+
+    def test_unknown_product(self):
+        self.assertIsNone(
+            product_service.get_related_products(999, db_path=self.db_path)
+        )
+        with self.assertRaises(product_service.ProductServiceError):
+            product_service.get_related_products(
+                self.products[0].id, 0, db_path=self.db_path
+            )
+
+    def test_background_updates(self):
+        self.place_order(0, 1)
+        updater = related_products.start_updates(0.01, db_path=self.db_path)
+        for _ in range(200):
+            if self.related(0):
+                break
+            updater._stop.wait(0.01)
+        related_products.stop_updates(self.db_path)
+        self.assertEqual(self.related(0), [(1, 1)])
+
+    def test_background_updates_survive_errors(self):
+        self.place_order(0, 1)
+        update = related_products.update
+        calls = []
+
+        def failing_once(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise ValueError("Bad order data")
+            return update(*args)
+
+        with mock.patch.object(related_products, "update", failing_once), \
+                self.assertLogs(related_products.logger, "ERROR"):
+            updater = related_products.start_updates(
+                0.01, db_path=self.db_path
+            )
+            for _ in range(200):
+                if self.related(0):
+                    break
+                updater._stop.wait(0.01)
+            related_products.stop_updates(self.db_path)
+        self.assertEqual(self.related(0), [(1, 1)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+import os
+import tempfile
+import time
+import unittest
+from db import related_products
+from db.database import init_db
+from db.memory_backend import MemoryBackend
+from db.repository import (
+    DuplicateError,
+    InsufficientStock,
+    NotFoundError,
+    get_backend,
+    register_backend,
+    unregister_backend,
+    utc_timestamp
+)
+from src.models import Cart
+from src.services import cart_service, product_service, user_service
+
+class BackendContract:
+    """
+    Behaviour every storage backend must have; mixed into one TestCase
+    per backend.
+    """
+    def test_users(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        self.assertEqual(self.backend.users.get_by_id(user.id), user)
+        self.assertEqual(self.backend.users.get_by_username("alice"), user)
+        self.assertIsNone(self.backend.users.get_by_username("bob"))
+        with self.assertRaises(DuplicateError):
+            self.backend.users.add("alice", "hash", "regular")
+
+    def test_products_bump_catalog_version(self):
+        version = self.backend.products.catalog_version()
+        product = self.backend.products.add("Laptop", "Gaming", 1500.0, 3)
+        updated = self.backend.products.update(product.id, price=1400.0)
+        self.assertEqual(updated.name, "Laptop")
+        self.assertEqual(updated.price, 1400.0)
+        self.assertEqual(updated.stock, 3)
+        self.assertEqual(self.backend.products.catalog_version(), version + 2)
+        self.assertEqual(
+            self.backend.products.find_missing([product.id, 999]), [999]
+        )
+        self.assertEqual(
+            self.backend.products.get_many([999, product.id]),
+            {product.id: self.backend.products.get(product.id)}
+        )
+        self.backend.products.delete(product.id)
+        self.assertIsNone(self.backend.products.get(product.id))
+        with self.assertRaises(NotFoundError):
+            self.backend.products.delete(product.id)
+        self.assertEqual(
+            self.backend.products.catalog_snapshot(),
+            (version + 3, [])
+        )
+        changes = self.backend.products.changes(0, 10)
+        self.assertEqual(
+            [(c.change, c.product_id, c.name, c.price) for c in changes],
+            [
+                ("add", product.id, "Laptop", 1500.0),
+                ("edit", product.id, "Laptop", 1400.0),
+                ("delete", product.id, None, None)
+            ]
+        )
+        self.assertEqual([c.seq for c in changes], [1, 2, 3])
+        self.assertEqual(
+            self.backend.products.changes(changes[0].seq, 1), changes[1:2]
+        )
+
+    def test_carts(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        product = self.backend.products.add("Laptop", "Gaming", 10.0, None)
+        cart = self.backend.carts.add_items(user.id, [(product.id, 2)])
+        cart = self.backend.carts.add_items(user.id, [(product.id, 1)])
+        self.assertEqual(cart.items, {str(product.id): 3})
+        self.assertEqual(self.backend.carts.get_or_create(user.id).id, cart.id)
+        with self.assertRaises(NotFoundError):
+            self.backend.carts.add_items(user.id, [(999, 1)])
+        lines, total = self.backend.carts.get_priced(user.id, cart.id)
+        self.assertEqual(lines[0]["line_total"], 30.0)
+        self.assertEqual(total, 30.0)
+        cart.items = {str(product.id): 5, "999": 1}
+        self.backend.carts.save_items([cart])
+        lines, total = self.backend.carts.get_priced(user.id, cart.id)
+        self.assertEqual(total, 50.0)
+        self.assertIsNone(lines[1]["unit_price"])
+        self.backend.carts.delete(user.id, cart.id)
+        self.assertIsNone(self.backend.carts.get(user.id, cart.id))
+        # Saving a deleted cart doesn't bring it back.
+        self.backend.carts.save_items([cart])
+        self.assertIsNone(self.backend.carts.get(user.id, cart.id))
+
+    def test_cart_set_items(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        laptop = self.backend.products.add("Laptop", "Gaming", 10.0, None)
+        watch = self.backend.products.add("Watch", "Sports", 5.0, None)
+        cart = self.backend.carts.set_items(user.id, [(laptop.id, 2)])
+        cart = self.backend.carts.set_items(
+            user.id, [(laptop.id, 0), (watch.id, 4)]
+        )
+        self.assertEqual(cart.items, {str(watch.id): 4})
+        with self.assertRaises(NotFoundError):
+            self.backend.carts.set_items(user.id, [(laptop.id, 1), (999, 1)])
+        cart = self.backend.carts.set_items(
+            user.id, [(laptop.id, 1)], replace=True
+        )
+        self.assertEqual(cart.items, {str(laptop.id): 1})
+        self.assertEqual(
+            self.backend.carts.get(user.id, cart.id).items, cart.items
+        )
+
+    def test_carts_expire(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        other = self.backend.users.add("bob", "hash", "regular")
+        product = self.backend.products.add("Laptop", "Gaming", 10.0, None)
+        full = self.backend.carts.add_items(user.id, [(product.id, 1)])
+        empty = self.backend.carts.get_or_create(other.id)
+        past, future = utc_timestamp(0), utc_timestamp(time.time() + 60)
+        self.assertEqual(self.backend.carts.delete_expired(past, past, 10), 0)
+        self.assertEqual(
+            self.backend.carts.delete_expired(past, future, 10), 1
+        )
+        self.assertIsNone(self.backend.carts.get(other.id, empty.id))
+        self.assertEqual(
+            self.backend.carts.delete_expired(future, past, 10), 1
+        )
+        self.assertIsNone(self.backend.carts.get(user.id, full.id))
+
+    def test_orders_reserve_stock(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        product = self.backend.products.add("Laptop", "Gaming", 10.0, 2)
+        cart = self.backend.carts.add_items(user.id, [(product.id, 3)])
+        with self.assertRaises(InsufficientStock) as ctx:
+            self.backend.orders.place(user.id, cart.id, "2025-01-01T00:00:00")
+        self.assertEqual(ctx.exception.failures[0]["available"], 2)
+        self.backend.carts.save_items([
+            Cart(id=cart.id, user_id=user.id, items={str(product.id): 2})
+        ])
+        order = self.backend.orders.place(
+            user.id, cart.id, "2025-01-01T00:00:00"
+        )
+        self.assertEqual(self.backend.products.get(product.id).stock, 0)
+        self.assertIsNone(self.backend.carts.get(user.id, cart.id))
+        with self.assertRaises(NotFoundError):
+            self.backend.orders.place(user.id, cart.id, "2025-01-02T00:00:00")
+        self.assertEqual(
+            [o.id for o in self.backend.orders.list(since="2025-01-01")],
+            [order.id]
+        )
+        self.assertEqual(self.backend.orders.list(until="2025-01-01"), [])
+        self.assertEqual(
+            sum(shard["units_sold"] for shard in self.backend.orders.report()),
+            2
+        )
+        lines = [
+            line for batch in self.backend.orders.line_batches()
+            for line in batch
+        ]
+        self.assertEqual(lines, [(order.id, 20250101, product.id, 2, 10.0)])
+        self.assertEqual(
+            self.backend.orders.product_sales(), {product.id: (2, 20.0)}
+        )
+        self.assertEqual(
+            self.backend.orders.daily_sales(), {20250101: (1, 20.0)}
+        )
+
+    def test_orders_reject_non_positive_quantities(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        product = self.backend.products.add("Laptop", "Gaming", 10.0, 1)
+        cart = self.backend.carts.get_or_create(user.id)
+        self.backend.carts.save_items([
+            Cart(id=cart.id, user_id=user.id, items={str(product.id): -5})
+        ])
+        with self.assertRaises(ValueError):
+            self.backend.orders.place(user.id, cart.id, "2025-01-01T00:00:00")
+        self.assertEqual(self.backend.products.get(product.id).stock, 1)
+        self.assertEqual(self.backend.orders.list(), [])
+
+    def test_related_products(self):
+        user = self.backend.users.add("alice", "hash", "regular")
+        laptop = self.backend.products.add("Laptop", "Gaming", 10.0, None)
+        mouse = self.backend.products.add("Mouse", "Wireless", 2.0, None)
+        pad = self.backend.products.add("Pad", "Mouse pad", 1.0, None)
+        for basket in ([laptop, mouse, pad], [laptop, mouse]):
+            cart = self.backend.carts.add_items(
+                user.id, [(product.id, 1) for product in basket]
+            )
+            self.backend.orders.place(user.id, cart.id, "2025-01-01T00:00:00")
+        self.update_related()
+        self.assertEqual(
+            [(p.id, orders) for p, orders in
+             self.backend.products.related(laptop.id, 10)],
+            [(mouse.id, 2), (pad.id, 1)]
+        )
+        self.assertEqual(
+            [p.id for p, _ in self.backend.products.related(pad.id, 1)],
+            [laptop.id]
+        )
+        self.backend.products.delete(mouse.id)
+        self.assertEqual(
+            [p.id for p, _ in self.backend.products.related(laptop.id, 10)],
+            [pad.id]
+        )
+
+    def test_idempotency_keys(self):
+        keys = self.backend.idempotency
+        self.assertIsNone(keys.begin("k", "/cart/add", "fp", 100.0, 10.0))
+        record = keys.begin("k", "/cart/add", "fp", 101.0, 10.0)
+        self.assertIsNone(record.status_code)
+        self.assertTrue(keys.complete("k", "/cart/add", 201, b"{}"))
+        record = keys.begin("k", "/cart/add", "fp", 102.0, 10.0)
+        self.assertEqual(record.response_body, b"{}")
+        self.assertFalse(keys.complete("other", "/cart/add", 201, b"{}"))
+        self.assertEqual(keys.purge(200.0), 1)
+
+class TestSQLiteBackend(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.backend = get_backend(self.db_path)
+
+    def update_related(self):
+        related_products.update(self.db_path)
+
+    def tearDown(self):
+        unregister_backend(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+class TestMemoryBackend(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.db_path = "memory-test"
+        self.backend = MemoryBackend()
+        register_backend(self.backend, self.db_path)
+
+    def update_related(self):
+        # Counted on every read
+        pass
+
+    def tearDown(self):
+        unregister_backend(self.db_path)
+
+    def test_services_use_registered_backend(self):
+        admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        product = product_service.add_product(
+            admin, "Laptop", "Gaming laptop", 1500.00, stock=1,
+            db_path=self.db_path
+        )
+        cart = cart_service.add_to_cart(
+            admin, [(product.id, 1)], db_path=self.db_path
+        )
+        cart_service.place_order(cart, admin, db_path=self.db_path)
+        self.assertEqual(self.backend.products.get(product.id).stock, 0)
+
+if __name__ == '__main__':
+    unittest.main()
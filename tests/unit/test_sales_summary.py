@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from db import sales_summary
+from db.database import (
+    close_connections,
+    get_read_connection,
+    init_db,
+    run_write
+)
+from src.services import cart_service, product_service, user_service
+
+class TestSalesSummary(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.user = user_service.register_user(
+            "user_1", "userpass", "regular", db_path=self.db_path
+        )
+        self.product = product_service.add_product(
+            self.admin, "Mouse", "Wireless mouse", 20.00, db_path=self.db_path
+        )
+
+    def tearDown(self):
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def place_order(self, quantity):
+        cart = cart_service.add_to_cart(
+            self.user, [(self.product.id, quantity)], db_path=self.db_path
+        )
+        return cart_service.place_order(cart, self.user, db_path=self.db_path)
+
+    def summaries(self):
+        conn = get_read_connection(self.db_path)
+        products = [tuple(row) for row in conn.execute(
+            "SELECT product_id, quantity, revenue FROM product_sales"
+        )]
+        days = [tuple(row) for row in conn.execute(
+            "SELECT orders, revenue FROM daily_sales"
+        )]
+        conn.close()
+        return products, days
+
+    def test_checkout_updates_summaries(self):
+        self.place_order(2)
+        self.place_order(3)
+        products, days = self.summaries()
+        self.assertEqual(products, [(self.product.id, 5, 100.0)])
+        self.assertEqual(days, [(2, 100.0)])
+        self.assertEqual(sales_summary.check(self.db_path), [])
+
+    def test_check_and_rebuild(self):
+        order = self.place_order(2)
+        run_write(
+            lambda conn: conn.execute(
+                "DELETE FROM order_items WHERE order_id = ?", (order.id,)
+            ),
+            self.db_path
+        )
+        differences = sales_summary.check(self.db_path)
+        self.assertEqual(
+            {difference["table"] for difference in differences},
+            {"product_sales", "daily_sales"}
+        )
+        self.assertEqual(differences[0]["expected"], None)
+        self.assertEqual(differences[0]["actual"], (2, 40.0))
+
+        sales_summary.rebuild(self.db_path)
+        self.assertEqual(sales_summary.check(self.db_path), [])
+        self.assertEqual(self.summaries(), ([], []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+import json
+import os
+import tempfile
+import unittest
+from db import related_products, sales_summary
+from db.database import (
+    close_connections,
+    get_read_connection,
+    init_db,
+    run_write
+)
+from db.sharding import (
+    configure_sharding,
+    disable_sharding,
+    jump_hash,
+    rebalance,
+    shard_path_for
+)
+from src.services import (
+    analytics_service,
+    cart_service,
+    order_service,
+    product_service,
+    user_service
+)
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        init_db(self.db_path)
+        self.shards = [tempfile.mkstemp() for _ in range(3)]
+        self.shard_paths = [path for _, path in self.shards]
+        self.admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        self.users = [
+            user_service.register_user(
+                f"user_{i}", "userpass", "regular", db_path=self.db_path
+            ) for i in range(8)
+        ]
+        self.product = product_service.add_product(
+            self.admin, "Laptop", "Gaming laptop", 1500.00, stock=100,
+            db_path=self.db_path
+        )
+
+    def tearDown(self):
+        disable_sharding(self.db_path)
+        for fd, path in self.shards:
+            close_connections(path)
+            os.close(fd)
+            os.unlink(path)
+        close_connections(self.db_path)
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def count_rows(self, path, table):
+        conn = get_read_connection(path)
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.close()
+        return count
+
+    def set_updated_at(self, path, user_id, updated_at):
+        run_write(lambda conn: conn.execute(
+            "UPDATE carts SET updated_at = ? WHERE user_id = ?",
+            (updated_at, user_id)
+        ), path)
+
+    def test_jump_hash_moves_few_keys(self):
+        keys = range(1000)
+        before = [jump_hash(key, 3) for key in keys]
+        after = [jump_hash(key, 4) for key in keys]
+        moved = [b for b, a in zip(before, after) if b != a]
+        # Only keys moving to the new bucket change place.
+        self.assertTrue(all(a == 3 for b, a in zip(before, after) if b != a))
+        self.assertLess(len(moved), 400)
+
+    def test_carts_and_orders_live_on_the_user_shard(self):
+        configure_sharding(self.shard_paths, self.db_path)
+        for user in self.users:
+            cart = cart_service.add_to_cart(
+                user, [(self.product.id, 2)], db_path=self.db_path
+            )
+            order = cart_service.place_order(cart, user, db_path=self.db_path)
+            shard = shard_path_for(user.id, self.db_path)
+            conn = get_read_connection(shard)
+            row = conn.execute(
+                "SELECT user_id FROM orders WHERE id = ?", (order.id,)
+            ).fetchone()
+            conn.close()
+            self.assertEqual(row["user_id"], user.id)
+        self.assertEqual(self.count_rows(self.db_path, "orders"), 0)
+        self.assertEqual(self.count_rows(self.db_path, "order_items"), 0)
+        # Stock is reserved in the global catalog.
+        product = product_service.get_product_by_id(
+            self.product.id, db_path=self.db_path
+        )
+        self.assertEqual(product.stock, 100 - 2 * len(self.users))
+
+    def test_failed_sharded_checkout_keeps_stock(self):
+        configure_sharding(self.shard_paths, self.db_path)
+        user = self.users[0]
+        cart = cart_service.add_to_cart(
+            user, [(self.product.id, 200)], db_path=self.db_path
+        )
+        with self.assertRaises(cart_service.InsufficientStockError):
+            cart_service.place_order(cart, user, db_path=self.db_path)
+        product = product_service.get_product_by_id(
+            self.product.id, db_path=self.db_path
+        )
+        self.assertEqual(product.stock, 100)
+
+    def test_report_gathers_every_shard(self):
+        configure_sharding(self.shard_paths, self.db_path)
+        for user in self.users:
+            cart = cart_service.add_to_cart(
+                user, [(self.product.id, 3)], db_path=self.db_path
+            )
+            cart_service.place_order(cart, user, db_path=self.db_path)
+        report = order_service.get_orders_report(
+            self.admin, db_path=self.db_path
+        )
+        self.assertEqual(report["order_count"], len(self.users))
+        self.assertEqual(report["customer_count"], len(self.users))
+        self.assertEqual(report["units_sold"], 3 * len(self.users))
+        self.assertEqual(len(report["per_shard"]), len(self.shard_paths))
+        orders = order_service.get_orders(self.admin, db_path=self.db_path)
+        self.assertEqual(len({order.id for order in orders}), len(self.users))
+
+    def test_rebalance_moves_rows_and_keeps_ids(self):
+        # Start unsharded, then spread the existing rows over the shards.
+        orders = {}
+        for user in self.users:
+            cart = cart_service.add_to_cart(
+                user, [(self.product.id, 1)], db_path=self.db_path
+            )
+            orders[user.id] = cart_service.place_order(
+                cart, user, db_path=self.db_path
+            ).id
+            cart_service.add_to_cart(
+                user, [(self.product.id, 1)], db_path=self.db_path
+            )
+        moved = rebalance(
+            self.shard_paths, [self.db_path], db_path=self.db_path
+        )
+        self.assertEqual(moved, {"carts": 8, "orders": 8, "order_items": 8})
+        self.assertEqual(self.count_rows(self.db_path, "orders"), 0)
+        self.assertEqual(self.count_rows(self.db_path, "order_items"), 0)
+        for user in self.users:
+            conn = get_read_connection(shard_path_for(user.id, self.db_path))
+            row = conn.execute(
+                "SELECT user_id FROM orders WHERE id = ?", (orders[user.id],)
+            ).fetchone()
+            conn.close()
+            self.assertEqual(row["user_id"], user.id)
+        # The sales summaries follow the orders.
+        for path in [self.db_path, *self.shard_paths]:
+            self.assertEqual(sales_summary.check(path), [])
+        self.assertEqual(
+            analytics_service.get_product_sales(
+                self.admin, db_path=self.db_path
+            ),
+            [{"product_id": self.product.id, "units": 8, "revenue": 12000.0}]
+        )
+        # Running it again finds nothing left to move.
+        self.assertEqual(
+            rebalance(self.shard_paths, [self.db_path], db_path=self.db_path),
+            {"carts": 0, "orders": 0, "order_items": 0}
+        )
+
+    def test_rebalance_keeps_one_cart_per_user(self):
+        stale_user, fresh_user = self.users[:2]
+        for user in (stale_user, fresh_user):
+            cart_service.add_to_cart(
+                user, [(self.product.id, 1)], db_path=self.db_path
+            )
+        self.set_updated_at(
+            self.db_path, stale_user.id, "2020-01-01T00:00:00"
+        )
+        # Carts started on the shards before the old ones were moved.
+        configure_sharding(self.shard_paths, self.db_path)
+        for user in (stale_user, fresh_user):
+            cart_service.add_to_cart(
+                user, [(self.product.id, 2)], db_path=self.db_path
+            )
+        self.set_updated_at(
+            shard_path_for(fresh_user.id, self.db_path), fresh_user.id,
+            "2020-01-01T00:00:00"
+        )
+
+        rebalance(self.shard_paths, [self.db_path], db_path=self.db_path)
+        self.assertEqual(self.count_rows(self.db_path, "carts"), 0)
+        for user, quantity in ((stale_user, 2), (fresh_user, 1)):
+            conn = get_read_connection(shard_path_for(user.id, self.db_path))
+            carts = conn.execute(
+                "SELECT items FROM carts WHERE user_id = ?", (user.id,)
+            ).fetchall()
+            conn.close()
+            self.assertEqual(
+                [json.loads(cart["items"]) for cart in carts],
+                [{str(self.product.id): quantity}]
+            )
+
+    def test_related_products_count_every_order_once(self):
+        mouse = product_service.add_product(
+            self.admin, "Mouse", "Wireless mouse", 20.00, db_path=self.db_path
+        )
+
+        def buy(users):
+            for user in users:
+                cart = cart_service.add_to_cart(
+                    user, [(self.product.id, 1), (mouse.id, 1)],
+                    db_path=self.db_path
+                )
+                cart_service.place_order(cart, user, db_path=self.db_path)
+
+        buy(self.users[:4])
+        related_products.update(self.db_path)
+        # The counted orders move, the new ones land on every shard.
+        rebalance(self.shard_paths, [self.db_path], db_path=self.db_path)
+        buy(self.users[4:])
+        related_products.update(self.db_path, batch_size=1)
+        related = product_service.get_related_products(
+            self.product.id, db_path=self.db_path
+        )
+        self.assertEqual(
+            [(product.id, orders) for product, orders in related],
+            [(mouse.id, 8)]
+        )
+
+if __name__ == '__main__':
+    unittest.main()
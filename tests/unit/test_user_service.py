@@ -1,7 +1,7 @@
 import os
 import unittest
 import tempfile
-from db.database import init_db
+from db.database import close_connections, init_db
 from src.services import user_service
 
 class TestUserService(unittest.TestCase):
@@ -10,6 +10,7 @@ class TestUserService(unittest.TestCase):
         init_db(self.db_path)
 
     def tearDown(self):
+        close_connections(self.db_path)
         os.close(self.db_fd)
         os.unlink(self.db_path)
 
@@ -47,5 +48,47 @@ class TestUserService(unittest.TestCase):
                 "testuser", "wrongpassword", db_path=self.db_path
             )
 
+class TestUserServiceWithUsernameCache(TestUserService):
+    """Reruns the user service tests with the username cache enabled."""
+    def setUp(self):
+        super().setUp()
+        self.cache = user_service.enable_username_cache(
+            db_path=self.db_path
+        )
+
+    def tearDown(self):
+        user_service.disable_username_cache(self.db_path)
+        super().tearDown()
+
+    def test_missing_username_is_cached_until_registered(self):
+        for _ in range(3):
+            with self.assertRaises(user_service.UserServiceError):
+                user_service.login_user(
+                    "testuser", "password123", db_path=self.db_path
+                )
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.negative_hits, 2)
+        # Registering drops the negative entry.
+        self.mock_register_user()
+        user = user_service.login_user(
+            "testuser", "password123", db_path=self.db_path
+        )
+        self.assertEqual(user.username, "testuser")
+
+    def test_stats(self):
+        admin = user_service.register_user(
+            "admin", "adminpass", "admin", db_path=self.db_path
+        )
+        user = self.mock_register_user()
+        user_service.login_user("testuser", "password123", db_path=self.db_path)
+        with self.assertRaises(user_service.UserServiceError):
+            user_service.get_username_cache_stats(user, db_path=self.db_path)
+        stats = user_service.get_username_cache_stats(
+            admin, db_path=self.db_path
+        )
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["entries"], 2)
+        self.assertGreater(stats["hit_rate"], 0)
+
 if __name__ == '__main__':
     unittest.main()